@@ -1,7 +1,11 @@
-import matplotlib.pyplot as plt
+from ast_nodes import Node, KIND_NAMES
+
 
 class ASTDrawer:
     def __init__(self):
+        # matplotlib is only needed once a tree is actually drawn
+        import matplotlib.pyplot as plt
+        self.plt = plt
         self.fig, self.ax = plt.subplots(figsize=(16, 10))
         self.ax.axis('off')
         self.x = 0
@@ -13,30 +17,38 @@ class ASTDrawer:
     def draw(self, ast):
         root_id = self._walk(ast, depth=0)
         self._render()
-        plt.show()
+        self.plt.show()
 
     def _walk(self, node, depth):
-        my_id = self.node_id
-        self.node_id += 1
+        # explicit stack: deeply nested programs must not recurse
+        root_id = self.node_id
+        stack = [(node, depth, None)]
+        while stack:
+            node, depth, parent_id = stack.pop()
+            my_id = self.node_id
+            self.node_id += 1
 
-        label = self._label(node)
+            label = self._label(node)
 
-        # موقعیت گره
-        x = self.x
-        y = -depth
-        self.positions[my_id] = (x, y, label)
-        self.x += 1
+            # موقعیت گره
+            x = self.x
+            y = -depth
+            self.positions[my_id] = (x, y, label)
+            self.x += 1
+            if parent_id is not None:
+                self.edges.append((parent_id, my_id))
 
-        # پردازش بچه‌ها
-        children = self._children(node)
-        for child in children:
-            child_id = self._walk(child, depth + 1)
-            self.edges.append((my_id, child_id))
+            # پردازش بچه‌ها (برعکس، تا اولین بچه اول از stack خارج شود)
+            children = self._children(node)
+            for child in reversed(children):
+                stack.append((child, depth + 1, my_id))
 
-        return my_id
+        return root_id
 
     def _label(self, node):
-        if isinstance(node, tuple):
+        if isinstance(node, Node):
+            return KIND_NAMES[node.kind]
+        elif isinstance(node, tuple):
             return node[0]
         elif isinstance(node, list):
             return "list"
@@ -44,7 +56,10 @@ class ASTDrawer:
             return str(node)
 
     def _children(self, node):
-        if isinstance(node, tuple):
+        if isinstance(node, Node):
+            children = (getattr(node, f) for f in node.fields)
+            return [x for x in children if x is not None]
+        elif isinstance(node, tuple):
             return [x for x in node[1:] if x is not None]
         elif isinstance(node, list):
             return node
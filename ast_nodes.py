@@ -0,0 +1,441 @@
+"""Typed AST node classes.
+
+Every node is a `__slots__` class with an integer `kind` code (shared by the
+class, not stored per node), a source line and a `type` slot that semantic
+analysis fills with the resolved type of expressions.  Nodes that name a
+variable or function also get a `sym` slot for the integer symbol id the
+name resolved to (see semantic.SymbolTable).
+
+`NodeBuilder` is the parser target that creates these objects and `NodeTree`
+is the tree protocol the passes use to read them (`flat_ast.FlatAST`
+implements the same protocol over array columns).
+
+`to_tuple` / `from_tuple` convert to and from the older tagged-tuple AST
+(`("binop", "+", l, r)`, `("stmt", ...)`, ...) for code that still expects it.
+"""
+from operator import attrgetter
+
+(PROGRAM, VAR_DECL, VAR_DECL_ARRAY, FUNC_DECL, PARAM, BLOCK, CALL, ASSIGN,
+ LOC, LOC_ARRAY, IF, ELIF, WHILE, FOR, PRINT, INPUT, RETURN, BREAK, CONTINUE,
+ BINOP, UNARY, LITERAL) = range(22)
+
+KIND_NAMES = (
+    "program", "var_decl", "var_decl_array", "func_decl", "param", "block",
+    "call", "assign", "loc", "loc_array", "if", "elif", "while", "for",
+    "print", "input", "return", "break", "continue", "binop", "unary",
+    "literal",
+)
+
+# kinds that appear unwrapped in a statement list; everything else is a
+# statement and was wrapped in ("stmt", ...) by the tuple AST
+DECLARATION_KINDS = frozenset((VAR_DECL, VAR_DECL_ARRAY, FUNC_DECL))
+
+
+class Node:
+    __slots__ = ("lineno", "type")
+    kind = -1
+    fields = ()
+
+    def __repr__(self):
+        args = ", ".join(repr(getattr(self, f)) for f in self.fields)
+        return f"{type(self).__name__}({args})"
+
+
+class Program(Node):
+    __slots__ = ("stmts",)
+    kind = PROGRAM
+    fields = ("stmts",)
+
+    def __init__(self, stmts, lineno=0):
+        self.stmts = stmts
+        self.lineno = lineno
+        self.type = None
+
+
+class VarDecl(Node):
+    __slots__ = ("var_type", "name", "init", "sym")
+    kind = VAR_DECL
+    fields = ("var_type", "name", "init")
+
+    def __init__(self, var_type, name, init, lineno=0):
+        self.var_type = var_type
+        self.name = name
+        self.init = init
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class VarDeclArray(Node):
+    __slots__ = ("var_type", "name", "size", "sym")
+    kind = VAR_DECL_ARRAY
+    fields = ("var_type", "name", "size")
+
+    def __init__(self, var_type, name, size, lineno=0):
+        self.var_type = var_type
+        self.name = name
+        self.size = size
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class FuncDecl(Node):
+    __slots__ = ("name", "params", "body", "sym")
+    kind = FUNC_DECL
+    fields = ("name", "params", "body")
+
+    def __init__(self, name, params, body, lineno=0):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class Param(Node):
+    __slots__ = ("param_type", "name", "sym")
+    kind = PARAM
+    fields = ("param_type", "name")
+
+    def __init__(self, param_type, name, lineno=0):
+        self.param_type = param_type
+        self.name = name
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class Block(Node):
+    __slots__ = ("stmts",)
+    kind = BLOCK
+    fields = ("stmts",)
+
+    def __init__(self, stmts, lineno=0):
+        self.stmts = stmts
+        self.lineno = lineno
+        self.type = None
+
+
+class Call(Node):
+    __slots__ = ("name", "args", "sym")
+    kind = CALL
+    fields = ("name", "args")
+
+    def __init__(self, name, args, lineno=0):
+        self.name = name
+        self.args = args
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class Assign(Node):
+    __slots__ = ("target", "value")
+    kind = ASSIGN
+    fields = ("target", "value")
+
+    def __init__(self, target, value, lineno=0):
+        self.target = target
+        self.value = value
+        self.lineno = lineno
+        self.type = None
+
+
+class Loc(Node):
+    __slots__ = ("name", "sym")
+    kind = LOC
+    fields = ("name",)
+
+    def __init__(self, name, lineno=0):
+        self.name = name
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class LocArray(Node):
+    __slots__ = ("name", "index", "sym")
+    kind = LOC_ARRAY
+    fields = ("name", "index")
+
+    def __init__(self, name, index, lineno=0):
+        self.name = name
+        self.index = index
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class If(Node):
+    __slots__ = ("cond", "then", "elif_part", "else_part")
+    kind = IF
+    fields = ("cond", "then", "elif_part", "else_part")
+
+    def __init__(self, cond, then, elif_part, else_part, lineno=0):
+        self.cond = cond
+        self.then = then
+        self.elif_part = elif_part
+        self.else_part = else_part
+        self.lineno = lineno
+        self.type = None
+
+
+class Elif(Node):
+    __slots__ = ("cond", "body", "next_elif")
+    kind = ELIF
+    fields = ("cond", "body", "next_elif")
+
+    def __init__(self, cond, body, next_elif, lineno=0):
+        self.cond = cond
+        self.body = body
+        self.next_elif = next_elif
+        self.lineno = lineno
+        self.type = None
+
+
+class While(Node):
+    __slots__ = ("cond", "body")
+    kind = WHILE
+    fields = ("cond", "body")
+
+    def __init__(self, cond, body, lineno=0):
+        self.cond = cond
+        self.body = body
+        self.lineno = lineno
+        self.type = None
+
+
+class For(Node):
+    __slots__ = ("init", "cond", "step", "body")
+    kind = FOR
+    fields = ("init", "cond", "step", "body")
+
+    def __init__(self, init, cond, step, body, lineno=0):
+        self.init = init
+        self.cond = cond
+        self.step = step
+        self.body = body
+        self.lineno = lineno
+        self.type = None
+
+
+class Print(Node):
+    __slots__ = ("value",)
+    kind = PRINT
+    fields = ("value",)
+
+    def __init__(self, value, lineno=0):
+        self.value = value
+        self.lineno = lineno
+        self.type = None
+
+
+class Input(Node):
+    __slots__ = ("name", "sym")
+    kind = INPUT
+    fields = ("name",)
+
+    def __init__(self, name, lineno=0):
+        self.name = name
+        self.lineno = lineno
+        self.type = None
+        self.sym = None
+
+
+class Return(Node):
+    __slots__ = ("value",)
+    kind = RETURN
+    fields = ("value",)
+
+    def __init__(self, value, lineno=0):
+        self.value = value
+        self.lineno = lineno
+        self.type = None
+
+
+class Break(Node):
+    __slots__ = ()
+    kind = BREAK
+
+    def __init__(self, lineno=0):
+        self.lineno = lineno
+        self.type = None
+
+
+class Continue(Node):
+    __slots__ = ()
+    kind = CONTINUE
+
+    def __init__(self, lineno=0):
+        self.lineno = lineno
+        self.type = None
+
+
+class BinOp(Node):
+    __slots__ = ("op", "left", "right")
+    kind = BINOP
+    fields = ("op", "left", "right")
+
+    def __init__(self, op, left, right, lineno=0):
+        self.op = op
+        self.left = left
+        self.right = right
+        self.lineno = lineno
+        self.type = None
+
+
+class Unary(Node):
+    __slots__ = ("op", "operand")
+    kind = UNARY
+    fields = ("op", "operand")
+
+    def __init__(self, op, operand, lineno=0):
+        self.op = op
+        self.operand = operand
+        self.lineno = lineno
+        self.type = None
+
+
+class Literal(Node):
+    __slots__ = ("value",)
+    kind = LITERAL
+    fields = ("value",)
+
+    def __init__(self, value, lineno=0):
+        self.value = value
+        self.lineno = lineno
+        self.type = None
+
+
+NODE_CLASSES = (
+    Program, VarDecl, VarDeclArray, FuncDecl, Param, Block, Call, Assign,
+    Loc, LocArray, If, Elif, While, For, Print, Input, Return, Break,
+    Continue, BinOp, Unary, Literal,
+)
+_CLASS_BY_TAG = {KIND_NAMES[cls.kind]: cls for cls in NODE_CLASSES}
+
+
+class NodeBuilder:
+    """Parser target creating node objects (see flat_ast.FlatBuilder)."""
+    program = Program
+    var_decl = VarDecl
+    var_decl_array = VarDeclArray
+    func_decl = FuncDecl
+    param = Param
+    block = Block
+    call = Call
+    assign = Assign
+    loc = Loc
+    loc_array = LocArray
+    if_ = If
+    elif_ = Elif
+    while_ = While
+    for_ = For
+    print_ = Print
+    input_ = Input
+    return_ = Return
+    break_ = Break
+    continue_ = Continue
+    binop = BinOp
+    unary = Unary
+    literal = Literal
+
+    @staticmethod
+    def finish(root):
+        return root
+
+
+def _field_getter(cls):
+    if len(cls.fields) > 1:
+        return attrgetter(*cls.fields)
+    if cls.fields:
+        name = cls.fields[0]
+        return lambda n: (getattr(n, name),)
+    return lambda n: ()
+
+
+_FIELD_GETTERS = tuple(_field_getter(cls) for cls in NODE_CLASSES)
+
+
+class NodeTree:
+    """Tree protocol over node objects: node references are the nodes."""
+    kind = staticmethod(attrgetter("kind"))
+    # per-kind `fields` functions, for visitors that dispatch on kind
+    field_getters = _FIELD_GETTERS
+
+    @staticmethod
+    def fields(n):
+        """Field values in `fields` order."""
+        return _FIELD_GETTERS[n.kind](n)
+
+    @staticmethod
+    def lineno(n):
+        return n.lineno
+
+    @staticmethod
+    def set_type(n, t):
+        n.type = t
+
+    @staticmethod
+    def get_type(n):
+        return n.type
+
+    @staticmethod
+    def set_symbol(n, sid):
+        n.sym = sid
+
+    @staticmethod
+    def get_symbol(n):
+        return n.sym
+
+
+NODE_TREE = NodeTree()
+
+
+def tree_of(ast):
+    """(tree protocol, root reference) for a node tree or a FlatAST."""
+    if isinstance(ast, Node) or ast is None:
+        return NODE_TREE, ast
+    return ast, ast.root
+
+
+# ----- tuple AST compatibility -----
+
+def to_tuple(node):
+    """Convert a node tree to the tagged-tuple AST."""
+    if node is None or not isinstance(node, (Node, list)):
+        return node
+    if isinstance(node, list):
+        return [to_tuple(n) for n in node]
+    kind = node.kind
+    if kind == PROGRAM or kind == BLOCK:
+        return (KIND_NAMES[kind], [_stmt_to_tuple(n) for n in node.stmts])
+    if kind == BREAK or kind == CONTINUE:
+        return KIND_NAMES[kind]
+    return (KIND_NAMES[kind],) + tuple(to_tuple(getattr(node, f))
+                                       for f in node.fields)
+
+
+def _stmt_to_tuple(node):
+    if node.kind in DECLARATION_KINDS:
+        return to_tuple(node)
+    return ("stmt", to_tuple(node))
+
+
+def from_tuple(t):
+    """Convert a tagged-tuple AST to node classes."""
+    if isinstance(t, list):
+        return [from_tuple(x) for x in t]
+    if not isinstance(t, tuple):
+        return t
+    tag = t[0]
+    if tag == "stmt":
+        inner = t[1]
+        if inner == "break":
+            return Break()
+        if inner == "continue":
+            return Continue()
+        return from_tuple(inner)
+    return _CLASS_BY_TAG[tag](*[from_tuple(x) for x in t[1:]])
@@ -0,0 +1,176 @@
+"""Headless batch driver for the compiler pipeline.
+
+Runs lexer -> parser -> SemanticAnalyzer -> CodeGenerator over a list of
+source files or directories, spreading the files over a process pool.
+
+    python batch.py examples/ -o build/ -j 8
+"""
+import argparse
+import os
+import sys
+from functools import partial
+from multiprocessing import Pool
+
+
+DEFAULT_EXTENSION = ".txt"
+REPORT_NAME = "report.txt"
+
+
+def compile_source(source, optimize=False):
+    """Compile one source buffer; returns (tac_lines, error_lines,
+    instructions removed by the optimizer)."""
+    from compiler import compile_source as run_pipeline
+
+    result = run_pipeline(source, optimize)
+    if not result.ok:
+        return None, result.errors, 0
+    lines = [f"{i}: ({op}, {a1}, {a2}, {res})"
+             for i, (op, a1, a2, res) in enumerate(result.tac)]
+    saved = 0
+    if optimize:
+        # compile() has loaded the passes already
+        from optimize import removed
+        saved = removed(result.optimizations)
+    return lines, [], saved
+
+
+def compile_file(path, optimize=False):
+    """Pool task: compile the file at `path`."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        tac, errs, saved = compile_source(source, optimize)
+    except Exception as e:
+        tac, errs, saved = None, [f"Internal Error: {e}"], 0
+    return path, tac, errs, saved
+
+
+def _init_worker():
+    # Import the PLY tables once per worker instead of once per file.
+    from compiler import get_compiler
+    get_compiler()
+
+
+def collect_sources(paths, extension=DEFAULT_EXTENSION):
+    """Expand files and directories into a list of (path, output_name).
+
+    A file reached more than once is listed once.  Raises ValueError when
+    two different files would write the same output file."""
+    sources = []
+    seen = set()
+    outputs = {}  # output stem -> the file writing it
+
+    def add(full, rel_name):
+        real = os.path.realpath(full)
+        if real in seen:
+            return
+        seen.add(real)
+        stem = os.path.normcase(os.path.splitext(rel_name)[0])
+        other = outputs.setdefault(stem, full)
+        if other != full:
+            raise ValueError(f"'{other}' and '{full}' would both be "
+                             f"written to {output_path('', rel_name)}")
+        sources.append((full, rel_name))
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(extension):
+                        full = os.path.join(root, name)
+                        add(full, os.path.relpath(full, path))
+        else:
+            add(path, os.path.basename(path))
+    return sources
+
+
+def output_path(out_dir, rel_name):
+    stem, _ = os.path.splitext(rel_name)
+    return os.path.join(out_dir, stem + ".tac")
+
+
+def run_batch(paths, out_dir, jobs=None, extension=DEFAULT_EXTENSION,
+              chunksize=None, optimize=False):
+    """Compile every source under `paths`; returns (ok_count, failed_count)."""
+    sources = collect_sources(paths, extension)
+    jobs = jobs or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(sources) // (jobs * 4))
+
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+    task = partial(compile_file, optimize=optimize)
+
+    if jobs == 1:
+        _init_worker()
+        for path, _ in sources:
+            p, tac, errs, saved = task(path)
+            results[p] = (tac, errs, saved)
+    else:
+        with Pool(jobs, initializer=_init_worker) as pool:
+            for p, tac, errs, saved in pool.imap_unordered(
+                    task, [path for path, _ in sources],
+                    chunksize=chunksize):
+                results[p] = (tac, errs, saved)
+
+    ok = failed = 0
+    report = []
+    for path, rel_name in sources:
+        tac, errs, saved = results[path]
+        if errs:
+            failed += 1
+            report.append(f"{path}: FAILED")
+            report.extend(f"    {err}" for err in errs)
+            continue
+        ok += 1
+        target = output_path(out_dir, rel_name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w", encoding="utf-8") as f:
+            f.write("\n".join(tac))
+            if tac:
+                f.write("\n")
+        if optimize:
+            report.append(f"{path}: OK ({len(tac)} instructions, "
+                          f"{saved} removed by optimization)")
+        else:
+            report.append(f"{path}: OK ({len(tac)} instructions)")
+
+    report.append("")
+    report.append(f"{ok} compiled, {failed} failed, {len(sources)} total")
+    with open(os.path.join(out_dir, REPORT_NAME), "w", encoding="utf-8") as f:
+        f.write("\n".join(report) + "\n")
+    return ok, failed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compile source files to TAC.")
+    ap.add_argument("paths", nargs="+",
+                    help="source files or directories to compile")
+    ap.add_argument("-o", "--out-dir", default="build",
+                    help="directory for .tac files and the error report")
+    ap.add_argument("-j", "--jobs", type=int, default=None,
+                    help="worker processes (default: number of cores)")
+    ap.add_argument("--ext", default=DEFAULT_EXTENSION,
+                    help="source file extension when scanning directories")
+    ap.add_argument("--chunksize", type=int, default=None,
+                    help="files handed to a worker at a time")
+    ap.add_argument("-O", "--optimize", action="store_true",
+                    help="run the TAC optimization passes")
+    args = ap.parse_args(argv)
+
+    # Short-lived workers: load the prebuilt tables instead of rebuilding.
+    os.environ.setdefault("COMPILER_FAST_START", "1")
+    try:
+        ok, failed = run_batch(args.paths, args.out_dir, args.jobs, args.ext,
+                               args.chunksize, args.optimize)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+    print(f"{ok} compiled, {failed} failed "
+          f"(report: {os.path.join(args.out_dir, REPORT_NAME)})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
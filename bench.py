@@ -0,0 +1,1071 @@
+"""Performance benchmarks for the compiler pipeline.
+
+    python bench.py              # run every benchmark
+    python bench.py imports      # run one benchmark by name
+
+A benchmark returns False when it misses its budget; the script then
+exits with status 1.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from ast_nodes import (PROGRAM, VAR_DECL, VAR_DECL_ARRAY, FUNC_DECL, BLOCK,
+                       CALL, ASSIGN, LOC, LOC_ARRAY, IF, ELIF, WHILE, FOR,
+                       PRINT, INPUT, RETURN, BINOP, UNARY, LITERAL)
+from visitor import Visitor
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Median cold import of the headless pipeline (`import compiler`) with
+# COMPILER_FAST_START=1, in milliseconds.  PLY itself is imported before
+# the clock starts: its import cost is the same in both modes.
+IMPORT_BUDGET_MS = 12.0
+
+_IMPORT_SCRIPT = """
+import time, ply.lex, ply.yacc
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def _import_time_ms(module, fast, runs=21):
+    """Median time to import `module` in a fresh interpreter."""
+    env = dict(os.environ)
+    env.pop("COMPILER_FAST_START", None)
+    # measure with bytecode caching, as in a deployed worker
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if fast:
+        env["COMPILER_FAST_START"] = "1"
+    samples = []
+    for run in range(runs + 1):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT.format(module=module)],
+            cwd=HERE, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        if run:  # the first run only warms the bytecode cache
+            samples.append(float(out) * 1000)
+    return statistics.median(samples)
+
+
+def bench_imports():
+    """Cold import time of the pipeline, default vs fast start."""
+    ok = True
+    for module in ("lexer", "parser", "compiler"):
+        slow = _import_time_ms(module, fast=False)
+        fast = _import_time_ms(module, fast=True)
+        print(f"  import {module:9} default {slow:7.2f} ms   "
+              f"fast {fast:7.2f} ms")
+        if module == "compiler" and fast > IMPORT_BUDGET_MS:
+            print(f"  over budget: {fast:.2f} ms > {IMPORT_BUDGET_MS} ms")
+            ok = False
+    return ok
+
+
+# Parse time per statement may grow by at most this factor from the
+# smallest to the largest program before the scaling is flagged.
+PARSE_SCALING_LIMIT = 2.0
+PARSE_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def straight_line_source(n):
+    """`n` top-level statements."""
+    return "int x = 0;\n" + "x = x + 1;\n" * n
+
+
+def block_source(n):
+    """One block holding `n` statements."""
+    return "int x = 0;\nwhile (x < 1) {\n" + "x = x + 1;\n" * n + "}\n"
+
+
+def mixed_source(n):
+    """`n` units of typical code: declarations, arithmetic, if and while."""
+    parts = []
+    for i in range(n):
+        parts.append(
+            f"int v{i} = {i};\n"
+            f"v{i} = (v{i} + {i}) * 2 - v{i} / 3;\n"
+            f"if (v{i} > 10) {{ print(v{i}); }} else {{ print(0); }}\n"
+            f"int w{i} = 0;\n"
+            f"while (w{i} < 3) {{ w{i} = w{i} + 1; }}\n"
+        )
+    return "".join(parts)
+
+
+def _best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_parse_scaling():
+    """Parse time for 1k..1M statements (should grow linearly)."""
+    from compiler import Compiler
+
+    compiler = Compiler()
+    ok = True
+    for label, make in (("top-level", straight_line_source),
+                        ("block", block_source)):
+        per_stmt = []
+        for n in PARSE_SIZES:
+            source = make(n)
+            repeat = 3 if n < 1_000_000 else 1
+            elapsed = _best_of(lambda: compiler.parse(source), repeat)
+            per_stmt.append(elapsed / n)
+            print(f"  {label:9} {n:>9,} stmts  {elapsed:8.3f} s  "
+                  f"{elapsed / n * 1e6:6.2f} us/stmt")
+        growth = per_stmt[-1] / per_stmt[0]
+        if growth > PARSE_SCALING_LIMIT:
+            print(f"  {label}: per-statement cost grew {growth:.1f}x "
+                  f"(limit {PARSE_SCALING_LIMIT}x)")
+            ok = False
+    return ok
+
+
+def _count_tuple_nodes(node):
+    # string-tag dispatch, as the passes did on the tuple AST
+    if isinstance(node, list):
+        return sum(_count_tuple_nodes(n) for n in node)
+    if not isinstance(node, tuple):
+        return 0
+    tag = node[0]
+    if tag == "program" or tag == "block" or tag == "stmt":
+        return 1 + _count_tuple_nodes(node[1])
+    elif tag == "var_decl":
+        return 1 + _count_tuple_nodes(node[3])
+    elif tag == "assign":
+        return 1 + _count_tuple_nodes(node[1]) + _count_tuple_nodes(node[2])
+    elif tag == "if":
+        return (1 + _count_tuple_nodes(node[1]) + _count_tuple_nodes(node[2])
+                + _count_tuple_nodes(node[4]))
+    elif tag == "while":
+        return 1 + _count_tuple_nodes(node[1]) + _count_tuple_nodes(node[2])
+    elif tag == "print":
+        return 1 + _count_tuple_nodes(node[1])
+    elif tag == "binop":
+        return 1 + _count_tuple_nodes(node[2]) + _count_tuple_nodes(node[3])
+    elif tag == "literal" or tag == "loc":
+        return 1
+    return 1
+
+
+def _count_nodes(node):
+    if node is None:
+        return 0
+    if isinstance(node, list):
+        return sum(_count_nodes(n) for n in node)
+    kind = node.kind
+    if kind == PROGRAM or kind == BLOCK:
+        return 1 + _count_nodes(node.stmts)
+    elif kind == VAR_DECL:
+        return 1 + _count_nodes(node.init)
+    elif kind == ASSIGN:
+        return 1 + _count_nodes(node.target) + _count_nodes(node.value)
+    elif kind == IF:
+        return (1 + _count_nodes(node.cond) + _count_nodes(node.then)
+                + _count_nodes(node.else_part))
+    elif kind == WHILE:
+        return 1 + _count_nodes(node.cond) + _count_nodes(node.body)
+    elif kind == PRINT:
+        return 1 + _count_nodes(node.value)
+    elif kind == BINOP:
+        return 1 + _count_nodes(node.left) + _count_nodes(node.right)
+    elif kind == LITERAL or kind == LOC:
+        return 1
+    return 1
+
+
+def _allocated(fn):
+    """Bytes still allocated by the object `fn` returns."""
+    import tracemalloc
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def bench_ast():
+    """Memory and dispatch of the node AST vs the tagged-tuple AST."""
+    from compiler import Compiler
+    from ast_nodes import to_tuple, from_tuple
+
+    source = mixed_source(20_000)
+    nodes = Compiler().parse(source)
+    tuples, tuple_bytes = _allocated(lambda: to_tuple(nodes))
+    nodes, node_bytes = _allocated(lambda: from_tuple(tuples))
+    count = _count_nodes(nodes)
+    print(f"  {count:,} nodes")
+    print(f"  memory    tuples {tuple_bytes / count:6.1f} B/node   "
+          f"nodes {node_bytes / count:6.1f} B/node")
+
+    t_tuple = _best_of(lambda: _count_tuple_nodes(tuples))
+    t_node = _best_of(lambda: _count_nodes(nodes))
+    print(f"  dispatch  tuples {count / t_tuple / 1e6:6.2f} M nodes/s   "
+          f"nodes {count / t_node / 1e6:6.2f} M nodes/s")
+
+
+def bench_flat_ast():
+    """Memory, analysis speed and reload time of the flat AST."""
+    import tempfile
+    from compiler import Compiler
+    from flat_ast import FlatBuilder, FlatAST
+    from semantic import SemanticAnalyzer
+
+    source = mixed_source(5_000)
+    compiler = Compiler()
+    nodes, node_bytes = _allocated(lambda: compiler.parse(source))
+    flat, flat_bytes = _allocated(
+        lambda: compiler.parse(source, FlatBuilder()))
+    count = len(flat)
+    print(f"  {count:,} nodes")
+    print(f"  memory    nodes {node_bytes / count:6.1f} B/node   "
+          f"flat {flat_bytes / count:6.1f} B/node")
+
+    t_node = _best_of(lambda: SemanticAnalyzer().check(nodes))
+    t_flat = _best_of(lambda: SemanticAnalyzer().check(flat))
+    print(f"  semantic  nodes {t_node * 1000:7.1f} ms   "
+          f"flat {t_flat * 1000:7.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ast.bin")
+        t_save = _best_of(lambda: flat.save(path))
+        t_load = _best_of(lambda: FlatAST.load(path))
+        size = os.path.getsize(path)
+        t_parse = _best_of(lambda: compiler.parse(source, FlatBuilder()), 1)
+        print(f"  file {size / count:5.1f} B/node   save {t_save * 1000:.1f} ms"
+              f"   mmap load {t_load * 1000:.2f} ms   "
+              f"(reparse {t_parse * 1000:.0f} ms)")
+
+
+def _chain_count(tree, node):
+    # if/elif dispatch in the order the passes used before the visitor
+    if node is None:
+        return 0
+    if isinstance(node, list):
+        return sum(_chain_count(tree, n) for n in node)
+    kind = tree.kind(node)
+    f = tree.fields(node)
+    if kind == PROGRAM:
+        return 1 + _chain_count(tree, f[0])
+    elif kind == VAR_DECL:
+        return 1 + _chain_count(tree, f[2])
+    elif kind == VAR_DECL_ARRAY:
+        return 1
+    elif kind == FUNC_DECL:
+        return 1 + _chain_count(tree, f[2])
+    elif kind == BLOCK:
+        return 1 + _chain_count(tree, f[0])
+    elif kind == ASSIGN:
+        return 1 + _chain_count(tree, f[0]) + _chain_count(tree, f[1])
+    elif kind == LOC:
+        return 1
+    elif kind == LOC_ARRAY:
+        return 1 + _chain_count(tree, f[1])
+    elif kind == IF:
+        return (1 + _chain_count(tree, f[0]) + _chain_count(tree, f[1])
+                + _chain_count(tree, f[2]) + _chain_count(tree, f[3]))
+    elif kind == ELIF:
+        return (1 + _chain_count(tree, f[0]) + _chain_count(tree, f[1])
+                + _chain_count(tree, f[2]))
+    elif kind == WHILE:
+        return 1 + _chain_count(tree, f[0]) + _chain_count(tree, f[1])
+    elif kind == FOR:
+        return 1 + sum(_chain_count(tree, c) for c in f)
+    elif kind == PRINT:
+        return 1 + _chain_count(tree, f[0])
+    elif kind == INPUT:
+        return 1
+    elif kind == RETURN:
+        return 1 + _chain_count(tree, f[0])
+    elif kind == BINOP:
+        return 1 + _chain_count(tree, f[1]) + _chain_count(tree, f[2])
+    elif kind == UNARY:
+        return 1 + _chain_count(tree, f[1])
+    elif kind == LITERAL:
+        return 1
+    elif kind == CALL:
+        return 1 + _chain_count(tree, f[1])
+    return 1
+
+
+class _TableCounter(Visitor):
+    """The same node count through the table-driven visitor."""
+
+    def visit_list(self, nodes):
+        return sum(self.visit(n) for n in nodes)
+
+    def generic_visit(self, node, *fields):
+        return 1
+
+    def visit_program(self, node, stmts):
+        return 1 + self.visit(stmts)
+
+    visit_block = visit_program
+
+    def visit_var_decl(self, node, var_type, name, init):
+        return 1 + (self.visit(init) or 0)
+
+    def visit_func_decl(self, node, name, params, body):
+        return 1 + self.visit(body)
+
+    def visit_assign(self, node, target, value):
+        return 1 + self.visit(target) + self.visit(value)
+
+    def visit_loc_array(self, node, name, index):
+        return 1 + self.visit(index)
+
+    def visit_if(self, node, cond, then, elif_part, else_part):
+        return (1 + self.visit(cond) + self.visit(then)
+                + (self.visit(elif_part) or 0) + (self.visit(else_part) or 0))
+
+    def visit_elif(self, node, cond, body, next_elif):
+        return 1 + self.visit(cond) + self.visit(body) + \
+            (self.visit(next_elif) or 0)
+
+    def visit_while(self, node, cond, body):
+        return 1 + self.visit(cond) + self.visit(body)
+
+    def visit_for(self, node, init, cond, step, body):
+        return 1 + sum(self.visit(c) or 0 for c in (init, cond, step, body))
+
+    def visit_print(self, node, value):
+        return 1 + self.visit(value)
+
+    visit_return = visit_print
+
+    def visit_binop(self, node, op, left, right):
+        return 1 + self.visit(left) + self.visit(right)
+
+    def visit_unary(self, node, op, operand):
+        return 1 + self.visit(operand)
+
+    def visit_call(self, node, name, args):
+        return 1 + (self.visit(args) if args else 0)
+
+
+def bench_visit():
+    """Nodes/s of if-chain vs table-driven dispatch, and of both passes."""
+    from compiler import Compiler
+    from ast_nodes import NODE_TREE
+    from semantic import SemanticAnalyzer
+    from codegen import CodeGenerator
+
+    nodes = Compiler().parse(mixed_source(20_000))
+    counter = _TableCounter()
+    count = counter.visit(nodes)
+    assert count == _chain_count(NODE_TREE, nodes)
+    print(f"  {count:,} nodes")
+
+    t_chain = _best_of(lambda: _chain_count(NODE_TREE, nodes))
+    t_table = _best_of(lambda: counter.visit(nodes))
+    print(f"  dispatch  if-chain {count / t_chain / 1e6:5.2f} M nodes/s   "
+          f"table {count / t_table / 1e6:5.2f} M nodes/s")
+
+    t_sem = _best_of(lambda: SemanticAnalyzer().check(nodes))
+    analyzer = SemanticAnalyzer()
+    analyzer.check(nodes)
+    # codegen on the symbol ids semantic analysis recorded, as in compile()
+    t_gen = _best_of(lambda: CodeGenerator(nodes, analyzer.symtab).generate())
+    print(f"  semantic  {count / t_sem / 1e6:5.2f} M nodes/s   "
+          f"codegen {count / t_gen / 1e6:5.2f} M nodes/s")
+
+
+# compact code must have this fraction fewer instructions and temps
+TAC_SHRINK_BUDGET = 1 / 3
+
+
+def bench_tac():
+    """Memory per instruction, and the size of compact code."""
+    from compiler import Compiler
+    from codegen import CodeGenerator
+
+    result = Compiler().compile(mixed_source(20_000))
+    tac, tac_bytes = _allocated(
+        lambda: CodeGenerator(result.ast, result.analyzer.symtab).generate())
+    # the former store: one (op, arg1, arg2, result) tuple of str per line
+    text, text_bytes = _allocated(lambda: [tuple(map(str, t)) for t in tac])
+    count = len(tac)
+    print(f"  {count:,} instructions")
+    print(f"  memory    tuples {text_bytes / count:6.1f} B/instr   "
+          f"arrays {tac_bytes / count:6.1f} B/instr")
+
+    # compact code against a temp for every literal and assigned value
+    ok = True
+    for name, source in (("mixed", mixed_source(1_000)),) + tuple(
+            (name, source) for name, source, _ in vm_programs(100)):
+        result = Compiler().compile(source)
+        sizes = []
+        for compact in (False, True):
+            tac = CodeGenerator(result.ast, result.analyzer.symtab,
+                                compact=compact).generate()
+            sizes.append((len(tac), tac.temp_counter))
+        (n0, t0), (n1, t1) = sizes
+        print(f"  {name:8} instructions {n0:6,} -> {n1:6,}   "
+              f"temps {t0:6,} -> {t1:6,}")
+        if n1 > n0 * (1 - TAC_SHRINK_BUDGET) \
+                or t1 > t0 * (1 - TAC_SHRINK_BUDGET):
+            print(f"  {name}: compact code saves less than "
+                  f"{TAC_SHRINK_BUDGET:.0%}")
+            ok = False
+    return ok
+
+
+# Loop-heavy programs in the style of the while/for samples in
+# CorrectExm.txt; each prints one checksum computed below in Python.
+VM_ITERATIONS = 200_000
+
+
+def vm_programs(n):
+    """(name, source, expected output) triples."""
+    return (
+        ("while", f"""
+int i = 0;
+int s = 0;
+while (i < {n}) {{
+    s = s + i * 2 - 1;
+    i = i + 1;
+}}
+print(s);
+""", f"{sum(i * 2 - 1 for i in range(n))}\n"),
+        ("for+if", f"""
+int i;
+int evens = 0;
+float acc = 0.0;
+for (i = 0; i < {n}; i = i + 1) {{
+    if (i / 2 * 2 == i) {{
+        evens = evens + 1;
+    }} else {{
+        acc = acc + 0.5;
+    }}
+}}
+print(evens);
+print(acc);
+""", f"{(n + 1) // 2}\n{(n // 2) * 0.5}\n"),
+        ("nested", f"""
+int i = 0;
+int j;
+int hits = 0;
+while (i < {n // 100}) {{
+    for (j = 0; j < 100; j = j + 1) {{
+        if (j < i || j == 50) {{
+            hits = hits + 1;
+        }}
+    }}
+    i = i + 1;
+}}
+print(hits);
+""", f"{sum(1 for i in range(n // 100) for j in range(100) if j < i or j == 50)}\n"),
+    )
+
+
+def bench_vm():
+    """Instructions/s of the TAC virtual machine on loop-heavy programs."""
+    import io
+    from compiler import Compiler
+    from vm import VM
+
+    compiler = Compiler()
+    ok = True
+    for name, source, expected in vm_programs(VM_ITERATIONS):
+        result = compiler.compile(source)
+        if not result.ok:
+            print(f"  {name:8} compile failed: {result.errors}")
+            ok = False
+            continue
+        out = io.StringIO()
+        start = time.perf_counter()
+        vm = VM(result.tac, stdout=out)
+        load = time.perf_counter() - start
+        steps = vm.run()
+        elapsed = time.perf_counter() - start - load
+        if out.getvalue() != expected:
+            print(f"  {name:8} wrong output {out.getvalue()!r}, "
+                  f"expected {expected!r}")
+            ok = False
+            continue
+        print(f"  {name:8} {steps:>10,} instructions  {elapsed:6.2f} s  "
+              f"{steps / elapsed / 1e6:5.2f} M instr/s  "
+              f"(load {load * 1000:.1f} ms)")
+    return ok
+
+
+# Lookup time of a global name may grow by at most this factor from the
+# shallowest to the deepest scope before it is flagged.
+LOOKUP_SCALING_LIMIT = 2.0
+LOOKUP_DEPTHS = (1, 100, 10_000)
+
+
+def bench_symtab():
+    """Symbol lookup time at scope depth 1..10k (should stay flat)."""
+    from semantic import SymbolTable
+
+    lookups = 200_000
+    per_lookup = []
+    for depth in LOOKUP_DEPTHS:
+        symtab = SymbolTable()
+        symtab.declare("x", {"type": "int"})
+        for i in range(depth):
+            symtab.enter_scope("block")
+            symtab.declare(f"v{i}", {"type": "int"})
+        lookup = symtab.lookup
+        elapsed = _best_of(lambda: [lookup("x") for _ in range(lookups)])
+        per_lookup.append(elapsed / lookups)
+        print(f"  depth {depth:>6,}  {elapsed / lookups * 1e9:7.1f} ns/lookup")
+    growth = per_lookup[-1] / per_lookup[0]
+    if growth > LOOKUP_SCALING_LIMIT:
+        print(f"  lookup cost grew {growth:.1f}x "
+              f"(limit {LOOKUP_SCALING_LIMIT}x)")
+        return False
+    return True
+
+
+# Nesting depth of the stress programs: far past Python's recursion limit,
+# so any pass that still recurses per node fails with RecursionError.
+DEEP_DEPTH = 100_000
+
+
+def deep_sources(depth):
+    """(name, source) pairs nested `depth` levels deep in different ways."""
+    return (
+        ("blocks", "int x = 0;\n" + "{" * depth + "x = x + 1;" + "}" * depth),
+        ("if", "int x = 0;\n" + "if (x < 1) {" * depth + "x = 1;"
+         + "}" * depth),
+        ("left +", "int x = 0;\nx = " + " + ".join(["x"] * depth) + ";"),
+        ("right +", "int x = 0;\nx = " + "(x + " * depth + "x"
+         + ")" * depth + ";"),
+        ("||", "bool b = true;\nb = " + " || ".join(["b"] * depth) + ";"),
+        ("unary", "int x = 0;\nx = " + "-" * depth + "x;"),
+    )
+
+
+def bench_deep():
+    """Compile programs nested 100k deep (nodes and flat AST must agree)."""
+    from compiler import Compiler
+    from flat_ast import FlatBuilder
+
+    compiler = Compiler()
+    ok = True
+    for name, source in deep_sources(DEEP_DEPTH):
+        codes = []
+        start = time.perf_counter()
+        for builder in (None, FlatBuilder()):
+            try:
+                result = compiler.compile(source, builder)
+            except RecursionError:
+                result = None
+            if result is None or not result.ok:
+                codes.append(None)
+                continue
+            codes.append(list(result.tac))
+            del result
+        elapsed = time.perf_counter() - start
+        if None in codes or codes[0] != codes[1]:
+            print(f"  {name:8} FAILED")
+            ok = False
+            continue
+        print(f"  {name:8} {len(codes[0]):>8,} instructions  "
+              f"{elapsed:6.2f} s")
+    return ok
+
+
+# A function body of DATAFLOW_UNITS mixed_source units (~30 instructions
+# each); every analysis must finish within DATAFLOW_BUDGET_S on it.
+DATAFLOW_UNITS = (500, 2_000)
+DATAFLOW_BUDGET_S = 3.0
+
+
+def bench_dataflow():
+    """CFG construction and bitset dataflow analyses on one big function."""
+    from compiler import Compiler
+    from cfg import CFG
+    from dataflow import (liveness, reaching_definitions,
+                          available_expressions)
+
+    compiler = Compiler()
+    ok = True
+    for units in DATAFLOW_UNITS:
+        source = "func big(int n) {\n" + mixed_source(units) + "}\n"
+        result = compiler.compile(source)
+        code = result.tac.instruction_list()
+        start = time.perf_counter()
+        cfg = CFG(code)
+        times = [("cfg", time.perf_counter() - start)]
+        for name, analysis in (("live", liveness),
+                               ("reach", reaching_definitions),
+                               ("avail", available_expressions)):
+            start = time.perf_counter()
+            analysis(cfg, result.tac)
+            times.append((name, time.perf_counter() - start))
+        print(f"  {len(code):>7,} instructions {len(cfg):>6,} blocks  " +
+              "  ".join(f"{name} {t:5.2f} s" for name, t in times))
+        if max(t for _, t in times) > DATAFLOW_BUDGET_S:
+            print(f"  over the {DATAFLOW_BUDGET_S} s budget")
+            ok = False
+    return ok
+
+
+def constant_source(n):
+    """`n` units of constant setup code feeding a loop."""
+    lines = ["int total = 0;"]
+    for k in range(n):
+        lines.append(f"int c{k} = {k} * 4 + (10 - 3) / 2;")
+        lines.append(f"float f{k} = c{k} * 0.5 + 1;")
+        lines.append(f"if (c{k} > {k} * 4) {{ total = total + c{k}; }} "
+                     f"else {{ total = total - 1; }}")
+    lines.append("int i = 0;")
+    lines.append(f"while (i < {n}) {{ total = total + (2 + 3) * 4; "
+                 "i = i + 1; }")
+    lines.append("print(total);")
+    return "\n".join(lines)
+
+
+# Instructions the optimizer must remove from constant_source(n), as a
+# fraction of the unoptimized code.
+OPT_SHRINK_BUDGET = 0.5
+OPT_UNITS = 2_000
+
+
+def cse_source(n):
+    """A loop recomputing the same subexpressions and `[]` loads."""
+    return f"""
+int a[10];
+int i;
+int s = 0;
+int t = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    s = s + (i * 3 + 1) * (i * 3 + 1);
+    t = t + a[i - i / 10 * 10] * (i * 3 + 1) - a[i - i / 10 * 10];
+    if (s > t * 2) {{
+        t = t + (i * 3 + 1) / 2;
+    }}
+}}
+print(s);
+print(t);
+"""
+
+
+def _cse_expected(n):
+    s = t = 0
+    for i in range(n):
+        s += (i * 3 + 1) * (i * 3 + 1)
+        if s > t * 2:
+            t += (i * 3 + 1) // 2
+    return f"{s}\n{t}\n"
+
+
+def licm_source(n):
+    """Nested loops whose inner body repeats work that depends only on the
+    outer loop."""
+    return f"""
+int i;
+int j;
+int s = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    for (j = 0; j < 100; j = j + 1) {{
+        s = s + (i * 7 + 3) * (i - 1) + j / (i + 1);
+    }}
+}}
+print(s);
+"""
+
+
+def _licm_expected(n):
+    s = 0
+    for i in range(n):
+        for j in range(100):
+            s += (i * 7 + 3) * (i - 1) + j // (i + 1)
+    return f"{s}\n"
+
+
+def strength_source(n):
+    """A loop indexing with multiples of its counter."""
+    return f"""
+int a[100];
+int i;
+int s = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    s = s + a[i * 7 - i * 7 / 100 * 100] + i * 3;
+}}
+print(s);
+"""
+
+
+def _strength_expected(n):
+    return f"{sum(i * 3 for i in range(n))}\n"
+
+
+def branches_source(n):
+    """Nested if / elif / else and a loop inside a branch, whose ends
+    lower to chains of jumps."""
+    return f"""
+int i;
+int s = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    if (i / 3 * 3 == i) {{
+        if (i / 2 * 2 == i && s > 0) {{ s = s + 1; }} else {{ s = s + 2; }}
+    }} elif (i / 5 * 5 == i || i / 7 * 7 == i) {{
+        s = s - 1;
+    }} else {{
+        while (s > 100) {{ s = s - 7; }}
+    }}
+}}
+print(s);
+"""
+
+
+def _branches_expected(n):
+    s = 0
+    for i in range(n):
+        if i % 3 == 0:
+            s += 1 if i % 2 == 0 and s > 0 else 2
+        elif i % 5 == 0 or i % 7 == 0:
+            s -= 1
+        else:
+            while s > 100:
+                s -= 7
+    return f"{s}\n"
+
+
+def opt_programs():
+    """(name, source, expected output or None) corpus for `bench_optimize`."""
+    programs = [("consts", constant_source(OPT_UNITS), None),
+                ("mixed", mixed_source(OPT_UNITS), None),
+                ("cse", cse_source(VM_ITERATIONS // 4),
+                 _cse_expected(VM_ITERATIONS // 4)),
+                ("licm", licm_source(VM_ITERATIONS // 400),
+                 _licm_expected(VM_ITERATIONS // 400)),
+                ("strength", strength_source(VM_ITERATIONS // 4),
+                 _strength_expected(VM_ITERATIONS // 4)),
+                ("branches", branches_source(VM_ITERATIONS // 4),
+                 _branches_expected(VM_ITERATIONS // 4))]
+    programs.extend(vm_programs(VM_ITERATIONS))
+    return programs
+
+
+def bench_optimize():
+    """Size and VM run time of TAC before and after optimization."""
+    import io
+    from compiler import Compiler
+    from optimize import removed
+    from vm import VM
+
+    compiler = Compiler()
+    ok = True
+    for name, source, expected in opt_programs():
+        runs = []
+        for optimize in (False, True):
+            start = time.perf_counter()
+            result = compiler.compile(source, optimize=optimize)
+            compile_time = time.perf_counter() - start
+            out = io.StringIO()
+            start = time.perf_counter()
+            steps = VM(result.tac, stdout=out).run()
+            runs.append((len(result.tac), steps, time.perf_counter() - start,
+                         out.getvalue(), compile_time, result.optimizations))
+        (size0, steps0, time0, out0, _, _), \
+            (size1, steps1, time1, out1, opt_time, report) = runs
+        if out1 != out0 or expected is not None and out0 != expected:
+            print(f"  {name:8} optimized output {out1[:60]!r} != "
+                  f"{out0[:60]!r}")
+            ok = False
+            continue
+        passes = ", ".join(f"{p} {n:,}" for p, n in report)
+        print(f"  {name:8} {size0:>7,} -> {size1:>7,} instructions  "
+              f"{steps0:>9,} -> {steps1:>9,} steps  "
+              f"run {time0:5.2f} -> {time1:5.2f} s  "
+              f"(compile -O {opt_time:.2f} s; {passes})")
+        if name == "consts" and removed(report) < size0 * OPT_SHRINK_BUDGET:
+            print(f"  {name:8} removed less than "
+                  f"{OPT_SHRINK_BUDGET:.0%} of the code")
+            ok = False
+    return ok
+
+
+def bench_jumps():
+    """Jumps the VM executes with and without jump threading, after the
+    other optimizations."""
+    import io
+    from compiler import Compiler
+    from optimize import PASSES, optimize
+    from tac import BRANCHES, GOTO, LABEL
+    from vm import VM
+
+    def executed(tac):
+        # (gotos, branches, labels) run, and the output
+        out = io.StringIO()
+        counts = VM(tac, stdout=out).profile()
+        totals = {GOTO: 0, LABEL: 0}
+        totals.update(dict.fromkeys(BRANCHES, 0))
+        for op, n in zip(tac.ops, counts):
+            if op in totals:
+                totals[op] += n
+        return (totals[GOTO], sum(totals[op] for op in BRANCHES),
+                totals[LABEL]), out.getvalue()
+
+    compiler = Compiler()
+    ok = True
+    for name, source, expected in opt_programs()[2:]:
+        tac = compiler.compile(source).tac
+        optimize(tac, [p for p in PASSES if p != "jumps"])
+        before, out0 = executed(tac)
+        optimize(tac, ["jumps"])
+        after, out1 = executed(tac)
+        if out1 != out0 or expected is not None and out0 != expected:
+            print(f"  {name:8} output {out1[:60]!r} != {out0[:60]!r}")
+            ok = False
+            continue
+        print(f"  {name:8} goto {before[0]:>9,} -> {after[0]:>9,}   "
+              f"branch {before[1]:>9,} -> {after[1]:>9,}   "
+              f"label {before[2]:>9,} -> {after[2]:>9,}")
+        if sum(after) > sum(before) \
+                or name == "branches" and sum(after) == sum(before):
+            print(f"  {name:8} runs {sum(after) - sum(before):+,} jumps")
+            ok = False
+    return ok
+
+
+def calls_source(n):
+    """Small helpers called from a loop, one only through another."""
+    return f"""
+func add(int x, int y) {{ return x + y; }}
+func clamp(int v, int lo, int hi) {{
+    if (v < lo) {{ return lo; }}
+    if (v > hi) {{ return hi; }}
+    return v;
+}}
+func next(int v) {{ return clamp(add(v, 7), 0, 1000); }}
+int i;
+int s = 0;
+for (i = 0; i < {n}; i = i + 1) {{
+    s = add(next(s), i / 1000);
+}}
+print(s);
+"""
+
+
+def _calls_expected(n):
+    s = 0
+    for i in range(n):
+        s = min(max(s + 7, 0), 1000) + i // 1000
+    return f"{s}\n"
+
+
+def bench_inline():
+    """VM steps without inlining, with the static cost model and with a
+    VM call-count profile, each followed by the other passes."""
+    import io
+    from codegen import CodeGenerator
+    from compiler import Compiler
+    from inline import inline_calls
+    from optimize import PASSES, optimize
+    from vm import VM
+
+    n = VM_ITERATIONS // 4
+    # semantic analysis does not accept calls in expressions yet, so the
+    # code is generated from the parse tree
+    ast = Compiler().parse(calls_source(n))
+    rest = [p for p in PASSES if p != "inline"]
+    ok = True
+    steps = {}
+    for name in ("none", "static", "profile"):
+        tac = CodeGenerator(ast).generate()
+        if name == "static":
+            inline_calls(tac)
+        elif name == "profile":
+            counts = VM(tac, stdout=io.StringIO()).profile()
+            inline_calls(tac, counts)
+        optimize(tac, rest)
+        out = io.StringIO()
+        steps[name] = VM(tac, stdout=out).run()
+        if out.getvalue() != _calls_expected(n):
+            print(f"  {name:8} output {out.getvalue()[:60]!r} != "
+                  f"{_calls_expected(n)[:60]!r}")
+            ok = False
+            continue
+        print(f"  {name:8} {len(tac):>5,} instructions  "
+              f"{steps[name]:>11,} steps")
+    if ok and not steps["none"] > steps["static"] >= steps["profile"]:
+        print("  inlining did not cut the steps run")
+        ok = False
+    return ok
+
+
+SSA_BUDGET_S = 3.0
+
+
+def bench_ssa():
+    """SSA construction, one propagation sweep and destruction on one big
+    function, against iterative constant propagation."""
+    from compiler import Compiler
+    from constprop import fold_constants
+    from ssa import SSA, propagate
+
+    compiler = Compiler()
+    ok = True
+    for units in DATAFLOW_UNITS:
+        source = "func big(int n) {\n" + mixed_source(units) + "}\n"
+        tac = compiler.compile(source).tac
+        size = len(tac)
+        start = time.perf_counter()
+        form = SSA(tac)
+        times = [("build", time.perf_counter() - start)]
+        start = time.perf_counter()
+        propagate(form)
+        times.append(("sweep", time.perf_counter() - start))
+        start = time.perf_counter()
+        form.to_tac()
+        times.append(("out", time.perf_counter() - start))
+        tac2 = compiler.compile(source).tac
+        start = time.perf_counter()
+        fold_constants(tac2)
+        times.append(("constprop", time.perf_counter() - start))
+        print(f"  {size:>7,} instructions -> ssa {len(tac):>7,}, "
+              f"constprop {len(tac2):>7,}  " +
+              "  ".join(f"{name} {t:5.2f} s" for name, t in times))
+        if sum(t for _, t in times[:3]) > SSA_BUDGET_S:
+            print(f"  over the {SSA_BUDGET_S} s budget")
+            ok = False
+    return ok
+
+
+# Registers linear scan may use per region, as a multiple of its peak of
+# simultaneously live temps.
+REGALLOC_SLACK = 2
+
+
+def bench_regalloc():
+    """Temps before and after linear-scan register allocation."""
+    import io
+    from compiler import Compiler
+    from regalloc import allocate_temps
+    from vm import VM
+
+    compiler = Compiler()
+    programs = [("mixed", mixed_source(OPT_UNITS), None),
+                ("function", "func big(int n) {\n" +
+                 mixed_source(OPT_UNITS) + "}\n", None)]
+    programs.extend(vm_programs(VM_ITERATIONS))
+    ok = True
+    for name, source, expected in programs:
+        tac = compiler.compile(source).tac
+        temps = tac.temp_counter
+        start = time.perf_counter()
+        report = allocate_temps(tac)
+        elapsed = time.perf_counter() - start
+        out = io.StringIO()
+        VM(tac, stdout=out).run()
+        if expected is not None and out.getvalue() != expected:
+            print(f"  {name:8} output {out.getvalue()[:60]!r} != "
+                  f"{expected[:60]!r}")
+            ok = False
+            continue
+        regions = ", ".join(
+            f"{fn or 'top'}: peak {peak} in {used} registers"
+            for fn, _, peak, used, _ in report)
+        print(f"  {name:8} {temps:>7,} -> {tac.temp_counter:>3} temps "
+              f"in {elapsed:5.2f} s  ({regions})")
+        if any(used > REGALLOC_SLACK * peak for _, _, peak, used, _ in report):
+            print(f"  {name:8} more than {REGALLOC_SLACK}x the peak live "
+                  "temps")
+            ok = False
+    return ok
+
+
+PEEPHOLE_UNITS = (500, 5_000)
+# allowed growth of the peephole optimizer's per-instruction cost
+PEEPHOLE_SCALING_LIMIT = 2.0
+
+
+def bench_peephole():
+    """Peephole rules fired on TAC without compact codegen, and time."""
+    import io
+    from codegen import CodeGenerator
+    from compiler import Compiler
+    from peephole import apply_rules
+    from vm import VM
+
+    compiler = Compiler()
+
+    def loose(source):
+        # a temp for every literal and assigned value leaves the rules work
+        result = compiler.compile(source)
+        return CodeGenerator(result.ast, result.analyzer.symtab,
+                             compact=False).generate()
+
+    ok = True
+    per_instruction = []
+    for units in PEEPHOLE_UNITS:
+        tac = loose(mixed_source(units))
+        size = len(tac)
+        start = time.perf_counter()
+        fired = apply_rules(tac)
+        elapsed = time.perf_counter() - start
+        per_instruction.append(elapsed / size)
+        rules = ", ".join(f"{name} {n:,}" for name, n in fired.most_common())
+        print(f"  {size:>9,} -> {len(tac):>9,} instructions  "
+              f"{elapsed:6.3f} s  ({rules})")
+    growth = per_instruction[-1] / per_instruction[0]
+    if growth > PEEPHOLE_SCALING_LIMIT:
+        print(f"  per-instruction cost grew {growth:.1f}x "
+              f"(limit {PEEPHOLE_SCALING_LIMIT}x)")
+        ok = False
+    for name, source, expected in vm_programs(VM_ITERATIONS):
+        tac = loose(source)
+        steps0 = VM(tac, stdout=io.StringIO()).run()
+        apply_rules(tac)
+        out = io.StringIO()
+        steps1 = VM(tac, stdout=out).run()
+        if out.getvalue() != expected:
+            print(f"  {name:8} output {out.getvalue()[:60]!r} != "
+                  f"{expected[:60]!r}")
+            ok = False
+            continue
+        print(f"  {name:8} {steps0:>9,} -> {steps1:>9,} steps")
+    return ok
+
+
+BENCHMARKS = {
+    "imports": bench_imports,
+    "parse": bench_parse_scaling,
+    "ast": bench_ast,
+    "flat": bench_flat_ast,
+    "visit": bench_visit,
+    "tac": bench_tac,
+    "vm": bench_vm,
+    "symtab": bench_symtab,
+    "deep": bench_deep,
+    "opt": bench_optimize,
+    "dataflow": bench_dataflow,
+    "ssa": bench_ssa,
+    "regalloc": bench_regalloc,
+    "peephole": bench_peephole,
+    "jumps": bench_jumps,
+    "inline": bench_inline,
+}
+
+
+def main(argv=None):
+    names = (argv if argv is not None else sys.argv[1:]) or list(BENCHMARKS)
+    ok = True
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"unknown benchmark '{name}' "
+                  f"(choose from: {', '.join(BENCHMARKS)})")
+            return 2
+        print(f"[{name}] {BENCHMARKS[name].__doc__}")
+        if BENCHMARKS[name]() is False:
+            ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Regenerate the prebuilt lexer/parser tables used by fast start.
+
+    python build_tables.py
+
+Writes lextab.py (PLY lexer tables plus a rule signature) and
+parsetab.bin (LALR tables plus the grammar signature, in marshal format)
+next to the sources.  Run it after editing the token rules
+or the grammar; with COMPILER_FAST_START=1 stale tables are detected by
+signature and ignored, never rewritten.
+"""
+import marshal
+import os
+import sys
+
+os.environ.pop("COMPILER_FAST_START", None)
+
+import ply.lex as lex
+import ply.yacc as yacc
+
+import lexer
+import parser
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LEXTAB = os.path.join(HERE, "lextab.py")
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def build_lextab():
+    _remove(LEXTAB)
+    sys.modules.pop("lextab", None)
+    lex.lex(module=lexer, optimize=True, lextab="lextab", outputdir=HERE)
+    with open(LEXTAB, "a") as f:
+        f.write(f"_lexsignature = {lexer.rules_signature(vars(lexer))!r}\n")
+
+
+def build_parsetab():
+    # Importing parser above already refreshed parsetab.py if it was stale.
+    lr = yacc.LRTable()
+    lr.read_table("parsetab")
+    pinfo = yacc.ParserReflect(vars(parser))
+    pinfo.get_all()
+    productions = [(p.str, p.name, p.len, p.func, p.file, p.line)
+                   for p in lr.lr_productions]
+    with open(parser.TABLES_FILE, "wb") as f:
+        marshal.dump((pinfo.signature(), lr.lr_method, lr.lr_action,
+                      lr.lr_goto, productions), f)
+
+
+def main():
+    build_lextab()
+    build_parsetab()
+    print(f"wrote {LEXTAB}")
+    print(f"wrote {parser.TABLES_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Basic blocks and control-flow edges of a TAC instruction list.
+
+`CFG(code)` splits `code` (a list of [op, arg1, arg2, result], see
+`ThreeAddressCode.instruction_list`) into basic blocks.  A block starts at
+the first instruction, at a label, after a jump, `return`, `func` or
+`endfunc`, and at the start of each function body.  Edges follow the VM's
+flow of control:
+
+- `goto L` continues at label L only; `ifFalse` and `ifTrue` at L and at
+  the next block.
+- `return` and `endfunc` leave the function: no successors.
+- `func` jumps over the definition to the instruction after its
+  `endfunc`.  The body is entered only through calls, so its first block
+  is an extra entry (`entries`), reached by no edge.
+- `call` returns to the next instruction and does not end a block.
+
+Dataflow analyses over the blocks are in dataflow.py.
+"""
+from tac import (BRANCHES, IF_FALSE, IF_TRUE, GOTO, LABEL, FUNC, ENDFUNC,
+                 RETURN)
+
+# opcodes after which flow does not continue with the next instruction in
+# the same block
+ENDS_BLOCK = frozenset((IF_FALSE, IF_TRUE, GOTO, RETURN, FUNC, ENDFUNC))
+
+
+class BasicBlock:
+    __slots__ = ("index", "start", "end", "succs", "preds", "function")
+
+    def __init__(self, index, start, end, function):
+        self.index = index
+        self.start = start      # first instruction
+        self.end = end          # one past the last instruction
+        self.succs = []
+        self.preds = []
+        # block index of the entry of the enclosing function, or None at
+        # the top level
+        self.function = function
+
+    def __repr__(self):
+        return (f"BasicBlock({self.index}, [{self.start}:{self.end}], "
+                f"succs={self.succs})")
+
+
+class CFG:
+    def __init__(self, code):
+        self.code = code
+        self.blocks = []
+        self.entries = []
+        self.block_at = {}      # first instruction -> block index
+        self.label_block = {}   # label operand -> block index
+        self._split()
+        self._link()
+
+    def _split(self):
+        code = self.code
+        leaders = {0} if code else set()
+        for i, (op, a1, a2, res) in enumerate(code):
+            if op == LABEL:
+                leaders.add(i)
+            elif op in ENDS_BLOCK and i + 1 < len(code):
+                leaders.add(i + 1)
+
+        starts = sorted(leaders)
+        function = []  # entry block of each open function
+        entry_after_func = False
+        for n, start in enumerate(starts):
+            end = starts[n + 1] if n + 1 < len(starts) else len(code)
+            block = BasicBlock(n, start, end,
+                               function[-1] if function else None)
+            if entry_after_func:
+                function.append(n)
+                block.function = n
+                self.entries.append(n)
+            elif n == 0:
+                self.entries.append(n)
+            self.blocks.append(block)
+            self.block_at[start] = n
+            if code[start][0] == LABEL:
+                self.label_block[code[start][3]] = n
+            last = code[end - 1][0]
+            entry_after_func = last == FUNC
+            if last == ENDFUNC and function:
+                function.pop()
+
+    def _link(self):
+        code = self.code
+        blocks = self.blocks
+        func_ends = []  # block index of each open `func`
+        for block in blocks:
+            op, a1, a2, res = code[block.end - 1]
+            nxt = block.index + 1 if block.index + 1 < len(blocks) else None
+            if op == GOTO:
+                targets = (self.label_block.get(res),)
+            elif op in BRANCHES:
+                targets = (self.label_block.get(res), nxt)
+            elif op == FUNC:
+                func_ends.append(block.index)
+                targets = ()
+            elif op == ENDFUNC:
+                targets = ()
+                if func_ends:
+                    # the `func` block continues after the definition
+                    self._edge(blocks[func_ends.pop()], nxt)
+            elif op == RETURN:
+                targets = ()
+            else:
+                targets = (nxt,)
+            for target in targets:
+                self._edge(block, target)
+
+    def _edge(self, block, target):
+        if target is not None and target not in block.succs:
+            block.succs.append(target)
+            self.blocks[target].preds.append(block.index)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def instructions(self, block):
+        """The instruction lists of `block`, in order."""
+        return self.code[block.start:block.end]
+
+    def postorder(self):
+        """Indices of the blocks reachable from an entry, each after all
+        of its successors except along back edges."""
+        order = []
+        seen = set()
+        for entry in self.entries:
+            if entry in seen:
+                continue
+            seen.add(entry)
+            stack = [(entry, iter(self.blocks[entry].succs))]
+            while stack:
+                b, succs = stack[-1]
+                for s in succs:
+                    if s not in seen:
+                        seen.add(s)
+                        stack.append((s, iter(self.blocks[s].succs)))
+                        break
+                else:
+                    stack.pop()
+                    order.append(b)
+        return order
+
+    def dominators(self):
+        """Immediate dominator of every block: an entry is its own, and
+        unreachable blocks have None (Cooper, Harvey and Kennedy's
+        iterative algorithm over reverse postorder)."""
+        order = self.postorder()
+        order.reverse()
+        rank = {b: position for position, b in enumerate(order)}
+        idom = [None] * len(self.blocks)
+        for entry in self.entries:
+            idom[entry] = entry
+        changed = True
+        while changed:
+            changed = False
+            for b in order:
+                if idom[b] == b:
+                    continue
+                new = None
+                for p in self.blocks[b].preds:
+                    if idom[p] is None:
+                        continue
+                    if new is None:
+                        new = p
+                        continue
+                    x = p
+                    while x != new:
+                        while rank[x] > rank[new]:
+                            x = idom[x]
+                        while rank[new] > rank[x]:
+                            new = idom[new]
+                if new != idom[b]:
+                    idom[b] = new
+                    changed = True
+        return idom
+
+    def dominance_frontiers(self, idom):
+        """Per block, the set of blocks where its dominance ends."""
+        frontiers = [set() for _ in self.blocks]
+        for block in self.blocks:
+            b = block.index
+            if idom[b] is None or len(block.preds) < 2:
+                continue
+            for p in block.preds:
+                runner = p
+                while idom[runner] is not None and runner != idom[b]:
+                    frontiers[runner].add(b)
+                    if idom[runner] == runner:
+                        break
+                    runner = idom[runner]
+        return frontiers
+
+    def natural_loops(self, idom):
+        """{header: set of blocks} of the natural loops: for each back edge
+        b -> h (h dominates b), h and the blocks that reach b without
+        passing h.  Loops sharing a header are merged."""
+        loops = {}
+        for block in self.blocks:
+            if idom[block.index] is None:
+                continue
+            for h in block.succs:
+                if not dominates(idom, h, block.index):
+                    continue
+                body = loops.setdefault(h, {h})
+                work = [block.index]
+                while work:
+                    b = work.pop()
+                    if b not in body:
+                        body.add(b)
+                        work.extend(p for p in self.blocks[b].preds
+                                    if idom[p] is not None)
+        return loops
+
+
+def dominates(idom, a, b):
+    """True if block `a` dominates block `b`, given the immediate
+    dominators `idom` (see `CFG.dominators`)."""
+    while b != a:
+        if idom[b] == b:
+            return False
+        b = idom[b]
+    return True
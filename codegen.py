@@ -1,280 +1,348 @@
-class ThreeAddressCode:
-    def __init__(self):
-        self.code = []
-        self.temp_counter = 0
-        self.label_counter = 0
-    
-    def new_temp(self):
-        """ایجاد یک متغیر موقت جدید."""
-        self.temp_counter += 1
-        return f"t{self.temp_counter}"
-    
-    def new_label(self):
-        """ایجاد یک برچسب جدید."""
-        self.label_counter += 1
-        return f"L{self.label_counter}"
-    
-    def add(self, op, arg1, arg2, result):
-        """افزودن یک دستور به کد سه آدرسی."""
-        self.code.append((op, str(arg1), str(arg2), str(result)))
-    
-    def print_code(self):
-        """چاپ کد سه آدرسی."""
-        for i, (op, a1, a2, res) in enumerate(self.code):
-            print(f"{i}: ({op}, {a1}, {a2}, {res})")
+from ast_nodes import KIND_NAMES, BINOP, UNARY, LITERAL, LOC_ARRAY
+from semantic import SymbolTable
+from tac import (ThreeAddressCode, NONE, TEMP, CONST, TAG_BITS, TAG_MASK,
+                 WRITES_RESULT, var, ASSIGN, ADD, SUB, MUL, DIV, MOD, AND, OR,
+                 EQ, NE, LT, GT, LE, GE, UMINUS, NOT, INDEX, IF_FALSE, GOTO,
+                 IF_TRUE, LABEL, PRINT, INPUT, CALL, FUNC, ENDFUNC, RETURN,
+                 ITOF, STORE)
+from visitor import Visitor
+
+
+# تبدیل عملگرها به فرم TAC
+TAC_OPS = {
+    '+': ADD, '-': SUB, '*': MUL, '/': DIV, '%': MOD,
+    '&&': AND, '||': OR,
+    '==': EQ, '!=': NE,
+    '<': LT, '>': GT, '<=': LE, '>=': GE
+}
+
 
-class CodeGenerator:
-    def __init__(self, ast, symtab=None):
-        self.ast = ast
-        self.tac = ThreeAddressCode()
-        self.symbol_table = symtab or {}
+class CodeGenerator(Visitor):
+    def __init__(self, ast, symtab=None, compact=True):
+        super().__init__()
+        # ast may be a node tree, a FlatAST or a tuple AST
+        self.ast = self.bind(ast)
+        # With the SymbolTable that analyzed `ast`, variables are the symbol
+        # ids semantic analysis recorded on the nodes; without one, names
+        # are interned into a fresh table (one id per distinct name).
+        self.resolved = symtab is not None
+        self.symtab = symtab if symtab is not None else SymbolTable()
+        self.tac = ThreeAddressCode(self.symtab.names)
+        # variables declared by each enclosing function, innermost last
+        self.function_locals = []
+        # Compact code reads literals as constant operands and computes an
+        # assigned value straight into its variable; otherwise every
+        # literal and assigned value passes through a temp of its own.
+        self.compact = compact
     
     def generate(self):
         """تولید کد سه آدرسی از AST."""
         self.visit(self.ast)
         return self.tac
     
-    def visit(self, node):
-        """پیمایش درخت AST و تولید کد میانه."""
-        if node is None:
-            return None
-        
-        # پردازش لیست‌ها
-        if isinstance(node, list):
-            results = []
-            for n in node:
-                result = self.visit(n)
-                if result is not None:
-                    results.append(result)
-            return results
-        
-        tag = node[0]
-        
-        # برنامه اصلی
-        if tag == "program":
-            statements = node[1]
-            return self.visit(statements)
-        
-        # دستور (stmt)
-        elif tag == "stmt":
-            stmt_content = node[1]
-            return self.visit(stmt_content)
-        
-        # تعریف متغیر
-        elif tag == "var_decl":
-            _, var_type, name, expr = node
-            if expr is not None:
-                expr_temp = self.visit(expr)
-                self.tac.add("=", expr_temp, "_", name)
-            return name
+    def symbol(self, node, name):
+        """Operand for the variable or function `node` names."""
+        if self.resolved:
+            sid = self.tree.get_symbol(node)
+            if sid is not None:
+                return var(sid)
+        return var(self.symtab.intern(name))
+    
+    def store(self, value, target):
+        """Assign operand `value` to `target`: in compact code, a temp the
+        last instruction just computed is replaced by `target` there."""
+        tac = self.tac
+        if self.compact and value & TAG_MASK == TEMP and len(tac) \
+                and tac.result[-1] == value and tac.ops[-1] in WRITES_RESULT:
+            tac.result[-1] = target
+            if value >> TAG_BITS == tac.temp_counter:
+                tac.temp_counter -= 1  # the temp is no longer used
+        else:
+            tac.add(ASSIGN, value, NONE, target)
+
+    def converted(self, value, expr, var_type):
+        """`value`, the operand of `expr`, as stored into a variable of
+        `var_type`: an int stored into a float variable becomes a float."""
+        if var_type != "float" or self.tree.get_type(expr) != "int":
+            return value
+        tac = self.tac
+        if value & TAG_MASK == CONST:
+            return tac.const(float(tac.consts[value >> TAG_BITS]))
+        temp = tac.new_temp()
+        tac.add(ITOF, value, NONE, temp)
+        return temp
+
+    def branch(self, cond, label, when):
+        """Jumping code for condition `cond`: jump to `label` if its value
+        is `when`, else fall through.  `&&` and `||` evaluate their right
+        side only when the left does not decide, and `!` and `true` /
+        `false` compute nothing.  Run it with `yield from` in a handler."""
+        tac, tree = self.tac, self.tree
+        # (node, label, when) still to branch on, or (None, label, None)
+        # for a label to place once the items above it are done
+        work = [(cond, label, when)]
+        while work:
+            node, label, when = work.pop()
+            if node is None:
+                tac.add(LABEL, NONE, NONE, label)
+                continue
+            kind = self._kind(node)
+            if kind == BINOP:
+                op, left, right = tree.fields(node)
+                if op == "&&" or op == "||":
+                    # the left side alone decides when it is false for
+                    # `&&`, true for `||`
+                    decides = op == "||"
+                    if when == decides:
+                        work.append((right, label, when))
+                        work.append((left, label, when))
+                    else:
+                        skip = tac.new_label()
+                        work.append((None, skip, None))
+                        work.append((right, label, when))
+                        work.append((left, skip, decides))
+                    continue
+            elif kind == UNARY:
+                op, expr = tree.fields(node)
+                if op == "!":
+                    work.append((expr, label, not when))
+                    continue
+            elif kind == LITERAL:
+                value = tree.fields(node)[0]
+                if value == "true" or value == "false":
+                    if (value == "true") == when:
+                        tac.add(GOTO, NONE, NONE, label)
+                    continue
+            value = yield node
+            tac.add(IF_TRUE if when else IF_FALSE, value, NONE, label)
+
+    # پردازش لیست‌ها
+    def visit_list(self, nodes):
+        results = []
+        for n in nodes:
+            result = yield n
+            if result is not None:
+                results.append(result)
+        return results
+    
+    # برنامه اصلی
+    def visit_program(self, node, stmts):
+        return (yield stmts)
+    
+    # تعریف متغیر
+    def visit_var_decl(self, node, var_type, name, expr):
+        sid = self.symbol(node, name)
+        if self.function_locals:
+            self.function_locals[-1].append(sid)
+        if expr is not None:
+            expr_temp = yield expr
+            self.store(self.converted(expr_temp, expr, var_type), sid)
+        return sid
+    
+    # تعریف آرایه
+    def visit_var_decl_array(self, node, var_type, name, size):
+        # آرایه‌ها فعلاً ساده
+        sid = self.symbol(node, name)
+        self.tac.arrays[sid] = (var_type, size)
+        if self.function_locals:
+            self.function_locals[-1].append(sid)
+        return sid
+    
+    # انتساب
+    def visit_assign(self, node, loc, expr):
+        expr_temp = yield expr
+        expr_temp = self.converted(expr_temp, expr, self.tree.get_type(loc))
+        if self._kind(loc) == LOC_ARRAY:
+            # an element is stored in place, not loaded into a temp
+            name, index = self.tree.fields(loc)
+            index_temp = yield index
+            array = self.symbol(loc, name)
+            self.tac.add(STORE, index_temp, expr_temp, array)
+            return array
+        loc_name = yield loc
+        self.store(expr_temp, loc_name)
+        return loc_name
+    
+    # عملگر دو تایی
+    def visit_binop(self, node, op, left, right):
+        if op == "&&" or op == "||":
+            # the value of `a && b` is a unless a is true, then b
+            result = self.tac.new_temp()
+            done = self.tac.new_label()
+            self.store((yield left), result)
+            self.tac.add(IF_FALSE if op == "&&" else IF_TRUE, result, NONE,
+                         done)
+            self.store((yield right), result)
+            self.tac.add(LABEL, NONE, NONE, done)
+            return result
+        left_temp = yield left
+        right_temp = yield right
+        result_temp = self.tac.new_temp()
+        self.tac.add(TAC_OPS[op], left_temp, right_temp, result_temp)
+        return result_temp
+    
+    # عملگر یک تایی
+    def visit_unary(self, node, op, expr):
+        expr_temp = yield expr
+        result_temp = self.tac.new_temp()
         
-        # تعریف آرایه
-        elif tag == "var_decl_array":
-            _, var_type, name, size = node
-            # آرایه‌ها فعلاً ساده
-            return name
+        if op == "-":
+            self.tac.add(UMINUS, expr_temp, NONE, result_temp)
+        elif op == "!":
+            self.tac.add(NOT, expr_temp, NONE, result_temp)
         
-        # انتساب
-        elif tag == "assign":
-            _, loc, expr = node
-            expr_temp = self.visit(expr)
-            loc_name = self.visit(loc)
-            self.tac.add("=", expr_temp, "_", loc_name)
-            return loc_name
+        return result_temp
+    
+    # مقادیر ثابت
+    def visit_literal(self, node, value):
+        # pooled as Python values (true/false as bool); tac.const_text
+        # formats them for the listing
+        if value == "true" or value == "false":
+            value = value == "true"
+        operand = self.tac.const(value)
+        if self.compact:
+            return operand
+        temp = self.tac.new_temp()
+        self.tac.add(ASSIGN, operand, NONE, temp)
+        return temp
+    
+    # محل متغیر
+    def visit_loc(self, node, name):
+        return self.symbol(node, name)
+    
+    # محل آرایه
+    def visit_loc_array(self, node, name, index):
+        index_temp = yield index
+        temp = self.tac.new_temp()
+        self.tac.add(INDEX, self.symbol(node, name), index_temp, temp)
+        return temp
+    
+    # چاپ
+    def visit_print(self, node, value):
+        expr_temp = yield value
+        self.tac.add(PRINT, expr_temp, NONE, NONE)
+        return None
+    
+    # خواندن از ورودی
+    def visit_input(self, node, var_name):
+        sid = self.symbol(node, var_name)
+        self.tac.add(INPUT, NONE, NONE, sid)
+        return sid
+    
+    # بلوک
+    def visit_block(self, node, stmts):
+        return (yield stmts)
+    
+    # دستور if
+    def visit_if(self, node, cond, then_block, elif_part, else_part):
+        end_label = self.tac.new_label()
+        arms = [(cond, then_block)]
+        while elif_part is not None:
+            elif_cond, body, elif_part = self.tree.fields(elif_part)
+            arms.append((elif_cond, body))
         
-        # عملگر دو تایی
-        elif tag == "binop":
-            _, op, left, right = node
-            left_temp = self.visit(left)
-            right_temp = self.visit(right)
-            result_temp = self.tac.new_temp()
-            
-            # تبدیل عملگرها به فرم TAC
-            op_map = {
-                '+': '+', '-': '-', '*': '*', '/': '/', '%': '%',
-                '&&': 'and', '||': 'or',
-                '==': '==', '!=': '!=',
-                '<': '<', '>': '>', '<=': '<=', '>=': '>='
-            }
-            tac_op = op_map.get(op, op)
-            
-            self.tac.add(tac_op, left_temp, right_temp, result_temp)
-            return result_temp
+        for n, (arm_cond, body) in enumerate(arms):
+            last = n == len(arms) - 1 and else_part is None
+            next_label = end_label if last else self.tac.new_label()
+            # شرط
+            yield from self.branch(arm_cond, next_label, False)
+            yield body
+            if not last:
+                self.tac.add(GOTO, NONE, NONE, end_label)
+                self.tac.add(LABEL, NONE, NONE, next_label)
         
-        # عملگر یک تایی
-        elif tag == "unary":
-            _, op, expr = node
-            expr_temp = self.visit(expr)
-            result_temp = self.tac.new_temp()
-            
-            if op == "-":
-                self.tac.add("uminus", expr_temp, "_", result_temp)
-            elif op == "!":
-                self.tac.add("not", expr_temp, "_", result_temp)
-            
-            return result_temp
+        # else بخش
+        if else_part is not None:
+            yield else_part
         
-        # مقادیر ثابت
-        elif tag == "literal":
-            value = node[1]
-            # برای رشته‌ها و کاراکترها
-            if isinstance(value, str):
-                # اگر رشته است
-                if len(value) > 1 or value in ['true', 'false']:
-                    temp = self.tac.new_temp()
-                    self.tac.add("=", f'"{value}"', "_", temp)
-                    return temp
-                # اگر کاراکتر است
-                else:
-                    temp = self.tac.new_temp()
-                    self.tac.add("=", f"'{value}'", "_", temp)
-                    return temp
-            else:
-                temp = self.tac.new_temp()
-                self.tac.add("=", value, "_", temp)
-                return temp
+        self.tac.add(LABEL, NONE, NONE, end_label)
+        return None
+    
+    # دستور while
+    def visit_while(self, node, cond, block):
+        start_label = self.tac.new_label()
+        end_label = self.tac.new_label()
         
-        # محل متغیر
-        elif tag == "loc":
-            return node[1]
+        self.tac.add(LABEL, NONE, NONE, start_label)
         
-        # محل آرایه
-        elif tag == "loc_array":
-            _, name, index = node
-            index_temp = self.visit(index)
-            temp = self.tac.new_temp()
-            self.tac.add("[]", name, index_temp, temp)
-            return temp
+        # شرط
+        yield from self.branch(cond, end_label, False)
         
-        # چاپ
-        elif tag == "print":
-            _, expr = node
-            expr_temp = self.visit(expr)
-            self.tac.add("print", expr_temp, "_", "_")
-            return None
+        # بدنه حلقه
+        yield block
+        self.tac.add(GOTO, NONE, NONE, start_label)
         
-        # خواندن از ورودی
-        elif tag == "input":
-            _, var_name = node
-            self.tac.add("input", "_", "_", var_name)
-            return var_name
+        self.tac.add(LABEL, NONE, NONE, end_label)
+        return None
+    
+    # دستور for
+    def visit_for(self, node, init, cond, step, block):
+        start_label = self.tac.new_label()
+        end_label = self.tac.new_label()
         
-        # بلوک
-        elif tag == "block":
-            _, stmts = node
-            return self.visit(stmts)
+        # مقداردهی اولیه
+        yield init
         
-        # دستور if
-        elif tag == "if":
-            _, cond, then_block, elif_part, else_part = node
-            
-            else_label = self.tac.new_label()
-            end_label = self.tac.new_label()
-            
-            # شرط
-            cond_temp = self.visit(cond)
-            self.tac.add("ifFalse", cond_temp, "_", else_label)
-            
-            # then بخش
-            self.visit(then_block)
-            self.tac.add("goto", "_", "_", end_label)
-            
-            # else بخش
-            self.tac.add("label", "_", "_", else_label)
-            if else_part:
-                self.visit(else_part)
-            
-            self.tac.add("label", "_", "_", end_label)
-            return None
+        self.tac.add(LABEL, NONE, NONE, start_label)
         
-        # دستور while
-        elif tag == "while":
-            _, cond, block = node
-            
-            start_label = self.tac.new_label()
-            end_label = self.tac.new_label()
-            
-            self.tac.add("label", "_", "_", start_label)
-            
-            # شرط
-            cond_temp = self.visit(cond)
-            self.tac.add("ifFalse", cond_temp, "_", end_label)
-            
-            # بدنه حلقه
-            self.visit(block)
-            self.tac.add("goto", "_", "_", start_label)
-            
-            self.tac.add("label", "_", "_", end_label)
-            return None
+        # شرط
+        yield from self.branch(cond, end_label, False)
         
-        # دستور for
-        elif tag == "for":
-            _, init, cond, step, block = node
-            
-            start_label = self.tac.new_label()
-            end_label = self.tac.new_label()
-            
-            # مقداردهی اولیه
-            self.visit(init)
-            
-            self.tac.add("label", "_", "_", start_label)
-            
-            # شرط
-            cond_temp = self.visit(cond)
-            self.tac.add("ifFalse", cond_temp, "_", end_label)
-            
-            # بدنه حلقه
-            self.visit(block)
-            
-            # گام
-            self.visit(step)
-            self.tac.add("goto", "_", "_", start_label)
-            
-            self.tac.add("label", "_", "_", end_label)
-            return None
+        # بدنه حلقه
+        yield block
         
-        # دستور return
-        elif tag == "return":
-            if len(node) > 1:
-                expr = node[1]
-                if expr is not None:
-                    expr_temp = self.visit(expr)
-                    self.tac.add("return", expr_temp, "_", "_")
-            else:
-                self.tac.add("return", "_", "_", "_")
-            return None
+        # گام
+        yield step
+        self.tac.add(GOTO, NONE, NONE, start_label)
         
-        # فراخوانی تابع
-        elif tag == "call":
-            _, func_name, args = node
-            if args is None:
-                args = []
-            
-            # پردازش آرگومان‌ها
-            arg_temps = []
-            for arg in args:
-                arg_temp = self.visit(arg)
-                arg_temps.append(arg_temp)
-            
-            # اگر تابع مقداری برگرداند
-            if func_name != "print" and func_name != "input":
-                result_temp = self.tac.new_temp()
-                arg_str = ",".join(arg_temps)
-                self.tac.add("call", func_name, arg_str, result_temp)
-                return result_temp
-            else:
-                # برای print/input قبلاً پردازش شده
-                return None
+        self.tac.add(LABEL, NONE, NONE, end_label)
+        return None
+    
+    # دستور return
+    def visit_return(self, node, expr):
+        expr_temp = NONE
+        if expr is not None:
+            expr_temp = yield expr
+        self.tac.add(RETURN, expr_temp, NONE, NONE)
+        return None
+    
+    # فراخوانی تابع
+    def visit_call(self, node, func_name, args):
+        if args is None:
+            args = []
         
-        # تعریف تابع (فعلاً ساده)
-        elif tag == "func_decl":
-            _, name, params, body = node
-            self.tac.add("func", name, "_", "_")
-            self.visit(body)
-            self.tac.add("endfunc", "_", "_", "_")
-            return None
+        # پردازش آرگومان‌ها
+        arg_temps = []
+        for arg in args:
+            arg_temp = yield arg
+            arg_temps.append(arg_temp)
         
-        # هشدار برای nodeهای پردازش نشده
+        # اگر تابع مقداری برگرداند
+        if func_name != "print" and func_name != "input":
+            result_temp = self.tac.new_temp()
+            self.tac.add(CALL, self.symbol(node, func_name),
+                         self.tac.args(arg_temps), result_temp)
+            return result_temp
         else:
-            print(f"Warning: Unhandled node type '{tag}' in code generation")
+            # برای print/input قبلاً پردازش شده
             return None
+    
+    # تعریف تابع (فعلاً ساده)
+    def visit_func_decl(self, node, name, params, body):
+        fn = self.symbol(node, name)
+        tree = self.tree
+        param_ops = tuple(self.symbol(p, tree.fields(p)[1])
+                          for p in params or ())
+        self.tac.add(FUNC, fn, NONE, NONE)
+        self.function_locals.append([])
+        yield body
+        self.tac.functions[fn] = (param_ops,
+                                  tuple(self.function_locals.pop()))
+        self.tac.add(ENDFUNC, NONE, NONE, NONE)
+        return None
+    
+    # هشدار برای nodeهای پردازش نشده
+    def generic_visit(self, node, *fields):
+        kind = KIND_NAMES[self.tree.kind(node)]
+        print(f"Warning: Unhandled node type '{kind}' in code generation")
+        return None
@@ -0,0 +1,128 @@
+"""Reentrant compiler sessions.
+
+`lexer.py` and `parser.py` expose one shared lexer/parser with global error
+lists.  A `Compiler` owns a clone of each plus its own error sinks and line
+state, so independent sessions can run at the same time (one per thread or
+per asyncio task).  The module-level objects keep working as before.
+"""
+import copy
+import threading
+
+from lexer import lexer as _lexer
+from parser import parser as _parser, syntax_error_message
+from ast_nodes import NodeBuilder
+from semantic import SemanticAnalyzer
+from codegen import CodeGenerator
+
+
+class CompileResult:
+    def __init__(self):
+        self.tokens = []
+        self.ast = None
+        self.analyzer = None
+        self.tac = None
+        # (pass name, instructions removed) of each optimization pass run
+        self.optimizations = []
+        self.lex_errors = []
+        self.syntax_errors = []
+        self.semantic_errors = []
+
+    @property
+    def errors(self):
+        """Errors of the phase that stopped the pipeline (empty on success)."""
+        return self.lex_errors or self.syntax_errors or self.semantic_errors
+
+    @property
+    def ok(self):
+        return self.tac is not None
+
+
+class Compiler:
+    def __init__(self):
+        self.lexer = _lexer.clone()
+        self.lex_errors = []
+        self.lexer.lex_errors = self.lex_errors
+
+        # LRParser keeps its parse stacks on the instance, so each session
+        # needs its own copy; the (read-only) LALR tables stay shared.
+        self.parser = copy.copy(_parser)
+        self.errors = []
+        self.parser.errorfunc = self._syntax_error
+
+    def _syntax_error(self, p):
+        self.errors.append(syntax_error_message(p, self.lexer))
+
+    def reset(self):
+        """Clear error sinks and rewind line numbers before a new run."""
+        self.lex_errors.clear()
+        self.errors.clear()
+        self.lexer.lineno = 1
+
+    def tokenize(self, source):
+        self.reset()
+        self.lexer.input(source)
+        return list(iter(self.lexer.token, None))
+
+    def parse(self, source, builder=None):
+        """Parse `source` into a node tree, or into whatever `builder`
+        produces (e.g. `flat_ast.FlatBuilder()` for a FlatAST)."""
+        self.errors.clear()
+        self.lexer.lineno = 1
+        builder = builder or NodeBuilder
+        self.parser.builder = builder
+        return builder.finish(self.parser.parse(source, lexer=self.lexer))
+
+    def compile(self, source, builder=None, optimize=False):
+        """Run the whole pipeline, stopping at the first phase with errors.
+
+        With `optimize`, the TAC goes through the passes in `optimize.py`
+        (True for all of them, or a list of pass names)."""
+        result = CompileResult()
+
+        # === LEXER ===
+        result.tokens = self.tokenize(source)
+        if self.lex_errors:
+            result.lex_errors = list(self.lex_errors)
+            return result
+
+        # === PARSER ===
+        result.ast = self.parse(source, builder)
+        if self.errors:
+            result.syntax_errors = list(self.errors)
+            return result
+
+        # === SEMANTIC ANALYSIS ===
+        result.analyzer = SemanticAnalyzer()
+        result.analyzer.check(result.ast)
+        if result.analyzer.errors:
+            result.semantic_errors = list(result.analyzer.errors)
+            return result
+
+        # === CODE GENERATION ===
+        result.tac = CodeGenerator(result.ast,
+                                   result.analyzer.symtab).generate()
+
+        # === OPTIMIZATION ===
+        if optimize:
+            # the passes load only when asked for, keeping cold start lean
+            from optimize import optimize as run_passes
+
+            result.optimizations = run_passes(
+                result.tac, None if optimize is True else optimize)
+        return result
+
+
+_local = threading.local()
+
+
+def get_compiler():
+    """The calling thread's private `Compiler` session."""
+    compiler = getattr(_local, "compiler", None)
+    if compiler is None:
+        compiler = _local.compiler = Compiler()
+    return compiler
+
+
+def compile_source(source, optimize=False):
+    """Thread-safe single-shot compile using a per-thread session."""
+    return get_compiler().compile(source, optimize=optimize)
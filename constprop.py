@@ -0,0 +1,216 @@
+"""Constant propagation and folding over TAC.
+
+`fold_constants(tac)` finds, for every block of the CFG, which temps and
+variables hold a known constant on entry.  It iterates to a fixpoint over
+the edges that can actually be taken: a branch on a known condition has
+a single successor, so code behind a constant-false test does not spoil
+the constants after it.  It then rewrites the code:
+
+- reads of known temps and variables become constant operands;
+- operators on constants are evaluated (with the VM's `tac.BINARY` and
+  `tac.UNARY`, so int/int stays int, `/` truncates like C, int/float
+  mixes give floats, and an int stored into a float variable passes
+  through `float`) and become `(=, value, _, result)`;
+- `ifFalse` or `ifTrue` on a constant becomes a `goto` or disappears;
+- temps nobody reads any more are dropped, which removes the literal
+  setup code (`(=, 10, _, t1)`) the code generator emits.
+
+Division by zero and other operations that fail at run time are left for
+the VM to report.
+"""
+import heapq
+
+from cfg import CFG
+from dataflow import liveness, operand_bit
+from tac import (TEMP, VAR, CONST, TAG_BITS, TAG_MASK, NONE, BINARY, UNARY,
+                 WRITES_RESULT, BRANCHES, ASSIGN, IF_TRUE, GOTO, CALL,
+                 const_key)
+
+
+def fold_constants(tac):
+    """Propagate and fold constants in `tac`, in place; returns the number
+    of instructions removed."""
+    code = tac.instruction_list()
+    before = len(code)
+    cfg = CFG(code)
+    _rewrite(tac, cfg, _propagate(tac, cfg))
+    tac.replace(remove_dead_temps(tac, code))
+    return before - len(tac)
+
+
+# A state maps a temp or variable operand to its known value as its
+# `tac.const_key`, (type, value, ...), so 1, 1.0 and true, or 0.0 and
+# -0.0, stay different constants.  A missing operand is not known to be
+# constant.
+
+def _value(tac, state, a):
+    if a & TAG_MASK == CONST:
+        value = tac.consts[a >> TAG_BITS]
+        return const_key(value)
+    return state.get(a)
+
+
+def evaluate(tac, state, op, a1, a2):
+    """`tac.const_key` of the value instruction `op` computes, or None if
+    unknown."""
+    if op == ASSIGN:
+        return _value(tac, state, a1)
+    if op in BINARY:
+        x = _value(tac, state, a1)
+        y = _value(tac, state, a2)
+        if x is None or y is None:
+            return None
+        f = BINARY[op]
+    elif op in UNARY:
+        x = _value(tac, state, a1)
+        if x is None:
+            return None
+        f = UNARY[op]
+        y = None
+    else:
+        return None
+    try:
+        value = f(x[1]) if y is None else f(x[1], y[1])
+    except (ArithmeticError, TypeError, ValueError):
+        return None
+    return const_key(value)
+
+
+def _transfer(tac, state, op, a1, a2, res):
+    if op not in WRITES_RESULT:
+        return
+    value = evaluate(tac, state, op, a1, a2)
+    if value is None:
+        state.pop(res, None)
+    else:
+        state[res] = value
+    if op == CALL:
+        # the callee may assign any global
+        for a in [a for a in state if a & TAG_MASK == VAR]:
+            del state[a]
+
+
+def _successors(tac, cfg, block, state):
+    """Successors of `block` that can be reached, given its exit state."""
+    op, a1, a2, res = cfg.code[block.end - 1]
+    if op in BRANCHES:
+        cond = _value(tac, state, a1)
+        if cond is not None:
+            if bool(cond[1]) == (op == IF_TRUE):
+                target = cfg.label_block.get(res)
+                return [target] if target is not None else []
+            nxt = block.index + 1
+            return [nxt] if nxt < len(cfg.blocks) else []
+    return block.succs
+
+
+def _live(tac, state, live):
+    return {a: v for a, v in state.items()
+            if live >> operand_bit(tac, a) & 1}
+
+
+def _propagate(tac, cfg):
+    """Entry state of every block (None for blocks never reached).
+
+    States only keep operands that are live, so they stay small however
+    many variables the program has."""
+    blocks = cfg.blocks
+    live_in, live_out = liveness(cfg, tac)
+    entries = set(cfg.entries)
+    in_states = [None] * len(blocks)
+    out_states = [None] * len(blocks)
+    taken = [()] * len(blocks)
+    # visited in reverse postorder, like dataflow.solve
+    order = cfg.postorder()
+    order.reverse()
+    rank = {b: position for position, b in enumerate(order)}
+    for b in cfg.entries:
+        in_states[b] = {}
+    work = [rank[b] for b in cfg.entries]
+    heapq.heapify(work)
+    queued = set(cfg.entries)
+
+    while work:
+        b = order[heapq.heappop(work)]
+        queued.discard(b)
+        block = blocks[b]
+        state = dict(in_states[b])
+        for op, a1, a2, res in cfg.instructions(block):
+            _transfer(tac, state, op, a1, a2, res)
+        taken[b] = _successors(tac, cfg, block, state)
+        out_states[b] = _live(tac, state, live_out[b])
+        for s in taken[b]:
+            if s in entries:
+                continue
+            merged = None
+            for p in blocks[s].preds:
+                if out_states[p] is None or s not in taken[p]:
+                    continue
+                if merged is None:
+                    merged = dict(out_states[p])
+                else:
+                    other = out_states[p]
+                    merged = {a: v for a, v in merged.items()
+                              if other.get(a) == v}
+            merged = _live(tac, merged, live_in[s])
+            if merged != in_states[s]:
+                in_states[s] = merged
+                if s not in queued:
+                    queued.add(s)
+                    heapq.heappush(work, rank[s])
+    return in_states
+
+
+def _substitute(tac, state, a):
+    if a & TAG_MASK in (TEMP, VAR) and a in state:
+        return tac.const(state[a][1])
+    return a
+
+
+def _rewrite(tac, cfg, in_states):
+    code = cfg.code
+    for block in cfg:
+        if in_states[block.index] is None:
+            continue  # unreachable: left alone
+        state = dict(in_states[block.index])
+        for i in range(block.start, block.end):
+            op, a1, a2, res = ins = code[i]
+            tac.map_reads(ins, lambda a: _substitute(tac, state, a))
+            if op in BINARY or op in UNARY:
+                value = evaluate(tac, state, op, ins[1], ins[2])
+                if value is not None:
+                    code[i] = [ASSIGN, tac.const(value[1]), NONE, res]
+            elif op in BRANCHES and ins[1] & TAG_MASK == CONST:
+                if bool(tac.consts[ins[1] >> TAG_BITS]) != (op == IF_TRUE):
+                    code[i] = None
+                else:
+                    code[i] = [GOTO, NONE, NONE, res]
+            _transfer(tac, state, op, a1, a2, res)
+
+
+def remove_dead_temps(tac, code):
+    """`code` without the side-effect-free instructions whose result is a
+    temp that is never read."""
+    reads = {}
+    for ins in code:
+        if ins is not None:
+            for a in tac.reads(ins[0], ins[1], ins[2]):
+                if a & TAG_MASK == TEMP:
+                    reads[a] = reads.get(a, 0) + 1
+
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(code) - 1, -1, -1):
+            ins = code[i]
+            if ins is None:
+                continue
+            op, a1, a2, res = ins
+            if res & TAG_MASK == TEMP and not reads.get(res) \
+                    and tac.discardable(op, a2):
+                code[i] = None
+                changed = True
+                for a in tac.reads(op, a1, a2):
+                    if a & TAG_MASK == TEMP:
+                        reads[a] -= 1
+    return [ins for ins in code if ins is not None]
@@ -0,0 +1,231 @@
+"""Bitset dataflow analyses over a `cfg.CFG`.
+
+`solve` is a generic worklist solver for gen/kill problems whose sets are
+Python ints used as bitsets: union and intersection are `|` and `&` on a
+whole set at once, so a pass over a block costs a few big-int operations
+however many facts are tracked.  It visits blocks in reverse postorder
+(postorder for backward problems) and only revisits a block when the
+value flowing into it changed.  The worklist is a heap on that order, so
+a change found late in a loop is propagated in one more sweep instead of
+rippling block by block through everything after it.
+
+The analyses built on it:
+
+- `liveness`: temps and variables that may be read before being written
+  again (backward, union), indexed by `operand_bit`;
+- `reaching_definitions`: instructions whose write may still be the
+  current value (forward, union);
+- `available_expressions`: operator instructions whose value is still
+  current on every path (forward, intersection).
+
+A `call` may read and assign any variable: globals are shared with the
+callee.  The VM restores a function's own parameters, locals and temps
+when it returns (see `frame_vars`).
+"""
+import heapq
+
+from tac import (TEMP, VAR, TAG_BITS, TAG_MASK, WRITES_RESULT, BINARY, UNARY,
+                 ENDFUNC, RETURN, CALL)
+
+
+def solve(cfg, gen, kill, forward=True, may=True, boundary=None, top=0):
+    """Solve a gen/kill problem; returns the (block start, block end) sets
+    of every block.
+
+    `gen` and `kill` are per-block bitsets.  A block transfers its input
+    set `x` to `gen | (x & ~kill)`, from start to end when `forward`, from
+    end to start otherwise.  Sets meet by union when `may` and by
+    intersection otherwise; `top` is the full set an intersection starts
+    from.  `boundary` maps a block to a set joined into its input, such as
+    the facts at a function entry or exit."""
+    blocks = cfg.blocks
+    n = len(blocks)
+    boundary = boundary or {}
+    order = cfg.postorder()
+    if forward:
+        order.reverse()
+    reached = set(order)
+    order.extend(b for b in range(n) if b not in reached)
+    sources = [block.preds if forward else block.succs for block in blocks]
+    targets = [block.succs if forward else block.preds for block in blocks]
+
+    rank = [0] * n
+    for position, b in enumerate(order):
+        rank[b] = position
+
+    initial = 0 if may else top
+    inputs = [initial] * n
+    outputs = [initial] * n
+    work = list(range(n))  # ranks, already a heap
+    queued = [True] * n
+    while work:
+        b = order[heapq.heappop(work)]
+        queued[b] = False
+        if may:
+            x = boundary.get(b, 0)
+            for p in sources[b]:
+                x |= outputs[p]
+        else:
+            x = boundary.get(b, top)
+            for p in sources[b]:
+                x &= outputs[p]
+        inputs[b] = x
+        out = gen[b] | (x & ~kill[b])
+        if out != outputs[b]:
+            outputs[b] = out
+            for s in targets[b]:
+                if not queued[s]:
+                    queued[s] = True
+                    heapq.heappush(work, rank[s])
+    return (inputs, outputs) if forward else (outputs, inputs)
+
+
+def _bits(a, tac):
+    return 1 << operand_bit(tac, a)
+
+
+# ----- liveness -----
+
+def operand_bit(tac, a):
+    """Bit number of temp or variable operand `a` in liveness bitsets.
+
+    Variables come first: temps rarely live across blocks, so the sets
+    stay as small as the program's variable count."""
+    if a & TAG_MASK == VAR:
+        return a >> TAG_BITS
+    return len(tac.names) + (a >> TAG_BITS)
+
+
+def frame_vars(cfg, tac, entry):
+    """Bitset of the parameters and locals of the function whose body
+    starts at block `entry`; the VM restores them when the function
+    returns."""
+    fn = cfg.code[cfg.blocks[entry].start - 1][1]
+    params, local_vars = tac.functions.get(fn, ((), ()))
+    bits = 0
+    for a in params + local_vars:
+        bits |= _bits(a, tac)
+    return bits
+
+
+def liveness(cfg, tac):
+    """(live_in, live_out) bitsets of every block.
+
+    Every variable but the function's own parameters and locals is live
+    when a function returns, since its caller may read the globals it
+    assigned."""
+    code = cfg.code
+    all_vars = (1 << len(tac.names)) - 1
+    uses = []
+    defs = []
+    for block in cfg:
+        use = kill = 0
+        for op, a1, a2, res in cfg.instructions(block):
+            for a in tac.reads(op, a1, a2):
+                if a & TAG_MASK in (TEMP, VAR):
+                    bit = _bits(a, tac)
+                    if not kill & bit:
+                        use |= bit
+            if op == CALL:
+                use |= all_vars & ~kill
+            if op in WRITES_RESULT and res & TAG_MASK in (TEMP, VAR):
+                kill |= _bits(res, tac)
+        uses.append(use)
+        defs.append(kill)
+
+    exits = {}
+    for block in cfg:
+        if block.function is not None \
+                and code[block.end - 1][0] in (RETURN, ENDFUNC):
+            exits[block.index] = all_vars & ~frame_vars(
+                cfg, tac, block.function)
+    return solve(cfg, uses, defs, forward=False, boundary=exits)
+
+
+# ----- reaching definitions -----
+
+def reaching_definitions(cfg, tac):
+    """(defs, calls, reach_in, reach_out): `defs` lists the indices of
+    the instructions that write a temp or variable, and bit k of a reach
+    set stands for `defs[k]`.
+
+    A call is a definition of its result and, for a pass that needs it, a
+    possible definition of every variable: `calls` in the result is the
+    bitset of the definitions that are calls."""
+    code = cfg.code
+    defs = []
+    of = {}  # operand -> bitset of its definitions
+    calls = 0
+    for i, (op, a1, a2, res) in enumerate(code):
+        if op in WRITES_RESULT and res & TAG_MASK in (TEMP, VAR):
+            bit = 1 << len(defs)
+            defs.append(i)
+            of[res] = of.get(res, 0) | bit
+            if op == CALL:
+                calls |= bit
+
+    gen = []
+    kill = []
+    k = 0
+    for block in cfg:
+        g = x = 0
+        for i in range(block.start, block.end):
+            op, a1, a2, res = code[i]
+            if op in WRITES_RESULT and res & TAG_MASK in (TEMP, VAR):
+                bit = 1 << k
+                k += 1
+                others = of[res] & ~bit
+                g = (g & ~others) | bit
+                x |= others
+        gen.append(g)
+        kill.append(x & ~g)
+    reach_in, reach_out = solve(cfg, gen, kill)
+    return defs, calls, reach_in, reach_out
+
+
+# ----- available expressions -----
+
+def available_expressions(cfg, tac):
+    """(exprs, avail_in, avail_out): `exprs` lists the distinct
+    (op, arg1, arg2) computations of operator instructions, and bit k of an
+    avail set means `exprs[k]` was computed on every path and none of its
+    operands was written since.  A call kills every expression that reads
+    a variable."""
+    code = cfg.code
+    exprs = []
+    index = {}
+    using = {}      # operand -> bitset of the expressions reading it
+    var_exprs = 0   # expressions reading a variable
+    for op, a1, a2, res in code:
+        if op in BINARY or op in UNARY:
+            key = (op, a1, a2)
+            if key not in index:
+                bit = 1 << len(exprs)
+                index[key] = len(exprs)
+                exprs.append(key)
+                for a in (a1, a2):
+                    if a & TAG_MASK in (TEMP, VAR):
+                        using[a] = using.get(a, 0) | bit
+                        if a & TAG_MASK == VAR:
+                            var_exprs |= bit
+
+    gen = []
+    kill = []
+    for block in cfg:
+        g = x = 0
+        for op, a1, a2, res in cfg.instructions(block):
+            if op in BINARY or op in UNARY:
+                g |= 1 << index[(op, a1, a2)]
+            if op in WRITES_RESULT:
+                killed = using.get(res, 0)
+                if op == CALL:
+                    killed |= var_exprs
+                g &= ~killed
+                x |= killed
+        gen.append(g)
+        kill.append(x & ~g)
+    top = (1 << len(exprs)) - 1
+    boundary = {b: 0 for b in cfg.entries}
+    avail_in, avail_out = solve(cfg, gen, kill, may=False,
+                                boundary=boundary, top=top)
+    return exprs, avail_in, avail_out
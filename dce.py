@@ -0,0 +1,109 @@
+"""Dead code elimination over TAC.
+
+`eliminate_dead_code(tac)` repeats, until nothing changes:
+
+- unreachable blocks are dropped: blocks no path from the program start
+  or a function entry reaches, such as the code after a `goto` or behind a
+  branch constant propagation decided.  `func` and `endfunc` stay, so
+  the function bodies keep their bounds;
+- a jump or branch to the label right after it is dropped, and so are
+  labels no jump refers to;
+- instructions that only compute a value (see
+  `ThreeAddressCode.discardable`) are dropped when the temp or variable they write is dead: no path from them reads
+  it before it is written again (`dataflow.liveness`).
+
+`call` and `input` are kept whatever they write, and so are `[]`, `/`
+and `%` when they could fail at run time.  A `[]=` element store writes
+no temp or variable, so it always stays.
+"""
+from cfg import CFG
+from dataflow import liveness, operand_bit
+from tac import (TEMP, VAR, TAG_MASK, WRITES_RESULT, BRANCHES, GOTO, LABEL,
+                 FUNC, ENDFUNC, CALL)
+
+
+def eliminate_dead_code(tac):
+    """Remove dead and unreachable code from `tac`, in place; returns the
+    number of instructions removed."""
+    code = tac.instruction_list()
+    before = len(code)
+    changed = True
+    while changed:
+        cfg = CFG(code)
+        code, changed = remove_unreachable(cfg)
+        code, jumps = remove_useless_jumps(code)
+        cfg = CFG(code)
+        code, stores = _remove_dead_stores(tac, cfg)
+        changed = changed or jumps or stores
+    tac.replace(code)
+    return before - len(tac)
+
+
+def remove_unreachable(cfg):
+    """The code of `cfg` without its unreachable blocks, and whether any
+    instruction went."""
+    seen = set(cfg.entries)
+    work = list(seen)
+    while work:
+        for s in cfg.blocks[work.pop()].succs:
+            if s not in seen:
+                seen.add(s)
+                work.append(s)
+    if len(seen) == len(cfg.blocks):
+        return cfg.code, False
+    code = []
+    for block in cfg:
+        if block.index in seen:
+            code.extend(cfg.instructions(block))
+        else:
+            code.extend(ins for ins in cfg.instructions(block)
+                        if ins[0] == FUNC or ins[0] == ENDFUNC)
+    return code, len(code) != len(cfg.code)
+
+
+def remove_useless_jumps(code):
+    """`code` without jumps to the label after them and unused labels,
+    and whether any instruction went."""
+    changed = False
+    # a jump to a label that follows it with only labels in between
+    kept = []
+    for i, ins in enumerate(code):
+        if ins[0] == GOTO or ins[0] in BRANCHES:
+            j = i + 1
+            while j < len(code) and code[j][0] == LABEL \
+                    and code[j][3] != ins[3]:
+                j += 1
+            if j < len(code) and code[j][0] == LABEL:
+                changed = True
+                continue
+        kept.append(ins)
+
+    targets = {ins[3] for ins in kept if ins[0] == GOTO or ins[0] in BRANCHES}
+    code = [ins for ins in kept if ins[0] != LABEL or ins[3] in targets]
+    return code, changed or len(code) != len(kept)
+
+
+def _remove_dead_stores(tac, cfg):
+    code = cfg.code
+    live_in, live_out = liveness(cfg, tac)
+    all_vars = (1 << len(tac.names)) - 1
+    dead = []
+    for block in cfg:
+        live = live_out[block.index]
+        for i in range(block.end - 1, block.start - 1, -1):
+            op, a1, a2, res = code[i]
+            if op in WRITES_RESULT and res & TAG_MASK in (TEMP, VAR):
+                bit = 1 << operand_bit(tac, res)
+                if not live & bit and tac.discardable(op, a2):
+                    dead.append(i)
+                    continue
+                live &= ~bit
+            if op == CALL:
+                live |= all_vars
+            for a in tac.reads(op, a1, a2):
+                if a & TAG_MASK in (TEMP, VAR):
+                    live |= 1 << operand_bit(tac, a)
+    if not dead:
+        return code, False
+    dead = set(dead)
+    return [ins for i, ins in enumerate(code) if i not in dead], True
@@ -0,0 +1,377 @@
+"""Flat, array-backed AST ("struct of arrays").
+
+Nodes are rows in parallel `array` columns instead of Python objects:
+
+    kind     node kind code (ast_nodes.PROGRAM, ...)
+    op       operator (OPS) or declared type (TYPES) index
+    value    index into the identifier/literal pool, -1 if unused
+    lineno   source line
+    first    offset of the node's first child in `children`
+    count    number of children
+
+`children` holds node ids (-1 for a missing optional child).  Nodes are
+stored in post-order, so the root is the last row.
+
+`FlatBuilder` has the same constructor names as `NodeBuilder`, so the
+parser can target either (`Compiler.parse(source, FlatBuilder())`).  A
+`FlatAST` answers the tree protocol used by the passes -- `kind(n)`,
+`fields(n)`, `set_type(n, t)`, `set_symbol(n, sid)` -- on plain integer
+node ids, and can be serialized with `to_bytes()` and reopened zero-copy
+from a buffer or an mmapped file.
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from ast_nodes import (PROGRAM, VAR_DECL, VAR_DECL_ARRAY, FUNC_DECL, PARAM,
+                       BLOCK, CALL, ASSIGN, LOC, LOC_ARRAY, IF, ELIF, WHILE,
+                       FOR, PRINT, INPUT, RETURN, BREAK, CONTINUE, BINOP,
+                       UNARY, LITERAL, NODE_CLASSES)
+
+OPS = ("+", "-", "*", "/", "%", "&&", "||", "==", "!=", "<", "<=", ">", ">=",
+       "!")
+TYPES = ("int", "float", "bool", "char", "string")
+_OP_INDEX = {op: i for i, op in enumerate(OPS)}
+_TYPE_INDEX = {t: i for i, t in enumerate(TYPES)}
+
+# resolved expression types stored in FlatAST.types (0 = unknown)
+_RESOLVED = (None,) + TYPES + ("func",)
+_RESOLVED_INDEX = {t: i for i, t in enumerate(_RESOLVED)}
+
+MAGIC = b"FAST"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBxxIIiI")
+
+
+class FlatBuilder:
+    """Parser target that appends nodes to array columns."""
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.ops = array("B")
+        self.values = array("i")
+        self.linenos = array("i")
+        self.firsts = array("i")
+        self.counts = array("i")
+        self.children = array("i")
+        self.pool = []
+        self._pool_index = {}
+
+    def _intern(self, value):
+        key = (type(value), value)
+        index = self._pool_index.get(key)
+        if index is None:
+            index = self._pool_index[key] = len(self.pool)
+            self.pool.append(value)
+        return index
+
+    def _add(self, kind, op, value, lineno, children=()):
+        node = len(self.kinds)
+        self.kinds.append(kind)
+        self.ops.append(op)
+        self.values.append(value)
+        self.linenos.append(lineno)
+        self.firsts.append(len(self.children))
+        self.counts.append(len(children))
+        self.children.extend([-1 if c is None else c for c in children])
+        return node
+
+    def program(self, stmts, lineno=0):
+        return self._add(PROGRAM, 0, -1, lineno, stmts)
+
+    def var_decl(self, var_type, name, init, lineno=0):
+        return self._add(VAR_DECL, _TYPE_INDEX[var_type], self._intern(name),
+                         lineno, (init,))
+
+    def var_decl_array(self, var_type, name, size, lineno=0):
+        # the size is kept as a literal child row
+        return self._add(VAR_DECL_ARRAY, _TYPE_INDEX[var_type],
+                         self._intern(name), lineno,
+                         (self.literal(size, lineno),))
+
+    def func_decl(self, name, params, body, lineno=0):
+        return self._add(FUNC_DECL, 0, self._intern(name), lineno,
+                         [body] + (params or []))
+
+    def param(self, param_type, name, lineno=0):
+        return self._add(PARAM, _TYPE_INDEX[param_type], self._intern(name),
+                         lineno)
+
+    def block(self, stmts, lineno=0):
+        return self._add(BLOCK, 0, -1, lineno, stmts)
+
+    def call(self, name, args, lineno=0):
+        return self._add(CALL, 0, self._intern(name), lineno, args or ())
+
+    def assign(self, target, value, lineno=0):
+        return self._add(ASSIGN, 0, -1, lineno, (target, value))
+
+    def loc(self, name, lineno=0):
+        return self._add(LOC, 0, self._intern(name), lineno)
+
+    def loc_array(self, name, index, lineno=0):
+        return self._add(LOC_ARRAY, 0, self._intern(name), lineno, (index,))
+
+    def if_(self, cond, then, elif_part, else_part, lineno=0):
+        return self._add(IF, 0, -1, lineno, (cond, then, elif_part, else_part))
+
+    def elif_(self, cond, body, next_elif, lineno=0):
+        return self._add(ELIF, 0, -1, lineno, (cond, body, next_elif))
+
+    def while_(self, cond, body, lineno=0):
+        return self._add(WHILE, 0, -1, lineno, (cond, body))
+
+    def for_(self, init, cond, step, body, lineno=0):
+        return self._add(FOR, 0, -1, lineno, (init, cond, step, body))
+
+    def print_(self, value, lineno=0):
+        return self._add(PRINT, 0, -1, lineno, (value,))
+
+    def input_(self, name, lineno=0):
+        return self._add(INPUT, 0, self._intern(name), lineno)
+
+    def return_(self, value, lineno=0):
+        return self._add(RETURN, 0, -1, lineno, (value,))
+
+    def break_(self, lineno=0):
+        return self._add(BREAK, 0, -1, lineno)
+
+    def continue_(self, lineno=0):
+        return self._add(CONTINUE, 0, -1, lineno)
+
+    def binop(self, op, left, right, lineno=0):
+        return self._add(BINOP, _OP_INDEX[op], -1, lineno, (left, right))
+
+    def unary(self, op, operand, lineno=0):
+        return self._add(UNARY, _OP_INDEX[op], -1, lineno, (operand,))
+
+    def literal(self, value, lineno=0):
+        return self._add(LITERAL, 0, self._intern(value), lineno)
+
+    def finish(self, root):
+        if root is None:
+            return None
+        return FlatAST(self.kinds, self.ops, self.values, self.linenos,
+                       self.firsts, self.counts, self.children, self.pool,
+                       root)
+
+
+class FlatAST:
+    """Read-only array AST; node references are integer row ids."""
+
+    def __init__(self, kinds, ops, values, linenos, firsts, counts, children,
+                 pool, root, buffer=None):
+        self.kinds = kinds
+        self.ops = ops
+        self.values = values
+        self.linenos = linenos
+        self.firsts = firsts
+        self.counts = counts
+        self.children = children
+        self.pool = pool
+        self.root = root
+        self._buffer = buffer  # keeps an mmap alive
+        # analysis results are private to the process, never shared
+        self.types = bytearray(len(kinds))
+        self.syms = array("i", [-1]) * len(kinds)  # symbol ids, -1 = none
+        # per-kind `fields` functions, for visitors that dispatch on kind
+        self.field_getters = (
+            self._program, self._var_decl, self._var_decl_array,
+            self._func_decl, self._param, self._block, self._call,
+            self._assign, self._name_only, self._loc_array, self._if,
+            self._elif, self._while, self._for, self._one_child,
+            self._name_only, self._one_child, self._no_fields,
+            self._no_fields, self._binop, self._unary, self._literal,
+        )
+
+    def __len__(self):
+        return len(self.kinds)
+
+    # ----- tree protocol -----
+
+    def kind(self, n):
+        return self.kinds[n]
+
+    def fields(self, n):
+        """Field values in `Node.fields` order; children are node ids."""
+        return self.field_getters[self.kinds[n]](n)
+
+    def lineno(self, n):
+        return self.linenos[n]
+
+    def set_type(self, n, t):
+        self.types[n] = _RESOLVED_INDEX[t]
+
+    def get_type(self, n):
+        return _RESOLVED[self.types[n]]
+
+    def set_symbol(self, n, sid):
+        self.syms[n] = sid
+
+    def get_symbol(self, n):
+        sid = self.syms[n]
+        return None if sid < 0 else sid
+
+    def child(self, n, k):
+        c = self.children[self.firsts[n] + k]
+        return None if c < 0 else c
+
+    def child_ids(self, n):
+        first = self.firsts[n]
+        return self.children[first:first + self.counts[n]].tolist()
+
+    # ----- per-kind field decoders -----
+
+    def _list(self, first, count):
+        if not count:
+            return None
+        return self.children[first:first + count].tolist()
+
+    def _opt(self, c):
+        return None if c < 0 else c
+
+    def _program(self, n):
+        return (self._list(self.firsts[n], self.counts[n]),)
+
+    _block = _program
+
+    def _var_decl(self, n):
+        return (TYPES[self.ops[n]], self.pool[self.values[n]],
+                self._opt(self.children[self.firsts[n]]))
+
+    def _var_decl_array(self, n):
+        size = self.children[self.firsts[n]]
+        return (TYPES[self.ops[n]], self.pool[self.values[n]],
+                self.pool[self.values[size]])
+
+    def _func_decl(self, n):
+        first = self.firsts[n]
+        return (self.pool[self.values[n]],
+                self._list(first + 1, self.counts[n] - 1),
+                self.children[first])
+
+    def _param(self, n):
+        return (TYPES[self.ops[n]], self.pool[self.values[n]])
+
+    def _call(self, n):
+        return (self.pool[self.values[n]],
+                self._list(self.firsts[n], self.counts[n]))
+
+    def _assign(self, n):
+        first = self.firsts[n]
+        return (self.children[first], self.children[first + 1])
+
+    def _name_only(self, n):
+        return (self.pool[self.values[n]],)
+
+    def _loc_array(self, n):
+        return (self.pool[self.values[n]], self.children[self.firsts[n]])
+
+    def _if(self, n):
+        first = self.firsts[n]
+        c = self.children
+        return (c[first], c[first + 1], self._opt(c[first + 2]),
+                self._opt(c[first + 3]))
+
+    def _elif(self, n):
+        first = self.firsts[n]
+        c = self.children
+        return (c[first], c[first + 1], self._opt(c[first + 2]))
+
+    def _while(self, n):
+        first = self.firsts[n]
+        return (self.children[first], self.children[first + 1])
+
+    def _for(self, n):
+        first = self.firsts[n]
+        c = self.children
+        return (c[first], c[first + 1], c[first + 2], c[first + 3])
+
+    def _one_child(self, n):
+        return (self._opt(self.children[self.firsts[n]]),)
+
+    def _no_fields(self, n):
+        return ()
+
+    def _binop(self, n):
+        first = self.firsts[n]
+        return (OPS[self.ops[n]], self.children[first],
+                self.children[first + 1])
+
+    def _unary(self, n):
+        return (OPS[self.ops[n]], self.children[self.firsts[n]])
+
+    def _literal(self, n):
+        return (self.pool[self.values[n]],)
+
+    # ----- conversion -----
+
+    def to_nodes(self, n=None):
+        """Materialize node objects (for debugging and the AST drawer)."""
+        n = self.root if n is None else n
+        kind = self.kinds[n]
+        cls = NODE_CLASSES[kind]
+        args = []
+        for name, value in zip(cls.fields, self.fields(n)):
+            if value is None or name in _SCALAR_FIELDS or kind == LITERAL:
+                args.append(value)
+            elif isinstance(value, list):
+                args.append([self.to_nodes(c) for c in value])
+            else:
+                args.append(self.to_nodes(value))
+        return cls(*args, self.linenos[n])
+
+    # ----- serialization -----
+
+    def to_bytes(self):
+        pool = json.dumps(self.pool).encode("utf-8")
+        n, m = len(self.kinds), len(self.children)
+        header = _HEADER.pack(MAGIC, VERSION, sys.byteorder == "little",
+                              n, m, self.root, len(pool))
+        parts = [header]
+        for column in self._columns():
+            parts.append(column.tobytes())
+            parts.append(b"\0" * (-len(parts[-1]) % 4))
+        parts.append(pool)
+        return b"".join(parts)
+
+    def _columns(self):
+        return (self.kinds, self.ops, self.values, self.linenos, self.firsts,
+                self.counts, self.children)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Open a serialized AST without copying the columns."""
+        view = memoryview(buffer)
+        magic, version, little, n, m, root, pool_len = \
+            _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a flat AST buffer")
+        if bool(little) != (sys.byteorder == "little"):
+            raise ValueError("flat AST was written with another byte order")
+        offset = _HEADER.size
+        columns = []
+        for code, length in (("B", n), ("B", n), ("i", n), ("i", n),
+                             ("i", n), ("i", n), ("i", m)):
+            size = length * (1 if code == "B" else 4)
+            columns.append(view[offset:offset + size].cast(code))
+            offset += size + (-size % 4)
+        pool = json.loads(bytes(view[offset:offset + pool_len]))
+        return cls(*columns, pool, root, buffer=buffer)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """Map a saved AST read-only; processes mapping it share the pages."""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(mapped)
+
+
+# fields that hold names/operators/literals rather than child nodes
+_SCALAR_FIELDS = frozenset(("var_type", "name", "size", "param_type", "op"))
@@ -0,0 +1,136 @@
+"""Global value numbering: common subexpression elimination over SSA.
+
+`number_values(form)` walks the dominator tree of an `ssa.SSA` form with
+a scoped table from expressions to the name holding their value
+(dominator-based value numbering, after Briggs, Cooper and Simpson).  An
+operator, `[]` load or copy whose expression is already in the table,
+computed in the same block or in one that dominates it, is removed and
+its result read from the earlier name instead.  Since SSA names are
+written once, a value stays valid everywhere its write dominates.
+
+Names shared with other regions (globals a function may assign) have no
+such guarantee.  An expression reading one only matches within its block
+until that variable is written or a `call` runs, unless the region never
+writes it and makes no calls.  Loads are treated the same way, with a
+`[]=` store into an element counting as a write of its array: a store
+invalidates the loads from that array, a call every load, and loads are
+matched across blocks only in regions with neither.
+"""
+from itertools import count
+
+from ssa import SSA
+from tac import (TEMP, VAR, CONST, TAG_MASK, NONE, WRITES_RESULT, BINARY,
+                 UNARY, ASSIGN, MUL, AND, OR, EQ, NE, INDEX, CALL, STORE)
+
+# operators whose operands may be swapped; not `+`: semantic analysis
+# keeps it numeric, but code generated from an unchecked tree (a
+# CodeGenerator without a symbol table) may join strings with it
+COMMUTATIVE = frozenset((MUL, AND, OR, EQ, NE))
+
+
+def eliminate_common_subexpressions(tac):
+    """Remove redundant computations from `tac`, in place; returns the
+    number of instructions removed."""
+    before = len(tac)
+    form = SSA(tac)
+    number_values(form)
+    form.to_tac()
+    return before - len(tac)
+
+
+def _stable(form):
+    """Per region, the shared names and arrays nothing there can change
+    (empty for a region with calls)."""
+    cfg, tac = form.cfg, form.tac
+    used = {}
+    changed = {}
+    for b in form.order:
+        block = cfg.blocks[b]
+        region_used = used.setdefault(block.function, set())
+        region_changed = changed.setdefault(block.function, set())
+        for op, a1, a2, res in cfg.instructions(block):
+            region_used.update(tac.reads(op, a1, a2))
+            if op == INDEX:
+                region_used.add(a1)
+            if op == CALL:
+                region_changed.add(CALL)
+            elif op in WRITES_RESULT or op == STORE:
+                region_changed.add(res)
+    return {region: set() if CALL in changed[region]
+            else used[region] - changed[region] - form.names
+            for region in used}
+
+
+def number_values(form):
+    """Value-number SSA form `form` in one walk of its dominator tree;
+    returns the number of instructions removed."""
+    cfg, tac, code = form.cfg, form.tac, form.cfg.code
+    names = form.names
+    stable = _stable(form)
+    stamps = count(1)
+    value = {}
+    table = {}
+    added = {}
+
+    def resolve(a):
+        while a in value:
+            a = value[a]
+        return a
+
+    removed = 0
+    for b, entering in form.dominator_walk():
+        if not entering:
+            for key in added.pop(b):
+                del table[key]
+            continue
+        block = cfg.blocks[b]
+        fixed = stable[block.function]
+        keys = added[b] = []
+        # shared names and memory as of their last change in this block;
+        # `epoch` changes at the block start and at each call
+        epoch = next(stamps)
+        written = {}
+
+        def token(a):
+            if a in names or a in fixed or a & TAG_MASK not in (TEMP, VAR):
+                return a
+            return (a, written.get(a, epoch))
+
+        for i in range(block.start, block.end):
+            ins = code[i]
+            if ins is None:
+                continue
+            tac.map_reads(ins, resolve)
+            op, a1, a2, res = ins
+            key = None
+            if op == ASSIGN:
+                if res in names and (a1 in names or a1 & TAG_MASK == CONST):
+                    value[res] = a1
+                    code[i] = None
+                    removed += 1
+                    continue
+            elif op in BINARY or op in UNARY or op == INDEX:
+                key = (op, token(a1), token(a2))
+                found = table.get(key)
+                if found is None and op in COMMUTATIVE:
+                    found = table.get((op, key[2], key[1]))
+                if found is not None:
+                    if res in names:
+                        value[res] = found
+                        code[i] = None
+                        removed += 1
+                        continue
+                    code[i] = [ASSIGN, found, NONE, res]
+                    key = None
+            if op == CALL:
+                epoch = next(stamps)
+                written.clear()
+            elif op == STORE or op in WRITES_RESULT and res not in names:
+                written[res] = next(stamps)
+            if key is not None and res in names:
+                table[key] = res
+                keys.append(key)
+    for b in form.order:
+        for phi in form.phis[b]:
+            phi.args = [resolve(a) for a in phi.args]
+    return removed
@@ -0,0 +1,216 @@
+"""Function inlining.
+
+`inline_calls(tac)` replaces `call` instructions by a copy of the
+callee's body between its `func` and `endfunc`:
+
+- the callee's parameters, locals and temps become fresh temps of the
+  caller, and its labels fresh labels, so the copy can sit anywhere;
+- each argument is copied into its parameter's temp first, and a
+  `return` becomes a copy into the call's result and a jump to the end
+  of the copy (falling off the end returns None, as in the VM);
+- a local or temp the body may read before writing it starts as None,
+  as the VM's fresh frame would give it;
+- the calls inlined in the callee's own body are inlined in the copy.
+
+Which calls are inlined is a cost model on the callee's size and the
+call's heat.  A call is inlined when its callee has at most `max_size`
+instructions, or at most `hot_size` when the call is hot: it ran at
+least `hot_calls` times.  Heat comes from `counts`, the runs per
+instruction `VM.profile()` measured on this code, or without a profile
+from an estimate of 10 per loop around the call.  The hottest calls go
+first, and inlining stops when the code has grown by `growth` times its
+size.  A function whose every call was inlined is removed.
+
+A function is never inlined into its own body, and one that defines
+another function or keeps a local array is never inlined.
+"""
+from collections import Counter
+
+from cfg import CFG
+from dataflow import liveness, operand_bit
+from tac import (TEMP, TAG_BITS, TAG_MASK, LABEL_REF, NONE,
+                 WRITES_RESULT, ASSIGN, GOTO, LABEL, CALL, FUNC, ENDFUNC,
+                 RETURN)
+
+# default cost model
+INLINE_SIZE = 8         # callee instructions always worth a call
+HOT_INLINE_SIZE = 40    # callee instructions worth a hot call
+HOT_CALLS = 10          # runs that make a call hot
+INLINE_GROWTH = 1.0     # code growth allowed, as a fraction of its size
+LOOP_HEAT = 10          # estimated runs per iteration of a loop
+
+
+def inline_calls(tac, counts=None, max_size=INLINE_SIZE,
+                 hot_size=HOT_INLINE_SIZE, hot_calls=HOT_CALLS,
+                 growth=INLINE_GROWTH):
+    """Inline the small and hot calls of `tac`, in place; returns the
+    number of instructions removed (negative when the code grew)."""
+    before = len(tac)
+    code = tac.instruction_list()
+    cfg = CFG(code)
+    functions = _functions(tac, cfg)
+    if not functions:
+        return 0
+    heat = counts if counts is not None else _estimate_heat(cfg)
+
+    sites = []
+    for i, ins in enumerate(code):
+        if ins[0] != CALL or ins[1] not in functions:
+            continue
+        start, end, _ = functions[ins[1]]
+        size = end - start - 1
+        if start < i < end:
+            continue
+        if size <= max_size or heat[i] >= hot_calls and size <= hot_size:
+            sites.append((-heat[i], size, i))
+    sites.sort()
+    budget = growth * before
+    chosen = set()
+    for _, size, i in sites:
+        if size <= budget:
+            budget -= size
+            chosen.add(i)
+    if not chosen:
+        return 0
+
+    bodies = {}  # function -> its body with its own chosen calls inlined
+
+    def body(fn, active):
+        if fn not in bodies:
+            start, end, _ = functions[fn]
+            bodies[fn] = expand(range(start + 1, end), active | {fn})
+        return bodies[fn]
+
+    def expand(indices, active):
+        out = []
+        for i in indices:
+            ins = code[i]
+            if i in chosen and ins[1] not in active:
+                out.extend(_copy(tac, body(ins[1], active),
+                                 functions[ins[1]], ins))
+            else:
+                out.append(ins)
+        return out
+
+    # function bodies inline into themselves only through another function
+    active = [None]
+    out = []
+    for i, ins in enumerate(code):
+        if ins[0] == FUNC:
+            active.append(ins[1])
+        elif ins[0] == ENDFUNC:
+            active.pop()
+        out.extend(expand((i,), {active[-1]}))
+    calls = Counter(ins[1] for ins in out if ins[0] == CALL)
+    dropped = {code[i][1] for i in chosen} - set(calls)
+    if dropped:
+        out = _drop_functions(out, dropped)
+        for fn in dropped:
+            del tac.functions[fn]
+    tac.replace(out)
+    return before - len(tac)
+
+
+def _functions(tac, cfg):
+    """{function operand: (index of `func`, index of `endfunc`, bitset of
+    its private names live at entry)} of the functions that may be
+    inlined."""
+    code = cfg.code
+    live_in = None
+    found = {}
+    open_funcs = []  # [index of `func`, defines another function]
+    for i, (op, a1, a2, res) in enumerate(code):
+        if op == FUNC:
+            for outer in open_funcs:
+                outer[1] = True
+            open_funcs.append([i, False])
+        elif op == ENDFUNC and open_funcs:
+            start, nested = open_funcs.pop()
+            fn = code[start][1]
+            params, local_vars = tac.functions.get(fn, ((), ()))
+            if nested or fn not in tac.functions \
+                    or any(a in tac.arrays for a in local_vars):
+                continue
+            if live_in is None:
+                live_in, _ = liveness(cfg, tac)
+            found[fn] = (start, i, live_in[cfg.block_at[start + 1]])
+    return found
+
+
+def _estimate_heat(cfg):
+    """Runs per instruction estimated from the loops around it."""
+    depth = [0] * len(cfg.blocks)
+    for body in cfg.natural_loops(cfg.dominators()).values():
+        for b in body:
+            depth[b] += 1
+    heat = []
+    for block in cfg:
+        heat.extend([LOOP_HEAT ** depth[block.index]]
+                    * (block.end - block.start))
+    return heat
+
+
+def _copy(tac, body, function, call):
+    """`body`, the code of `function` (see `_functions`), in place of
+    `call`."""
+    live = function[2]
+    fn, args, result = call[1], call[2], call[3]
+    params, local_vars = tac.functions[fn]
+    private = set(params) | set(local_vars)
+    names = {}
+    labels = {}
+
+    def name(a):
+        if a & TAG_MASK == TEMP or a in private:
+            if a not in names:
+                names[a] = tac.new_temp()
+            return names[a]
+        return a
+
+    def label(a):
+        if a not in labels:
+            labels[a] = tac.new_label()
+        return labels[a]
+
+    missing = tac.const(None)
+    out = [[ASSIGN, a, NONE, name(p)] for p, a in zip(
+        params, tac.arg_lists[args >> TAG_BITS] if args else ())]
+    fresh = {a for ins in body for a in (ins[1], ins[2], ins[3])
+             if a & TAG_MASK == TEMP} | set(local_vars)
+    for a in sorted(fresh - set(params)):
+        if live >> operand_bit(tac, a) & 1:
+            out.append([ASSIGN, missing, NONE, name(a)])
+    done = tac.new_label()
+    for ins in body:
+        ins = list(ins)
+        op = ins[0]
+        if op == RETURN:
+            if result:
+                out.append([ASSIGN, name(ins[1]) if ins[1] else missing,
+                            NONE, result])
+            out.append([GOTO, NONE, NONE, done])
+            continue
+        tac.map_reads(ins, name)
+        if ins[3] & TAG_MASK == LABEL_REF:
+            ins[3] = label(ins[3])
+        elif op in WRITES_RESULT:
+            ins[3] = name(ins[3])
+        out.append(ins)
+    if result and (not body or body[-1][0] not in (RETURN, GOTO)):
+        out.append([ASSIGN, missing, NONE, result])
+    out.append([LABEL, NONE, NONE, done])
+    return out
+
+
+def _drop_functions(code, functions):
+    """`code` without the definitions of `functions`."""
+    out = []
+    depth = 0  # nesting inside a dropped definition
+    for ins in code:
+        if depth:
+            depth += (ins[0] == FUNC) - (ins[0] == ENDFUNC)
+        elif ins[0] == FUNC and ins[1] in functions:
+            depth = 1
+        else:
+            out.append(ins)
+    return out
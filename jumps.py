@@ -0,0 +1,179 @@
+"""Jump threading and branch-chain collapsing.
+
+`thread_jumps(tac)` works on the basic blocks of the code (cfg.py) and
+repeats, until nothing changes:
+
+- every jump is threaded: a `goto` or branch to a block that holds only
+  labels, or only a `goto`, is pointed at where that block leads;
+- a branch to a block that only branches on the same operand again
+  knows that branch's outcome, and is pointed past it;
+- a branch whose target and fall-through lead to the same block becomes
+  a `goto`, and a branch reached only by falling through a branch on
+  the same operand is decided: dropped, or a `goto`;
+- a block entered only by the `goto` that ends another block, and itself
+  ending in a `goto` or `return`, is moved to the place of that `goto`,
+  so the two run as one straight line;
+- the blocks no path reaches any more, jumps to the next instruction and
+  unused labels are dropped (dce.py).
+
+Nothing is computed differently, so only the jumps, branches and labels
+the VM executes change.
+"""
+from cfg import CFG
+from dce import remove_unreachable, remove_useless_jumps
+from tac import NONE, BRANCHES, GOTO, LABEL, RETURN
+
+
+def thread_jumps(tac):
+    """Thread and collapse the jumps of `tac`, in place; returns the
+    number of instructions removed."""
+    code = tac.instruction_list()
+    before = len(code)
+    changed = True
+    while changed:
+        code, changed = _thread(tac, CFG(code))
+        code, dropped = remove_unreachable(CFG(code))
+        code, jumps = remove_useless_jumps(code)
+        code, merged = _merge_blocks(CFG(code))
+        changed = changed or dropped or jumps or merged
+    tac.replace(code)
+    return before - len(tac)
+
+
+def _body(code, block):
+    """Index of the first instruction of `block` after its labels."""
+    i = block.start
+    while i < block.end and code[i][0] == LABEL:
+        i += 1
+    return i
+
+
+def _thread(tac, cfg):
+    code, blocks = cfg.code, cfg.blocks
+    added = {}  # block index -> label added at its start
+    decided = {}  # instruction index -> what replaces it, or None
+
+    reaches = {}
+
+    def follow(b):
+        # the block control reaches from the start of block b without
+        # computing anything; remembered for every block on the way
+        path = []
+        seen = set()
+        while b not in seen and b not in reaches:
+            seen.add(b)
+            path.append(b)
+            block = blocks[b]
+            i = _body(code, block)
+            if i == block.end and b + 1 < len(blocks):
+                b += 1
+            elif i < block.end and code[i][0] == GOTO \
+                    and code[i][3] in cfg.label_block:
+                b = cfg.label_block[code[i][3]]
+            else:
+                break
+        b = reaches.get(b, b)
+        for p in path:
+            reaches[p] = b
+        return b
+
+    def only_branch(b, a):
+        # the branch on operand `a` that is all block b computes, or None
+        block = blocks[b]
+        i = _body(code, block)
+        if i == block.end - 1 and code[i][0] in BRANCHES and code[i][1] == a:
+            return code[i]
+        return None
+
+    def decide(b, op, a):
+        # where a jump of branch `op` on `a` into block b ends up
+        seen = set()
+        b = follow(b)
+        while b not in seen:
+            seen.add(b)
+            second = only_branch(b, a)
+            if second is None:
+                break
+            if second[0] == op:
+                if second[3] not in cfg.label_block:
+                    break
+                b = follow(cfg.label_block[second[3]])
+            elif b + 1 < len(blocks):
+                b = follow(b + 1)
+            else:
+                break
+        return b
+
+    def label(b):
+        first = code[blocks[b].start]
+        if first[0] == LABEL:
+            return first[3]
+        if b not in added:
+            added[b] = tac.new_label()
+        return added[b]
+
+    changed = False
+    for block in blocks:
+        ins = code[block.end - 1]
+        op = ins[0]
+        if op != GOTO and op not in BRANCHES \
+                or ins[3] not in cfg.label_block:
+            continue
+        target = cfg.label_block[ins[3]]
+        b = follow(target) if op == GOTO else decide(target, op, ins[1])
+        if op in BRANCHES and block.index + 1 < len(blocks):
+            fall = block.index + 1
+            second = only_branch(fall, ins[1])
+            if second is not None and code[blocks[fall].start][0] != LABEL:
+                # only this branch falls into `second`, with the operand
+                # deciding it the other way
+                decided[blocks[fall].end - 1] = None if second[0] == op \
+                    else [GOTO, NONE, NONE, second[3]]
+                changed = True
+            elif follow(fall) == b:
+                ins[:] = [GOTO, NONE, NONE, ins[3]]
+                changed = True
+        new = label(b)
+        if new != ins[3]:
+            ins[3] = new
+            changed = True
+    for i, ins in decided.items():
+        code[i] = ins
+    out = []
+    for block in blocks:
+        if block.index in added:
+            out.append([LABEL, NONE, NONE, added[block.index]])
+        out.extend(ins for ins in cfg.instructions(block) if ins is not None)
+    return out, changed
+
+
+def _merge_blocks(cfg):
+    code, blocks = cfg.code, cfg.blocks
+    entries = set(cfg.entries)
+    move = {}  # block ending in a goto -> the block that replaces it
+    moved = set()
+    for block in blocks:
+        last = code[block.end - 1]
+        if last[0] != GOTO:
+            continue
+        c = cfg.label_block.get(last[3])
+        if c is None or c in moved or c in entries \
+                or c in (block.index, block.index + 1) \
+                or blocks[c].preds != [block.index] \
+                or code[blocks[c].end - 1][0] not in (GOTO, RETURN):
+            continue
+        move[block.index] = c
+        moved.add(c)
+    if not move:
+        return code, False
+    out = []
+    for block in blocks:
+        if block.index in moved:
+            continue
+        b, start = block.index, block.start
+        while b in move:
+            out.extend(code[start:blocks[b].end - 1])
+            b = move[b]
+            start = _body(code, blocks[b])
+        out.extend(code[start:blocks[b].end])
+    return out, True
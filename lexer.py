@@ -1,3 +1,6 @@
+import os
+import sys
+import zlib
 import ply.lex as lex
 
 lineno = 1
@@ -85,12 +88,12 @@ def t_FLOAT_LITERAL(t):
     try:
         t.value = float(t.value)
     except ValueError:
-        lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: invalid float literal {t.value}")
+        t.lexer.lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: invalid float literal {t.value}")
     return t
 
 def t_INVALID_IDENT(t):
     r'\d+[a-zA-Z_][a-zA-Z0-9_]*'
-    lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: invalid identifier {t.value}")
+    t.lexer.lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: invalid identifier {t.value}")
 
 def t_INT_LITERAL(t):
     r'0x[0-9a-fA-F]+|\d+'
@@ -98,18 +101,22 @@ def t_INT_LITERAL(t):
     try:
         t.value = int(v, 16) if v.lower().startswith("0x") else int(v)
     except ValueError:
-        lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: invalid integer {v}")
+        t.lexer.lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: invalid integer {v}")
     return t
 
 def t_ID(t):
     r'[a-zA-Z_][a-zA-Z0-9_]*'
     t.type = keywords.get(t.value, 'ID')
+    if t.type == 'ID':
+        # one shared str per identifier: later dict lookups hit by identity
+        t.value = sys.intern(t.value)
     return t
 
 
 def t_ILLEGAL_SEQUENCE(t):
-    r'[@#\$%\^&~`\\][a-zA-Z0-9_]*'
-    lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: illegal sequence {t.value}")
+    r'([@#\$%\^~`\\]|&(?!&))[a-zA-Z0-9_]*'
+    # function rules are tried before t_AND, so `&&` is left to it here
+    t.lexer.lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: illegal sequence {t.value}")
 
 t_ignore = ' \t\r'
 
@@ -118,8 +125,37 @@ def t_newline(t):
     t.lexer.lineno += len(t.value)
 
 def t_error(t):
-    lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: illegal character '{t.value[0]}'")
+    t.lexer.lex_errors.append(f"Lexical Error at line {t.lexer.lineno}: illegal character '{t.value[0]}'")
     t.lexer.skip(1)
 
-lexer = lex.lex()
+# Set COMPILER_FAST_START=1 to load the prebuilt tables (lextab.py,
+# parsetab.bin) instead of validating and rebuilding the rules on every
+# import.  The tables are produced by build_tables.py and never written here.
+FAST_START = os.environ.get("COMPILER_FAST_START") == "1"
+
+
+def rules_signature(ldict=None):
+    """Hash of the token rules; a stale lextab.py will not match it."""
+    ldict = globals() if ldict is None else ldict
+    parts = [" ".join(ldict["tokens"]), ldict["t_ignore"]]
+    for name, rule in ldict.items():
+        if name.startswith("t_") and name != "t_ignore":
+            parts.append(name)
+            parts.append((rule.__doc__ or "") if callable(rule) else rule)
+    return "%08x" % zlib.crc32("\n".join(parts).encode("utf-8"))
+
+
+def _load_lextab():
+    try:
+        import lextab
+    except ImportError:
+        return None
+    if getattr(lextab, "_lexsignature", None) != rules_signature():
+        return None
+    return lex.lex(optimize=True, lextab=lextab)
+
+
+lexer = (_load_lextab() if FAST_START else None) or lex.lex()
 lexer.lineno = 1
+# error sink of the shared lexer; clones get their own (see compiler.py)
+lexer.lex_errors = lex_errors
@@ -0,0 +1,11 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AND', 'ASSIGN', 'BOOL', 'BREAK', 'CHAR', 'CHAR_LITERAL', 'COMMA', 'CONTINUE', 'DIVIDE', 'ELIF', 'ELSE', 'EQ', 'FALSE', 'FLOAT', 'FLOAT_LITERAL', 'FOR', 'FUNC', 'GE', 'GT', 'ID', 'IF', 'INPUT', 'INT', 'INT_LITERAL', 'LBRACE', 'LBRACKET', 'LE', 'LPAREN', 'LT', 'MINUS', 'MOD', 'NE', 'NOT', 'OR', 'PLUS', 'PRINT', 'RBRACE', 'RBRACKET', 'RETURN', 'RPAREN', 'SEMICOLON', 'STRING', 'STRING_LITERAL', 'TIMES', 'TRUE', 'WHILE'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_STRING_LITERAL>"([^"\\\\]|\\\\.)*")|(?P<t_CHAR_LITERAL>\\\'(\\\\.|[^\\\\\\\'])\\\')|(?P<t_FLOAT_LITERAL>\\d+\\.\\d+([eE][+-]?\\d+)?)|(?P<t_INVALID_IDENT>\\d+[a-zA-Z_][a-zA-Z0-9_]*)|(?P<t_INT_LITERAL>0x[0-9a-fA-F]+|\\d+)|(?P<t_ID>[a-zA-Z_][a-zA-Z0-9_]*)|(?P<t_ILLEGAL_SEQUENCE>([@#\\$%\\^~`\\\\]|&(?!&))[a-zA-Z0-9_]*)|(?P<t_newline>\\n+)|(?P<t_OR>\\|\\|)|(?P<t_AND>&&)|(?P<t_EQ>==)|(?P<t_GE>>=)|(?P<t_LBRACE>\\{)|(?P<t_LBRACKET>\\[)|(?P<t_LE><=)|(?P<t_LPAREN>\\()|(?P<t_NE>!=)|(?P<t_PLUS>\\+)|(?P<t_RBRACE>\\})|(?P<t_RBRACKET>\\])|(?P<t_RPAREN>\\))|(?P<t_TIMES>\\*)|(?P<t_ASSIGN>=)|(?P<t_COMMA>,)|(?P<t_DIVIDE>/)|(?P<t_GT>>)|(?P<t_LT><)|(?P<t_MINUS>-)|(?P<t_MOD>%)|(?P<t_NOT>!)|(?P<t_SEMICOLON>;)', [None, ('t_STRING_LITERAL', 'STRING_LITERAL'), None, ('t_CHAR_LITERAL', 'CHAR_LITERAL'), None, ('t_FLOAT_LITERAL', 'FLOAT_LITERAL'), None, ('t_INVALID_IDENT', 'INVALID_IDENT'), ('t_INT_LITERAL', 'INT_LITERAL'), ('t_ID', 'ID'), ('t_ILLEGAL_SEQUENCE', 'ILLEGAL_SEQUENCE'), None, ('t_newline', 'newline'), (None, 'OR'), (None, 'AND'), (None, 'EQ'), (None, 'GE'), (None, 'LBRACE'), (None, 'LBRACKET'), (None, 'LE'), (None, 'LPAREN'), (None, 'NE'), (None, 'PLUS'), (None, 'RBRACE'), (None, 'RBRACKET'), (None, 'RPAREN'), (None, 'TIMES'), (None, 'ASSIGN'), (None, 'COMMA'), (None, 'DIVIDE'), (None, 'GT'), (None, 'LT'), (None, 'MINUS'), (None, 'MOD'), (None, 'NOT'), (None, 'SEMICOLON')])]}
+_lexstateignore = {'INITIAL': ' \t\r'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
+_lexsignature = '5e629979'
@@ -0,0 +1,203 @@
+"""Loop-invariant code motion.
+
+`hoist_loop_invariants(tac)` finds the natural loops of the code
+(`CFG.natural_loops`) and moves computations whose value is the same on
+every iteration into a preheader, a block run once ahead of the loop.
+
+An instruction is invariant when each operand is a constant, a name
+written outside the loop or by another invariant instruction, or a
+global the loop neither assigns nor could have assigned by a `call`.
+This is decided in SSA form (ssa.py), where each name has one write, and
+loops are handled from the innermost outwards, so an instruction leaves
+a loop nest as far as its operands allow.
+
+Only instructions that cannot fail move (`ThreeAddressCode.discardable`),
+and only from blocks that run on every iteration, so hoisting never runs
+code the loop would not have run.  A loop whose test is in its header,
+as for every `while` and `for`, leaves before its first iteration when
+the test fails; its preheader therefore starts with a copy of the test
+that jumps past the loop, and the header's own computations are hoisted
+ahead of that copy.
+"""
+from cfg import CFG, dominates
+from ssa import SSA
+from tac import (TEMP, VAR, TAG_MASK, NONE, WRITES_RESULT, BINARY, UNARY,
+                 PURE, BRANCHES, DIV, MOD, INDEX, IF_FALSE, GOTO, LABEL,
+                 CALL, STORE)
+
+# header instructions a guard may repeat
+_REPEATABLE = PURE | {DIV, MOD, INDEX}
+# computations worth moving; a hoisted copy would only stretch the live
+# range of its source
+_HOISTED = frozenset(BINARY) | frozenset(UNARY)
+
+
+def hoist_loop_invariants(tac):
+    """Move loop-invariant computations of `tac` into loop preheaders, in
+    place; returns the number of instructions removed."""
+    before = len(tac)
+    code, preheaders, labels = _add_preheaders(tac)
+    if not preheaders:
+        return 0
+    tac.replace(code)
+    form = SSA(tac)
+    _hoist(form, preheaders)
+    form.to_tac()
+    code = tac.instruction_list()
+    targets = {ins[3] for ins in code if ins[0] == GOTO or ins[0] in BRANCHES}
+    tac.replace(ins for ins in code if ins[0] != LABEL
+                or ins[3] not in labels or ins[3] in targets)
+    return before - len(tac)
+
+
+def _every_iteration(cfg, idom, header, body, guarded):
+    """Blocks of the loop that run whenever an iteration does: those
+    dominating each latch and each block that leaves the loop, the
+    header's test excepted when a guard repeats it."""
+    ends = []
+    for b in body:
+        succs = cfg.blocks[b].succs
+        if header in succs or (b != header or not guarded) and (
+                not succs or any(s not in body for s in succs)):
+            ends.append(b)
+    return {b for b in body if all(dominates(idom, b, e) for e in ends)}
+
+
+def _candidates(cfg, tac, body, blocks):
+    """True if some instruction in `blocks` may be loop-invariant, judged
+    by operands the loop never writes."""
+    written = set()
+    calls = False
+    for b in body:
+        for op, a1, a2, res in cfg.instructions(cfg.blocks[b]):
+            calls = calls or op == CALL
+            # a `[]=` store changes its array
+            if op in WRITES_RESULT or op == STORE:
+                written.add(res)
+    for b in blocks:
+        for op, a1, a2, res in cfg.instructions(cfg.blocks[b]):
+            if op in _HOISTED and tac.discardable(op, a2) and all(
+                    a & TAG_MASK not in (TEMP, VAR) or a not in written
+                    and not (calls and a & TAG_MASK == VAR)
+                    for a in tac.reads(op, a1, a2)):
+                return True
+    return False
+
+
+def _add_preheaders(tac):
+    """The code with a preheader ahead of each loop that may have
+    invariants, {preheader label: True if guarded} and the set of labels
+    added."""
+    code = tac.instruction_list()
+    cfg = CFG(code)
+    idom = cfg.dominators()
+    insert = {}  # instruction index -> instructions to insert ahead of it
+    preheaders = {}
+    labels = set()
+    for h, body in cfg.natural_loops(idom).items():
+        block = cfg.blocks[h]
+        head = code[block.start]
+        if head[0] != LABEL or any(
+                p == h - 1 and code[cfg.blocks[p].end - 1][0] != GOTO
+                for p in block.preds if p in body):
+            continue  # the loop falls into its header
+        test = code[block.start + 1:block.end]
+        exit_block = None
+        if test and test[-1][0] == IF_FALSE:
+            exit_block = cfg.label_block.get(test[-1][3])
+        guarded = (exit_block is not None and exit_block not in body
+                   and h + 1 in body
+                   and all(op in _REPEATABLE and res & TAG_MASK == TEMP
+                           for op, a1, a2, res in test[:-1]))
+        plain = _every_iteration(cfg, idom, h, body, False)
+        if guarded:
+            guarded = _candidates(
+                cfg, tac, body,
+                _every_iteration(cfg, idom, h, body, True) - plain)
+        if not guarded and not _candidates(cfg, tac, body, plain):
+            continue
+
+        pre = tac.new_label()
+        entry = pre
+        added = insert[block.start] = []
+        if guarded:
+            entry = tac.new_label()
+            added.append([LABEL, NONE, NONE, entry])
+            added.extend(list(ins) for ins in test)
+            labels.add(entry)
+        added.append([LABEL, NONE, NONE, pre])
+        preheaders[pre] = guarded
+        labels.add(pre)
+        for p in block.preds:
+            last = code[cfg.blocks[p].end - 1]
+            if p not in body and (last[0] == GOTO or last[0] in BRANCHES) \
+                    and last[3] == head[3]:
+                last[3] = entry
+
+    out = []
+    for i, ins in enumerate(code):
+        out.extend(insert.get(i, ()))
+        out.append(ins)
+    return out, preheaders, labels
+
+
+def _hoist(form, preheaders):
+    cfg, tac, code = form.cfg, form.tac, form.cfg.code
+    names = form.names
+    idom = form.idom
+    rank = {b: k for k, b in enumerate(form.order)}
+    position = {id(ins): i for i, ins in enumerate(code)}
+    where = {}  # SSA name -> block writing it
+    for b in form.order:
+        for phi in form.phis[b]:
+            where[phi.result] = b
+        for op, a1, a2, res in form.block_code(b):
+            if op in WRITES_RESULT:
+                where[res] = b
+
+    loops = cfg.natural_loops(idom)
+    for h, body in sorted(loops.items(), key=lambda loop: len(loop[1])):
+        pre = None
+        for p in cfg.blocks[h].preds:
+            first = code[cfg.blocks[p].start]
+            if p not in body and first[0] == LABEL and first[3] in preheaders:
+                pre = p
+        if pre is None:
+            continue
+        guarded = preheaders[code[cfg.blocks[pre].start][3]]
+        # the header's computations go ahead of the guard's test
+        entry = cfg.blocks[pre].preds[0] if guarded else pre
+
+        written = set()
+        calls = False
+        for b in body:
+            for op, a1, a2, res in form.block_code(b):
+                calls = calls or op == CALL
+                if (op in WRITES_RESULT or op == STORE) and res not in names:
+                    written.add(res)
+
+        def invariant(a):
+            if a & TAG_MASK not in (TEMP, VAR):
+                return True
+            if a in names:
+                return where.get(a) not in body
+            return not calls and a not in written
+
+        for b in sorted(_every_iteration(cfg, idom, h, body, guarded),
+                        key=rank.get):
+            for ins in form.block_code(b):
+                op, a1, a2, res = ins
+                if op not in _HOISTED or res not in names \
+                        or not tac.discardable(op, a2) \
+                        or not all(map(invariant, tac.reads(op, a1, a2))):
+                    continue
+                i = position.get(id(ins))
+                if i is not None and code[i] is ins:
+                    code[i] = None
+                else:
+                    extra = form.appended[b]
+                    del extra[next(k for k, x in enumerate(extra)
+                                   if x is ins)]
+                target = entry if b == h else pre
+                form.appended.setdefault(target, []).append(ins)
+                where[res] = target
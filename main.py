@@ -1,6 +1,3 @@
-import tkinter as tk
-from tkinter import scrolledtext, filedialog, messagebox
-import customtkinter as ctk
 import os
 import sys
 
@@ -9,13 +6,28 @@ from lexer import lexer, lex_errors
 from parser import parser, errors
 from semantic import SemanticAnalyzer
 from codegen import CodeGenerator, ThreeAddressCode
+from ast_nodes import to_tuple
 
-# Set appearance
-ctk.set_appearance_mode("dark")  # "dark", "light", "system"
-ctk.set_default_color_theme("blue")
+# GUI toolkits are imported on first use, so importing this module
+# headless (or from a worker process) does not pay for Tk.
+tk = scrolledtext = filedialog = messagebox = ctk = None
+
+
+def load_gui_toolkit():
+    global tk, scrolledtext, filedialog, messagebox, ctk
+    if ctk is not None:
+        return
+    import tkinter as tk
+    from tkinter import scrolledtext, filedialog, messagebox
+    import customtkinter as ctk
+
+    # Set appearance
+    ctk.set_appearance_mode("dark")  # "dark", "light", "system"
+    ctk.set_default_color_theme("blue")
 
 class CompilerGUI:
     def __init__(self):
+        load_gui_toolkit()
         self.window = ctk.CTk()
         self.window.title("Compiler Project")
         self.window.geometry("1000x700")
@@ -217,7 +229,7 @@ class CompilerGUI:
                 parser_output += "✓ Syntax is valid!\n\n"
                 if result:
                     parser_output += "AST Structure (simplified):\n"
-                    parser_output += str(result)[:500] + "...\n"
+                    parser_output += str(to_tuple(result))[:500] + "...\n"
 
             self.update_text(self.parser_text, parser_output)
 
@@ -269,14 +281,14 @@ class CompilerGUI:
                 return
 
             # === CODE GENERATION ===
-            generator = CodeGenerator(result)
+            generator = CodeGenerator(result, semantic_analyzer.symtab)
             tac = generator.generate()
 
             codegen_output = "THREE-ADDRESS CODE:\n" + "="*50 + "\n"
-            for i, (op, a1, a2, res) in enumerate(tac.code):
+            for i, (op, a1, a2, res) in enumerate(tac):
                 codegen_output += f"{i:3}: ({op}, {a1}, {a2}, {res})\n"
 
-            if not tac.code:
+            if not tac:
                 codegen_output += "No code generated.\n"
 
             self.update_text(self.codegen_text, codegen_output)
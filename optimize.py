@@ -0,0 +1,49 @@
+"""Optimization passes over the three-address code.
+
+    optimize(tac)                   # every pass, in PASSES order
+    optimize(tac, ["constprop"])    # only the named passes
+
+A pass takes a `ThreeAddressCode`, rewrites it in place and returns how
+many instructions it removed; `optimize` returns a list of
+(pass name, instructions removed) pairs.
+"""
+from constprop import fold_constants
+from dce import eliminate_dead_code
+from gvn import eliminate_common_subexpressions
+from inline import inline_calls
+from jumps import thread_jumps
+from licm import hoist_loop_invariants
+from peephole import peephole
+from regalloc import reuse_temps
+from ssa import propagate_copies
+from strength import reduce_strength
+
+PASSES = {
+    "inline": inline_calls,
+    "peephole": peephole,
+    "constprop": fold_constants,
+    "copyprop": propagate_copies,
+    "licm": hoist_loop_invariants,
+    "strength": reduce_strength,
+    "gvn": eliminate_common_subexpressions,
+    "jumps": thread_jumps,
+    "dce": eliminate_dead_code,
+    "regalloc": reuse_temps,
+}
+
+
+def optimize(tac, passes=None):
+    """Run `passes` (names from PASSES, default all) over `tac`."""
+    report = []
+    for name in PASSES if passes is None else passes:
+        try:
+            run = PASSES[name]
+        except KeyError:
+            raise ValueError(f"unknown optimization pass '{name}'") from None
+        report.append((name, run(tac)))
+    return report
+
+
+def removed(report):
+    """Total instructions removed according to an `optimize` report."""
+    return sum(count for _, count in report)
@@ -1,15 +1,20 @@
+import marshal
+import os
 import ply.yacc as yacc
-from lexer import tokens, lexer, lex_errors
+from lexer import tokens, lexer, lex_errors, FAST_START
+from ast_nodes import NodeBuilder
 
 errors = []
 
 def p_program(p):
     'program : decl_or_stmt_list'
-    p[0] = ("program", p[1])
+    p[0] = p.parser.builder.program(p[1], 1)
 
 def p_decl_or_stmt_list_multi(p):
     'decl_or_stmt_list : decl_or_stmt_list decl_or_stmt'
-    p[0] = p[1] + [p[2]]
+    # the list is owned by this rule chain: extend it in place (O(1) amortized)
+    p[1].append(p[2])
+    p[0] = p[1]
 
 def p_decl_or_stmt_list_single(p):
     'decl_or_stmt_list : decl_or_stmt'
@@ -23,15 +28,15 @@ def p_decl_or_stmt(p):
 
 def p_var_decl_simple(p):
     'var_decl : type ID SEMICOLON'
-    p[0] = ("var_decl", p[1], p[2], None)
+    p[0] = p.parser.builder.var_decl(p[1], p[2], None, p.lineno(2))
 
 def p_var_decl_init(p):
     'var_decl : type ID ASSIGN expr SEMICOLON'
-    p[0] = ("var_decl", p[1], p[2], p[4])
+    p[0] = p.parser.builder.var_decl(p[1], p[2], p[4], p.lineno(2))
 
 def p_var_decl_array(p):
     'var_decl : type ID LBRACKET INT_LITERAL RBRACKET SEMICOLON'
-    p[0] = ("var_decl_array", p[1], p[2], p[4])
+    p[0] = p.parser.builder.var_decl_array(p[1], p[2], p[4], p.lineno(2))
 
 def p_type(p):
     '''type : INT
@@ -43,7 +48,7 @@ def p_type(p):
 
 def p_func_decl(p):
     'func_decl : FUNC ID LPAREN param_list_opt RPAREN block'
-    p[0] = ("func_decl", p[2], p[4], p[6])
+    p[0] = p.parser.builder.func_decl(p[2], p[4], p[6], p.lineno(1))
 
 def p_param_list_opt(p):
     '''param_list_opt : param_list
@@ -52,7 +57,8 @@ def p_param_list_opt(p):
 
 def p_param_list_multi(p):
     'param_list : param_list COMMA param'
-    p[0] = p[1] + [p[3]]
+    p[1].append(p[3])
+    p[0] = p[1]
 
 def p_param_list_single(p):
     'param_list : param'
@@ -60,11 +66,11 @@ def p_param_list_single(p):
 
 def p_param(p):
     'param : type ID'
-    p[0] = ("param", p[1], p[2])
+    p[0] = p.parser.builder.param(p[1], p[2], p.lineno(2))
 
 def p_block(p):
     'block : LBRACE decl_or_stmt_list RBRACE'
-    p[0] = ("block", p[2])
+    p[0] = p.parser.builder.block(p[2], p.lineno(1))
 
 def p_statement(p):
     '''statement : assignment SEMICOLON
@@ -77,33 +83,38 @@ def p_statement(p):
                  | CONTINUE SEMICOLON
                  | block
                  | func_call SEMICOLON'''
-    p[0] = ("stmt", p[1])
+    if p[1] == 'break':
+        p[0] = p.parser.builder.break_(p.lineno(1))
+    elif p[1] == 'continue':
+        p[0] = p.parser.builder.continue_(p.lineno(1))
+    else:
+        p[0] = p[1]
 
 def p_func_call(p):
     'func_call : ID LPAREN arg_list_opt RPAREN'
-    p[0] = ("call", p[1], p[3])
+    p[0] = p.parser.builder.call(p[1], p[3], p.lineno(1))
 
 def p_assignment(p):
     'assignment : location ASSIGN expr'
-    p[0] = ("assign", p[1], p[3])
+    p[0] = p.parser.builder.assign(p[1], p[3], p.lineno(2))
 
 def p_location_id(p):
     'location : ID'
-    p[0] = ("loc", p[1])
+    p[0] = p.parser.builder.loc(p[1], p.lineno(1))
 
 def p_location_array(p):
     'location : ID LBRACKET expr RBRACKET'
-    p[0] = ("loc_array", p[1], p[3])
+    p[0] = p.parser.builder.loc_array(p[1], p[3], p.lineno(1))
 
 def p_if_stmt(p):
     'if_stmt : IF LPAREN expr RPAREN block elif_part else_part_opt'
-    p[0] = ("if", p[3], p[5], p[6], p[7])
+    p[0] = p.parser.builder.if_(p[3], p[5], p[6], p[7], p.lineno(1))
 
 def p_elif_part(p):
     '''elif_part : ELIF LPAREN expr RPAREN block elif_part
                  | empty'''
     if len(p) > 2:
-        p[0] = ("elif", p[3], p[5], p[6])
+        p[0] = p.parser.builder.elif_(p[3], p[5], p[6], p.lineno(1))
     else:
         p[0] = None
 
@@ -114,24 +125,24 @@ def p_else_part_opt(p):
 
 def p_while_stmt(p):
     'while_stmt : WHILE LPAREN expr RPAREN block'
-    p[0] = ("while", p[3], p[5])
+    p[0] = p.parser.builder.while_(p[3], p[5], p.lineno(1))
 
 def p_for_stmt(p):
     'for_stmt : FOR LPAREN assignment SEMICOLON expr SEMICOLON assignment RPAREN block'
-    p[0] = ("for", p[3], p[5], p[7], p[9])
+    p[0] = p.parser.builder.for_(p[3], p[5], p[7], p[9], p.lineno(1))
 
 def p_io_stmt_print(p):
     'io_stmt : PRINT LPAREN expr RPAREN'
-    p[0] = ("print", p[3])
+    p[0] = p.parser.builder.print_(p[3], p.lineno(1))
 
 def p_io_stmt_input(p):
     'io_stmt : INPUT LPAREN ID RPAREN'
-    p[0] = ("input", p[3])
+    p[0] = p.parser.builder.input_(p[3], p.lineno(1))
 
 def p_return_stmt(p):
     '''return_stmt : RETURN expr
                    | RETURN'''
-    p[0] = ("return", p[2]) if len(p) > 2 else ("return", None)
+    p[0] = p.parser.builder.return_(p[2] if len(p) > 2 else None, p.lineno(1))
 
 def p_expr(p):
     'expr : logic_or_expr'
@@ -139,7 +150,7 @@ def p_expr(p):
 
 def p_logic_or(p):
     'logic_or_expr : logic_or_expr OR logic_and_expr'
-    p[0] = ("binop", "||", p[1], p[3])
+    p[0] = p.parser.builder.binop("||", p[1], p[3], p.lineno(2))
 
 def p_logic_or_single(p):
     'logic_or_expr : logic_and_expr'
@@ -147,7 +158,7 @@ def p_logic_or_single(p):
 
 def p_logic_and(p):
     'logic_and_expr : logic_and_expr AND equality_expr'
-    p[0] = ("binop", "&&", p[1], p[3])
+    p[0] = p.parser.builder.binop("&&", p[1], p[3], p.lineno(2))
 
 def p_logic_and_single(p):
     'logic_and_expr : equality_expr'
@@ -156,7 +167,7 @@ def p_logic_and_single(p):
 def p_equality(p):
     '''equality_expr : equality_expr EQ relational_expr
                      | equality_expr NE relational_expr'''
-    p[0] = ("binop", p[2], p[1], p[3])
+    p[0] = p.parser.builder.binop(p[2], p[1], p[3], p.lineno(2))
 
 def p_equality_single(p):
     'equality_expr : relational_expr'
@@ -167,7 +178,7 @@ def p_relational(p):
                        | relational_expr LE additive_expr
                        | relational_expr GT additive_expr
                        | relational_expr GE additive_expr'''
-    p[0] = ("binop", p[2], p[1], p[3])
+    p[0] = p.parser.builder.binop(p[2], p[1], p[3], p.lineno(2))
 
 def p_relational_single(p):
     'relational_expr : additive_expr'
@@ -176,7 +187,7 @@ def p_relational_single(p):
 def p_additive(p):
     '''additive_expr : additive_expr PLUS term
                      | additive_expr MINUS term'''
-    p[0] = ("binop", p[2], p[1], p[3])
+    p[0] = p.parser.builder.binop(p[2], p[1], p[3], p.lineno(2))
 
 def p_additive_single(p):
     'additive_expr : term'
@@ -186,7 +197,7 @@ def p_term_bin(p):
     '''term : term TIMES factor
             | term DIVIDE factor
             | term MOD factor'''
-    p[0] = ("binop", p[2], p[1], p[3])
+    p[0] = p.parser.builder.binop(p[2], p[1], p[3], p.lineno(2))
 
 def p_term_single(p):
     'term : factor'
@@ -194,11 +205,11 @@ def p_term_single(p):
 
 def p_factor_unary_not(p):
     'factor : NOT factor'
-    p[0] = ("unary", "!", p[2])
+    p[0] = p.parser.builder.unary("!", p[2], p.lineno(1))
 
 def p_factor_unary_minus(p):
     'factor : MINUS factor %prec UMINUS'
-    p[0] = ("unary", "-", p[2])
+    p[0] = p.parser.builder.unary("-", p[2], p.lineno(1))
 
 def p_factor_group(p):
     'factor : LPAREN expr RPAREN'
@@ -211,7 +222,7 @@ def p_factor_literal(p):
               | FALSE
               | CHAR_LITERAL
               | STRING_LITERAL'''
-    p[0] = ("literal", p[1])
+    p[0] = p.parser.builder.literal(p[1], p.lineno(1))
 
 def p_factor_location(p):
     'factor : location'
@@ -219,7 +230,7 @@ def p_factor_location(p):
 
 def p_factor_funccall(p):
     'factor : ID LPAREN arg_list_opt RPAREN'
-    p[0] = ("call", p[1], p[3])
+    p[0] = p.parser.builder.call(p[1], p[3], p.lineno(1))
 
 def p_arg_list_opt(p):
     '''arg_list_opt : arg_list
@@ -228,7 +239,8 @@ def p_arg_list_opt(p):
 
 def p_arg_list_multi(p):
     'arg_list : arg_list COMMA expr'
-    p[0] = p[1] + [p[3]]
+    p[1].append(p[3])
+    p[0] = p[1]
 
 def p_arg_list_single(p):
     'arg_list : expr'
@@ -238,12 +250,14 @@ def p_empty(p):
     'empty :'
     p[0] = None
 
-def p_error(p):
+def syntax_error_message(p, lexer):
     if p:
         line = getattr(p, 'lineno', lexer.lineno)
-        errors.append(f"Syntax Error at line {line}: unexpected token '{p.value}'")
-    else:
-        errors.append("Syntax Error: unexpected end of input")
+        return f"Syntax Error at line {line}: unexpected token '{p.value}'"
+    return "Syntax Error: unexpected end of input"
+
+def p_error(p):
+    errors.append(syntax_error_message(p, lexer))
 
 precedence = (
     ('left', 'OR'),
@@ -256,4 +270,38 @@ precedence = (
     ('right', 'UMINUS'),
 )
 
-parser = yacc.yacc()
+TABLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "parsetab.bin")
+
+
+def _load_tables():
+    """LRParser from the prebuilt marshal tables, or None if missing/stale."""
+    try:
+        # one read: marshal.load would call f.read for every object
+        with open(TABLES_FILE, "rb") as f:
+            signature, method, action, goto, productions = marshal.loads(
+                f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    pinfo = yacc.ParserReflect(globals())
+    pinfo.get_all()
+    if pinfo.error or signature != pinfo.signature():
+        return None
+    lr = yacc.LRTable()
+    lr.lr_method = method
+    lr.lr_action = action
+    lr.lr_goto = goto
+    lr.lr_productions = [yacc.MiniProduction(*p) for p in productions]
+    lr.bind_callables(pinfo.pdict)
+    return yacc.LRParser(lr, pinfo.error_func)
+
+
+if FAST_START:
+    # Never writes parsetab.py or parser.out; a stale parsetab.bin only
+    # costs an in-memory table build.
+    parser = _load_tables() or yacc.yacc(debug=False, write_tables=False)
+else:
+    parser = yacc.yacc()
+
+# grammar actions build nodes through p.parser.builder (see compiler.py)
+parser.builder = NodeBuilder
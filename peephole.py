@@ -0,0 +1,249 @@
+"""Peephole optimization over a sliding window of TAC instructions.
+
+    fired = apply_rules(tac)    # Counter: rule name -> times it fired
+    peephole(tac)               # the same as an optimization pass
+
+A rule is a row of `RULES`: (name, pattern, rewrite).  The pattern is a
+tuple of opcode sets, one per instruction of the window, the last of
+which may be None to match any opcode; `rewrite(state, window)` returns
+the instructions that take the window's place, or None to leave it.
+Rules are indexed by the opcode of their window's last instruction.
+
+The engine moves the instructions from the input onto an output stack
+and, after each one, tries the rules indexed under its opcode on the top
+of the stack.  The instructions a rewrite returns go back onto the input,
+so they are matched again along with the code before them and rewrites
+cascade within one sweep.  Every rewrite shortens the code or replaces an
+instruction by a simpler one (a branch by a `goto`, an operator by a
+copy), so a sweep does linear work.  Sweeps repeat until
+none fires; a second is only needed when a label loses its last jump
+after the sweep has passed it.
+
+Rules that drop the write of a temp require the temp to be read exactly
+once in the whole code, by the instruction the window rewrites.
+"""
+from collections import Counter
+
+from tac import (TEMP, CONST, TAG_BITS, TAG_MASK, NONE, WRITES_RESULT,
+                 BRANCHES, OP_NAMES, ASSIGN, SUB, MUL, DIV, EQ, NE, NOT,
+                 IF_FALSE, IF_TRUE, GOTO, LABEL, FUNC, ENDFUNC, RETURN)
+
+_JUMPS = BRANCHES | {GOTO}
+# the branch taken exactly when the other is not
+_INVERSE = {IF_FALSE: IF_TRUE, IF_TRUE: IF_FALSE}
+
+
+class _State:
+    """What rules may consult beyond their window: temp reads and jumps to
+    each label over the whole code, and labels merged into others."""
+    __slots__ = ("tac", "reads", "refs", "alias")
+
+    def __init__(self, tac, code):
+        self.tac = tac
+        self.reads = Counter()
+        self.refs = Counter()
+        self.alias = {}
+        self.count(code, 1)
+
+    def label(self, a):
+        """Label operand `a`, or the label it was merged into."""
+        while a in self.alias:
+            a = self.alias[a]
+        return a
+
+    def read_once(self, a):
+        """True if temp `a` is read by one instruction only."""
+        return a & TAG_MASK == TEMP and self.reads[a] == 1
+
+    def count(self, code, n):
+        for op, a1, a2, res in code:
+            for a in self.tac.reads(op, a1, a2):
+                if a & TAG_MASK == TEMP:
+                    self.reads[a] += n
+            if op in _JUMPS:
+                self.refs[self.label(res)] += n
+
+
+def _constant(tac, a):
+    """(True, value) for constant operand `a`, else (False, None)."""
+    if a & TAG_MASK == CONST:
+        return True, tac.consts[a >> TAG_BITS]
+    return False, None
+
+
+# ----- rules -----
+
+def _dead_code(state, window):
+    # nothing reaches an instruction after a jump but through a label
+    jump, ins = window
+    if ins[0] in (LABEL, FUNC, ENDFUNC):
+        return None
+    return [jump]
+
+
+def _jump_to_next(state, window):
+    jump, label = window
+    if state.label(jump[3]) != label[3]:
+        return None
+    return [label]
+
+
+def _unused_label(state, window):
+    if state.refs[window[0][3]]:
+        return None
+    return []
+
+
+def _merge_labels(state, window):
+    first, second = window
+    state.refs[second[3]] += state.refs.pop(first[3], 0)
+    state.alias[first[3]] = second[3]
+    return [second]
+
+
+def _self_copy(state, window):
+    if window[0][1] != window[0][3]:
+        return None
+    return []
+
+
+def _forward_copy(state, window):
+    # t = a; <instruction reading t>  ->  <instruction reading a>
+    copy, ins = window
+    t = copy[3]
+    if not state.read_once(t) \
+            or t not in state.tac.reads(ins[0], ins[1], ins[2]):
+        return None
+    ins = list(ins)
+    state.tac.map_reads(ins, lambda a: copy[1] if a == t else a)
+    return [ins]
+
+
+def _copy_into(state, window):
+    # t = <expr>; x = t  ->  x = <expr>
+    ins, copy = window
+    if copy[1] != ins[3] or not state.read_once(ins[3]):
+        return None
+    return [[ins[0], ins[1], ins[2], copy[3]]]
+
+
+def _constant_branch(state, window):
+    op, a1, a2, res = window[0]
+    known, value = _constant(state.tac, a1)
+    if not known:
+        return None
+    return [[GOTO, NONE, NONE, res]] if bool(value) == (op == IF_TRUE) \
+        else []
+
+
+def _not_branch(state, window):
+    # t = not c; ifFalse t L  ->  ifTrue c L
+    negate, branch = window
+    if branch[1] != negate[3] or not state.read_once(negate[3]):
+        return None
+    return [[_INVERSE[branch[0]], negate[1], NONE, branch[3]]]
+
+
+def _branch_over_jump(state, window):
+    # ifFalse c L1; goto L2; label L1  ->  ifTrue c L2; label L1
+    branch, jump, label = window
+    if state.label(branch[3]) != label[3]:
+        return None
+    return [[_INVERSE[branch[0]], branch[1], NONE, jump[3]], label]
+
+
+def _negated_equality(state, window):
+    compare, negate = window
+    if negate[1] != compare[3] or not state.read_once(compare[3]):
+        return None
+    op = NE if compare[0] == EQ else EQ
+    return [[op, compare[1], compare[2], negate[3]]]
+
+
+def _identity(state, window):
+    # x - 0, x * 1, 1 * x, x / 1  ->  x
+    op, a1, a2, res = window[0]
+    known, value = _constant(state.tac, a2)
+    if known and value.__class__ is int and (value == 0 and op == SUB
+                                             or value == 1 and op != SUB):
+        return [[ASSIGN, a1, NONE, res]]
+    known, value = _constant(state.tac, a1)
+    if op == MUL and known and value.__class__ is int and value == 1:
+        return [[ASSIGN, a2, NONE, res]]
+    return None
+
+
+RULES = (
+    ("dead_code", ({GOTO, RETURN}, None), _dead_code),
+    ("jump_to_next", (_JUMPS, {LABEL}), _jump_to_next),
+    ("unused_label", ({LABEL},), _unused_label),
+    ("merge_labels", ({LABEL}, {LABEL}), _merge_labels),
+    ("self_copy", ({ASSIGN},), _self_copy),
+    ("forward_copy", ({ASSIGN}, None), _forward_copy),
+    ("copy_into", (WRITES_RESULT, {ASSIGN}), _copy_into),
+    ("constant_branch", (BRANCHES,), _constant_branch),
+    ("not_branch", ({NOT}, BRANCHES), _not_branch),
+    ("branch_over_jump", (BRANCHES, {GOTO}, {LABEL}), _branch_over_jump),
+    ("negated_equality", ({EQ, NE}, {NOT}), _negated_equality),
+    ("identity", ({SUB, MUL, DIV},), _identity),
+)
+
+# opcode -> (name, window size, opcode sets of the rest, rewrite) of the
+# rules whose window ends with it, in RULES order
+_INDEX = {op: [(name, len(pattern), pattern[:-1], rewrite)
+               for name, pattern, rewrite in RULES
+               if pattern[-1] is None or op in pattern[-1]]
+          for op in range(len(OP_NAMES))}
+
+
+def apply_rules(tac):
+    """Rewrite `tac` with `RULES` until none applies, in place; returns a
+    Counter of how often each rule fired."""
+    code = tac.instruction_list()
+    fired = Counter()
+    while True:
+        code, changed = _sweep(tac, code, fired)
+        if not changed:
+            break
+    tac.replace(code)
+    return fired
+
+
+def _sweep(tac, code, fired):
+    state = _State(tac, code)
+    pending = code[::-1]
+    out = []
+    changed = False
+    while pending:
+        out.append(pending.pop())
+        n = len(out)
+        for name, k, head, rewrite in _INDEX[out[-1][0]]:
+            if n < k or head and out[-2][0] not in head[-1]:
+                continue
+            window = out[-k:]
+            if k > 2 and not all(ins[0] in ops
+                                 for ops, ins in zip(head, window)):
+                continue
+            new = rewrite(state, window)
+            if new is None:
+                continue
+            state.count(window, -1)
+            state.count(new, 1)
+            del out[-k:]
+            pending.extend(reversed(new))
+            fired[name] += 1
+            changed = True
+            break
+    if state.alias:
+        for ins in out:
+            if ins[0] in _JUMPS:
+                ins[3] = state.label(ins[3])
+    return out, changed
+
+
+def peephole(tac):
+    """`apply_rules` as an optimization pass: returns the number of
+    instructions removed."""
+    before = len(tac)
+    apply_rules(tac)
+    return before - len(tac)
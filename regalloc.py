@@ -0,0 +1,180 @@
+"""Temp reuse by linear-scan register allocation.
+
+The code generator takes a new temp for every intermediate value, so a
+big program has as many temps as expressions, and each is a slot in the
+VM's register array and in the frame a call saves.  `allocate_temps`
+gives the temps of each region (the top level or one function body) a
+live interval from liveness (`dataflow.liveness`) and hands out a small
+set of reusable registers along them (Poletto and Sarkar's linear scan);
+the registers are temps again, t1, t2, ...
+
+Regions may share registers: a call saves and restores every temp of the
+callee's frame, so a caller's temps survive the callee's use of the same
+slots.
+
+With `registers=k` at most k registers are used per region, as for a
+native backend: when more temps are live, the one whose interval ends
+last is spilled.  Spilled temps share spill slots numbered after the
+registers (t<k+1>, ...), allocated by the same scan without a limit.
+"""
+import heapq
+
+from cfg import CFG
+from dataflow import liveness
+from tac import TEMP, TAG_BITS, TAG_MASK, WRITES_RESULT, ASSIGN
+
+_SHARED = object()  # a temp referred to from more than one region
+
+
+def allocate_temps(tac, registers=None):
+    """Rename the temps of `tac` onto reusable registers, in place.
+
+    Returns a (function, temps, peak live, registers, spilled) tuple per
+    region: the function's name (None for the top level), how many
+    distinct temps it had, the most that are live at once, how many
+    registers it now uses and how many of its temps were spilled."""
+    code = tac.instruction_list()
+    cfg = CFG(code)
+    intervals, regions, peaks = _live_intervals(cfg, tac)
+
+    mapping = {}
+    report = []
+    top = 0   # highest register or spill slot used
+    shared = []
+    for region, temps in regions.items():
+        if region is _SHARED:
+            shared = temps
+            continue
+        order = sorted((intervals[t] + (t,) for t in temps))
+        assign, used, spilled = _linear_scan(order, registers)
+        top = max(top, used)
+        if spilled:
+            slots = sorted(intervals[t] + (t,) for t in spilled)
+            spill_assign, spill_used, _ = _linear_scan(slots, None)
+            for t, slot in spill_assign.items():
+                assign[t] = used + slot
+            top = max(top, used + spill_used)
+        for t, r in assign.items():
+            mapping[t] = r << TAG_BITS | TEMP
+        if region is None:
+            name = None
+        else:
+            name = tac.operand_text(code[cfg.blocks[region].start - 1][1])
+        report.append((name, len(temps), peaks.get(region, 0), used,
+                       len(spilled)))
+    for t in shared:
+        top += 1
+        mapping[t] = top << TAG_BITS | TEMP
+
+    def rename(a):
+        return mapping.get(a, a)
+
+    for ins in code:
+        tac.map_reads(ins, rename)
+        if ins[0] in WRITES_RESULT:
+            ins[3] = rename(ins[3])
+    tac.replace(ins for ins in code
+                if ins[0] != ASSIGN or ins[1] != ins[3])
+    tac.temp_counter = top
+    report.sort(key=lambda r: (r[0] is not None, r[0] or ""))
+    return report
+
+
+def _temps(bits):
+    """Temp operands of a liveness bitset already shifted past the
+    variables."""
+    while bits:
+        low = bits & -bits
+        yield (low.bit_length() - 1) << TAG_BITS | TEMP
+        bits ^= low
+
+
+def _live_intervals(cfg, tac):
+    """({temp: (first, last)}, {region: [temps]}, {region: peak live}).
+
+    Position 2i is where instruction i reads and 2i + 1 where it writes,
+    so a temp last read by an instruction and one it writes can share a
+    register."""
+    code = cfg.code
+    live_in, live_out = liveness(cfg, tac)
+    shift = len(tac.names)  # temps come after the variables
+    first = {}
+    last = {}
+    region_of = {}
+    peaks = {}
+
+    def touch(t, pos):
+        if t not in first or pos < first[t]:
+            first[t] = pos
+        if t not in last or pos > last[t]:
+            last[t] = pos
+
+    for block in cfg:
+        region = block.function
+        live = set(_temps(live_out[block.index] >> shift))
+        for t in live:
+            touch(t, 2 * block.end - 1)
+        peak = len(live)
+        for i in range(block.end - 1, block.start - 1, -1):
+            op, a1, a2, res = code[i]
+            if op in WRITES_RESULT and res & TAG_MASK == TEMP:
+                touch(res, 2 * i + 1)
+                live.discard(res)
+                if region_of.setdefault(res, region) != region:
+                    region_of[res] = _SHARED
+            for a in tac.reads(op, a1, a2):
+                if a & TAG_MASK == TEMP:
+                    touch(a, 2 * i)
+                    live.add(a)
+                    if region_of.setdefault(a, region) != region:
+                        region_of[a] = _SHARED
+            peak = max(peak, len(live))
+        for t in live:
+            touch(t, 2 * block.start)
+        peaks[region] = max(peaks.get(region, 0), peak)
+
+    regions = {}
+    for t, region in region_of.items():
+        regions.setdefault(region, []).append(t)
+    intervals = {t: (first[t], last[t]) for t in first}
+    return intervals, regions, peaks
+
+
+def _linear_scan(order, registers):
+    """Assign registers 1, 2, ... to the (first, last, temp) intervals of
+    `order`, sorted by start.  Returns (temp -> register, registers used,
+    spilled temps)."""
+    active = []   # heap of (last, register, temp)
+    free = []     # heap of released registers, lowest reused first
+    used = 0
+    assign = {}
+    spilled = []
+    for start, end, t in order:
+        while active and active[0][0] < start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            r = heapq.heappop(free)
+        elif registers is None or used < registers:
+            used += 1
+            r = used
+        else:
+            furthest = max(active)
+            if furthest[0] <= end:
+                spilled.append(t)
+                continue
+            active.remove(furthest)
+            heapq.heapify(active)
+            spilled.append(furthest[2])
+            del assign[furthest[2]]
+            r = furthest[1]
+        assign[t] = r
+        heapq.heappush(active, (end, r, t))
+    return assign, used, spilled
+
+
+def reuse_temps(tac):
+    """`allocate_temps` as an optimization pass: returns the number of
+    instructions removed (copies of a temp onto itself)."""
+    before = len(tac)
+    allocate_temps(tac)
+    return before - len(tac)
@@ -1,3 +1,6 @@
+from visitor import Visitor
+
+
 class SemanticError(Exception):
     pass
 
@@ -12,6 +15,16 @@ class SymbolTable:
         # هر آیتم: (scope_name, scope_dict)
         self.all_scopes = []
 
+        # every declaration gets a dense integer symbol id; later phases
+        # work on ids and turn them back into names only for display
+        self.names = []    # symbol id -> name
+        self.symbols = []  # symbol id -> info
+        self._unbound = {}  # name -> id for names no declaration covers
+
+        # name -> stack of the ids of its live bindings, innermost last, so
+        # lookup does not depend on how deep the current scope is
+        self.bindings = {}
+
     def enter_scope(self, name=""):
         new_scope = {}
         scope_name = name if name else f"scope_{len(self.all_scopes) + 1}"
@@ -23,19 +36,51 @@ class SymbolTable:
         self.all_scopes.append((scope_name, new_scope))
 
     def exit_scope(self):
-        self.scopes.pop()
+        # only the names declared in this scope lose a binding
+        bindings = self.bindings
+        for name in self.scopes.pop():
+            stack = bindings[name]
+            stack.pop()
+            if not stack:
+                del bindings[name]
         self.scope_names.pop()
 
+    def _new_symbol(self, name, info):
+        sid = len(self.names)
+        self.names.append(name)
+        self.symbols.append(info)
+        return sid
+
     def declare(self, name, info):
+        """Bind `name` in the current scope; returns its new symbol id."""
         if name in self.scopes[-1]:
             raise SemanticError(f"Semantic Error: redeclaration of '{name}'")
         self.scopes[-1][name] = info
+        sid = self._new_symbol(name, info)
+        stack = self.bindings.get(name)
+        if stack is None:
+            self.bindings[name] = [sid]
+        else:
+            stack.append(sid)
+        return sid
+
+    def resolve(self, name):
+        """Symbol id of the innermost live binding of `name`."""
+        stack = self.bindings.get(name)
+        if stack:
+            return stack[-1]
+        raise SemanticError(f"Semantic Error: '{name}' is not defined")
 
     def lookup(self, name):
-        for scope in reversed(self.scopes):
-            if name in scope:
-                return scope[name]
-        raise SemanticError(f"Semantic Error: '{name}' is not defined")
+        return self.symbols[self.resolve(name)]
+
+    def intern(self, name):
+        """Symbol id for a name used outside any checked declaration (code
+        generated from a tree semantic analysis did not resolve)."""
+        sid = self._unbound.get(name)
+        if sid is None:
+            sid = self._unbound[name] = self._new_symbol(name, None)
+        return sid
 
     def print_symbol_table(self):
         print("----- Symbol Table (All Scopes) -----")
@@ -61,211 +106,205 @@ class SymbolTable:
         print("------------------------------------")
 
 
-class SemanticAnalyzer:
+class SemanticAnalyzer(Visitor):
+    # a SemanticError fails only the node that raised it
+    recoverable = (SemanticError,)
+
     def __init__(self):
+        super().__init__()
         self.symtab = SymbolTable()
         self.errors = []
         self.current_function = None
 
+    def check(self, ast):
+        """Analyze a node tree or FlatAST without printing; returns errors."""
+        self.visit(self.bind(ast))
+        return self.errors
+
     def analyze(self, ast):
-        self.visit(ast)
+        self.check(ast)
         self.symtab.print_symbol_table()
         return self.errors
 
-    def visit(self, node):
-        if node is None:
+    def recover(self, node, error):
+        self.errors.append(str(error))
+        return None
+
+    def leave(self, node, result):
+        if node.__class__ is not list:
+            self.tree.set_type(node, result)
+        return result
+
+    def visit_program(self, node, stmts):
+        yield stmts
+
+    def visit_var_decl(self, node, var_type, name, init):
+        sid = self.symtab.declare(name, {"type": var_type})
+        self.tree.set_symbol(node, sid)
+        if init is not None:
+            et = yield init
+            if et is not None:
+                self.check_assignment(var_type, et)
+
+    def visit_var_decl_array(self, node, var_type, name, size):
+        if not isinstance(size, int):
+            raise SemanticError("Array size must be integer literal")
+        sid = self.symtab.declare(name, {"type": var_type, "array": True})
+        self.tree.set_symbol(node, sid)
+
+    def visit_func_decl(self, node, name, params, body):
+        if params is None:
+            params = []
+
+        tree = self.tree
+        param_info = [tree.fields(p) for p in params]
+        tree.set_symbol(node, self.symtab.declare(
+            name,
+            {"type": "func", "params": param_info, "return": "void"}
+        ))
+
+        self.symtab.enter_scope(f"function:{name}")
+        self.current_function = name
+
+        for p, (ptype, pname) in zip(params, param_info):
+            tree.set_symbol(p, self.symtab.declare(pname, {"type": ptype}))
+
+        yield body
+
+        self.current_function = None
+        self.symtab.exit_scope()
+
+    def visit_block(self, node, stmts):
+        self.symtab.enter_scope("block")
+        yield stmts
+        self.symtab.exit_scope()
+
+    def visit_assign(self, node, target, value):
+        lt = yield target
+        rt = yield value
+        if lt is not None and rt is not None:
+            self.check_assignment(lt, rt)
+
+    def visit_loc(self, node, name):
+        sid = self.symtab.resolve(name)
+        self.tree.set_symbol(node, sid)
+        return self.symtab.symbols[sid]["type"]
+
+    def visit_loc_array(self, node, name, index):
+        sid = self.symtab.resolve(name)
+        self.tree.set_symbol(node, sid)
+        info = self.symtab.symbols[sid]
+        if "array" not in info:
+            raise SemanticError(f"'{name}' is not an array")
+        it = yield index
+        if it != "int":
+            raise SemanticError("Array index must be int")
+        return info["type"]
+
+    def visit_if(self, node, cond, then_blk, elif_part, else_part):
+        ct = yield cond
+        if ct is not None and ct != "bool":
+            raise SemanticError("Condition of if must be bool")
+        yield then_blk
+        yield elif_part
+        yield else_part
+
+    def visit_elif(self, node, cond, body, next_elif):
+        ct = yield cond
+        if ct is not None and ct != "bool":
+            raise SemanticError("Condition of elif must be bool")
+        yield body
+        yield next_elif
+
+    def visit_while(self, node, cond, body):
+        ct = yield cond
+        if ct is not None and ct != "bool":
+            raise SemanticError("Condition of while must be bool")
+        yield body
+
+    def visit_for(self, node, init, cond, step, body):
+        self.symtab.enter_scope("for_loop")
+        yield init
+        ct = yield cond
+        if ct is not None and ct != "bool":
+            raise SemanticError("Condition of for must be bool")
+        yield step
+        yield body
+        self.symtab.exit_scope()
+
+    def visit_print(self, node, value):
+        yield value
+
+    def visit_input(self, node, name):
+        self.tree.set_symbol(node, self.symtab.resolve(name))
+
+    def visit_return(self, node, value):
+        if self.current_function is None:
+            raise SemanticError("Return outside of function")
+        if value is not None:
+            raise SemanticError("Void function cannot return a value")
+
+    def visit_binop(self, node, op, left, right):
+        lt = yield left
+        rt = yield right
+
+        if lt is None or rt is None:
             return None
 
-        try:
-            if isinstance(node, list):
-                for n in node:
-                    self.visit(n)
-                return None
-
-            tag = node[0]
-
-            if tag == "program":
-                self.visit(node[1])
-
-            elif tag == "var_decl":
-                _, var_type, name, expr = node
-                self.symtab.declare(name, {"type": var_type})
-                if expr:
-                    et = self.visit(expr)
-                    if et is not None:
-                        self.check_assignment(var_type, et)
-
-            elif tag == "var_decl_array":
-                _, var_type, name, size = node
-                if not isinstance(size, int):
-                    raise SemanticError("Array size must be integer literal")
-                self.symtab.declare(name, {"type": var_type, "array": True})
-
-            elif tag == "func_decl":
-                _, name, params, body = node
-                if params is None:
-                    params = []
-
-                param_info = [(ptype, pname) for _, ptype, pname in params]
-                self.symtab.declare(
-                    name,
-                    {"type": "func", "params": param_info, "return": "void"}
-                )
-
-                self.symtab.enter_scope(f"function:{name}")
-                self.current_function = name
-
-                for _, ptype, pname in params:
-                    self.symtab.declare(pname, {"type": ptype})
-
-                self.visit(body)
-
-                self.current_function = None
-                self.symtab.exit_scope()
-
-            elif tag == "block":
-                self.symtab.enter_scope("block")
-                self.visit(node[1])
-                self.symtab.exit_scope()
-
-            elif tag == "stmt":
-                self.visit(node[1])
-
-            elif tag == "assign":
-                _, loc, expr = node
-                lt = self.visit(loc)
-                rt = self.visit(expr)
-                if lt is not None and rt is not None:
-                    self.check_assignment(lt, rt)
-
-            elif tag == "loc":
-                info = self.symtab.lookup(node[1])
-                return info["type"]
-
-            elif tag == "loc_array":
-                _, name, index = node
-                info = self.symtab.lookup(name)
-                if "array" not in info:
-                    raise SemanticError(f"'{name}' is not an array")
-                it = self.visit(index)
-                if it != "int":
-                    raise SemanticError("Array index must be int")
-                return info["type"]
-
-            elif tag == "if":
-                _, cond, then_blk, elif_p, else_p = node
-                ct = self.visit(cond)
-                if ct is not None and ct != "bool":
-                    raise SemanticError("Condition of if must be bool")
-                self.visit(then_blk)
-                self.visit(elif_p)
-                self.visit(else_p)
-
-            elif tag == "elif":
-                _, cond, blk, next_elif = node
-                ct = self.visit(cond)
-                if ct is not None and ct != "bool":
-                    raise SemanticError("Condition of elif must be bool")
-                self.visit(blk)
-                self.visit(next_elif)
-
-            elif tag == "while":
-                _, cond, blk = node
-                ct = self.visit(cond)
-                if ct is not None and ct != "bool":
-                    raise SemanticError("Condition of while must be bool")
-                self.visit(blk)
-
-            elif tag == "for":
-                _, init, cond, step, blk = node
-                self.symtab.enter_scope("for_loop")
-                self.visit(init)
-                ct = self.visit(cond)
-                if ct is not None and ct != "bool":
-                    raise SemanticError("Condition of for must be bool")
-                self.visit(step)
-                self.visit(blk)
-                self.symtab.exit_scope()
-
-            elif tag == "print":
-                self.visit(node[1])
-
-            elif tag == "input":
-                self.symtab.lookup(node[1])
-
-            elif tag == "return":
-                if self.current_function is None:
-                    raise SemanticError("Return outside of function")
-                if node[1] is not None:
-                    raise SemanticError("Void function cannot return a value")
-
-            elif tag == "binop":
-                _, op, l, r = node
-                lt = self.visit(l)
-                rt = self.visit(r)
-
-                if lt is None or rt is None:
-                    return None
-
-                if op in ("&&", "||"):
-                    if lt != "bool" or rt != "bool":
-                        raise SemanticError("Logical operators require bool")
-                    return "bool"
-
-                if op in ("<", "<=", ">", ">=", "==", "!="):
-                    if lt != rt:
-                        raise SemanticError("Type mismatch in comparison")
-                    return "bool"
-
-                return self.numeric_result(lt, rt)
-
-            elif tag == "unary":
-                _, op, expr = node
-                et = self.visit(expr)
-                if et is None:
-                    return None
-                if op == "!" and et != "bool":
-                    raise SemanticError("Logical NOT requires bool")
-                if op == "-" and et not in ("int", "float"):
-                    raise SemanticError("Unary minus requires numeric")
-                return et
-
-            elif tag == "literal":
-                v = node[1]
-                if v in ("true", "false"):
-                    return "bool"
-                if isinstance(v, int):
-                    return "int"
-                if isinstance(v, float):
-                    return "float"
-                if isinstance(v, str) and len(v) == 1:
-                    return "char"
-                return "string"
-
-            elif tag == "call":
-                _, name, args = node
-                info = self.symtab.lookup(name)
-
-                if info["type"] != "func":
-                    raise SemanticError(f"'{name}' is not a function")
-
-                if args is None:
-                    args = []
-
-                params = info["params"] or []
-                if len(params) != len(args):
-                    raise SemanticError("Function argument count mismatch")
-
-                for (_, pt, _), a in zip(params, args):
-                    at = self.visit(a)
-                    if at is not None:
-                        self.check_assignment(pt, at)
-
-                raise SemanticError("Void function used in expression")
-
-        except SemanticError as e:
-            self.errors.append(str(e))
+        if op in ("&&", "||"):
+            if lt != "bool" or rt != "bool":
+                raise SemanticError("Logical operators require bool")
+            return "bool"
+
+        if op in ("<", "<=", ">", ">=", "==", "!="):
+            if lt != rt:
+                raise SemanticError("Type mismatch in comparison")
+            return "bool"
+
+        return self.numeric_result(lt, rt)
+
+    def visit_unary(self, node, op, operand):
+        et = yield operand
+        if et is None:
             return None
+        if op == "!" and et != "bool":
+            raise SemanticError("Logical NOT requires bool")
+        if op == "-" and et not in ("int", "float"):
+            raise SemanticError("Unary minus requires numeric")
+        return et
+
+    def visit_literal(self, node, v):
+        if v in ("true", "false"):
+            return "bool"
+        if isinstance(v, int):
+            return "int"
+        if isinstance(v, float):
+            return "float"
+        if isinstance(v, str) and len(v) == 1:
+            return "char"
+        return "string"
+
+    def visit_call(self, node, name, args):
+        sid = self.symtab.resolve(name)
+        self.tree.set_symbol(node, sid)
+        info = self.symtab.symbols[sid]
+
+        if info["type"] != "func":
+            raise SemanticError(f"'{name}' is not a function")
+
+        if args is None:
+            args = []
+
+        params = info["params"] or []
+        if len(params) != len(args):
+            raise SemanticError("Function argument count mismatch")
+
+        for (_, pt, _), a in zip(params, args):
+            at = yield a
+            if at is not None:
+                self.check_assignment(pt, at)
+
+        raise SemanticError("Void function used in expression")
 
     def check_assignment(self, lhs, rhs):
         if lhs == rhs:
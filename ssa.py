@@ -0,0 +1,559 @@
+"""Static single assignment form of TAC.
+
+    form = SSA(tac)     # into SSA form
+    propagate(form)     # copy and constant propagation, one sweep
+    form.to_tac()       # back to plain TAC, written into `tac`
+
+In SSA form each renamed temp or variable is written by exactly one
+instruction or phi, and that write dominates every read of it.  A pass
+over SSA form can then trust a value wherever it meets it: copy and
+constant propagation become one sweep over the blocks in reverse
+postorder instead of iterating a dataflow problem to a fixed point.
+
+Only names private to one region (the top level or one function body)
+are renamed: temps, variables no function reads, and a function's own
+parameters and locals (which the VM restores when it returns).  Globals a
+function may read or assign across a `call` keep their single name.
+
+Construction follows Cytron et al.  Dominators and dominance frontiers
+(cfg.py) place a phi for a name at the iterated frontier of its writes,
+where the name is live (pruned SSA).  A walk of the dominator tree then
+gives each write a fresh temp and points each read at the version that
+reaches it.  A read no write reaches keeps the original operand: its value
+is the parameter's argument or the VM's None for a variable never set.
+
+Destruction coalesces the names of each phi, and the versions of one
+variable, into one name unless their live ranges overlap, which restores
+the original names of code no pass changed.  The phis left become
+parallel copies at the end of each predecessor, ordered so no source is
+overwritten before it is read, with a temp to break a cycle.  A copy on
+the jump of an `ifFalse` or `ifTrue` gets a block of its own, since it
+must not run when the branch falls through.
+"""
+from collections import Counter
+
+from cfg import CFG, ENDS_BLOCK
+from constprop import evaluate
+from dataflow import liveness, operand_bit, solve
+from tac import (TEMP, VAR, CONST, TAG_MASK, NONE, WRITES_RESULT, BINARY,
+                 UNARY, BRANCHES, ASSIGN, GOTO, LABEL, FUNC, ENDFUNC)
+
+_SHARED = object()  # a name referred to from more than one region
+
+
+class Phi:
+    __slots__ = ("name", "result", "args")
+
+    def __init__(self, name, npreds):
+        self.name = name            # the operand it merges versions of
+        self.result = name
+        self.args = [name] * npreds  # one per predecessor, as block.preds
+
+    def __repr__(self):
+        return f"Phi({self.result} = {self.args})"
+
+
+class SSA:
+    def __init__(self, tac):
+        self.tac = tac
+        code = tac.instruction_list()
+        cfg = CFG(code)
+        # an entry that is also a jump target (a loop at the very start)
+        # gets a `goto` to it as a new entry, so its phis see the entry as
+        # one more predecessor
+        self._entry_jumps = []
+        for entry in sorted(cfg.entries, reverse=True):
+            if cfg.blocks[entry].preds:
+                start = cfg.blocks[entry].start
+                jump = [GOTO, NONE, NONE, code[start][3]]
+                code.insert(start, jump)
+                self._entry_jumps.append(jump)
+        if self._entry_jumps:
+            cfg = CFG(code)
+        self.cfg = cfg
+        self.idom = cfg.dominators()
+        self.order = cfg.postorder()  # reachable blocks, reverse postorder
+        self.order.reverse()
+        self.names = _private_names(cfg, tac)
+        self.phis = [[] for _ in cfg.blocks]
+        self.origin = {}  # version -> operand it renames
+        # block -> instructions a pass added at its end (see block_code)
+        self.appended = {}
+        renamed = self._to_rename()
+        self._place_phis(renamed)
+        self._rename(renamed)
+
+    def dominator_walk(self):
+        """(block, entering) pairs of a depth-first walk of the dominator
+        tree: each block is entered before and left after those it
+        dominates."""
+        children = [[] for _ in self.cfg.blocks]
+        roots = []
+        for b in self.order:
+            d = self.idom[b]
+            if d == b:
+                roots.append(b)
+            else:
+                children[d].append(b)
+        for root in roots:
+            stack = [(root, True)]
+            while stack:
+                b, entering = stack.pop()
+                yield b, entering
+                if entering:
+                    stack.append((b, False))
+                    stack.extend((c, True) for c in reversed(children[b]))
+
+    def block_code(self, b):
+        """The instructions of block `b` as passes left them: without the
+        removed ones, and with those added by `appended` ahead of a
+        closing jump."""
+        code = [ins for ins in self.cfg.instructions(self.cfg.blocks[b])
+                if ins is not None]
+        extra = self.appended.get(b)
+        if extra:
+            if code and code[-1][0] in ENDS_BLOCK:
+                code[-1:-1] = extra
+            else:
+                code.extend(extra)
+        return code
+
+    def _to_rename(self):
+        """Private names written more than once, or read where their one
+        write may not have happened yet."""
+        cfg, tac = self.cfg, self.tac
+        writes = Counter()
+        for b in self.order:
+            for op, a1, a2, res in cfg.instructions(cfg.blocks[b]):
+                if op in WRITES_RESULT and res in self.names:
+                    writes[res] += 1
+        renamed = {a for a, n in writes.items() if n > 1}
+        once = {a for a, n in writes.items() if n == 1}
+        written = set()
+        added = {}
+        for b, entering in self.dominator_walk():
+            if not entering:
+                written.difference_update(added.pop(b))
+                continue
+            new = added[b] = []
+            for op, a1, a2, res in cfg.instructions(cfg.blocks[b]):
+                for a in tac.reads(op, a1, a2):
+                    if a in once and a not in written:
+                        renamed.add(a)
+                if op in WRITES_RESULT and res in once:
+                    written.add(res)
+                    new.append(res)
+        return renamed
+
+    def _place_phis(self, renamed):
+        cfg, tac = self.cfg, self.tac
+        live_in, _ = liveness(cfg, tac)
+        frontiers = cfg.dominance_frontiers(self.idom)
+        written_in = {a: set() for a in renamed}
+        for b in self.order:
+            for op, a1, a2, res in cfg.instructions(cfg.blocks[b]):
+                if op in WRITES_RESULT and res in written_in:
+                    written_in[res].add(b)
+        for a, blocks in written_in.items():
+            bit = 1 << operand_bit(tac, a)
+            work = list(blocks)
+            placed = set()
+            while work:
+                for f in frontiers[work.pop()]:
+                    if f in placed:
+                        continue
+                    placed.add(f)
+                    if live_in[f] & bit:
+                        self.phis[f].append(
+                            Phi(a, len(cfg.blocks[f].preds)))
+                    if f not in blocks:
+                        work.append(f)
+
+    def _version(self, a):
+        v = self.tac.new_temp()
+        self.origin[v] = a
+        self.names.add(v)
+        return v
+
+    def _rename(self, renamed):
+        cfg, tac, code = self.cfg, self.tac, self.cfg.code
+        stacks = {a: [a] for a in renamed}
+
+        def current(a):
+            stack = stacks.get(a)
+            return stack[-1] if stack else a
+
+        pushed = {}
+        for b, entering in self.dominator_walk():
+            if not entering:
+                for a in pushed.pop(b):
+                    stacks[a].pop()
+                continue
+            block = cfg.blocks[b]
+            names = pushed[b] = []
+            for phi in self.phis[b]:
+                phi.result = self._version(phi.name)
+                stacks[phi.name].append(phi.result)
+                names.append(phi.name)
+            for i in range(block.start, block.end):
+                ins = code[i]
+                tac.map_reads(ins, current)
+                a = ins[3]
+                if ins[0] in WRITES_RESULT and a in stacks:
+                    ins[3] = self._version(a)
+                    stacks[a].append(ins[3])
+                    names.append(a)
+            for s in block.succs:
+                j = cfg.blocks[s].preds.index(b)
+                for phi in self.phis[s]:
+                    phi.args[j] = current(phi.name)
+
+    # ----- out of SSA -----
+
+    def to_tac(self):
+        """Leave SSA form: write the code, with the phis replaced by
+        copies, back to `tac`."""
+        self.tac.replace(self._emit(self._coalesce()))
+
+    def _coalesce(self):
+        """Map from SSA names to the names they share."""
+        cfg, tac = self.cfg, self.tac
+        # the names coalescing may merge, and which of them it may merge
+        parent = {}
+
+        def find(a):
+            root = a
+            while parent[root] != root:
+                root = parent[root]
+            while parent[a] != root:
+                parent[a], a = root, parent[a]
+            return root
+
+        def link(a, b):
+            parent.setdefault(a, a)
+            parent.setdefault(b, b)
+            parent[find(a)] = find(b)
+
+        merges = []
+        for b in self.order:
+            for phi in self.phis[b]:
+                parent.setdefault(phi.result, phi.result)
+                for a in phi.args:
+                    if a & TAG_MASK in (TEMP, VAR):
+                        link(a, phi.result)
+                        merges.append((phi.result, a))
+        for v, a in self.origin.items():
+            link(v, a)
+            merges.append((v, a))
+        if not merges:
+            return {}
+        universe = list(parent)
+        index = {a: k for k, a in enumerate(universe)}
+        component = {a: find(a) for a in universe}
+
+        # liveness of those names; a phi reads its arguments at the end of
+        # the predecessors and writes its result at the block start
+        blocks = cfg.blocks
+        gen = [0] * len(blocks)
+        kill = [0] * len(blocks)
+        boundary = {}
+        writes = set()
+        for b in self.order:
+            block = blocks[b]
+            use = k = 0
+            for phi in self.phis[b]:
+                k |= 1 << index[phi.result]
+                writes.add(phi.result)
+                for a, p in zip(phi.args, block.preds):
+                    if a in index:
+                        boundary[p] = boundary.get(p, 0) | 1 << index[a]
+            for op, a1, a2, res in self.block_code(b):
+                for a in tac.reads(op, a1, a2):
+                    if a in index and not k >> index[a] & 1:
+                        use |= 1 << index[a]
+                if op in WRITES_RESULT and res in index:
+                    k |= 1 << index[res]
+                    writes.add(res)
+            gen[b] = use
+            kill[b] = k
+        live_in, live_out = solve(cfg, gen, kill, forward=False,
+                                  boundary=boundary)
+
+        def live_names(bits):
+            names = {}
+            while bits:
+                low = bits & -bits
+                a = universe[low.bit_length() - 1]
+                names.setdefault(component[a], set()).add(a)
+                bits ^= low
+            return names
+
+        # names of the same component live where each name is written; a
+        # name never written holds its value from the region entry
+        at_write = {}
+        entry_of = {}
+        for b in self.order:
+            block = blocks[b]
+            live = live_names(live_out[b])
+            for op, a1, a2, res in reversed(self.block_code(b)):
+                if op in WRITES_RESULT and res in index:
+                    same = live.setdefault(component[res], set())
+                    same.discard(res)
+                    at_write[res] = set(same)
+                for a in tac.reads(op, a1, a2):
+                    if a in index:
+                        live.setdefault(component[a], set()).add(a)
+                        entry_of.setdefault(a, block.function or 0)
+            results = {}
+            for phi in self.phis[b]:
+                results.setdefault(component[phi.result], set()).add(
+                    phi.result)
+                for a in phi.args:
+                    if a in index:
+                        entry_of.setdefault(a, block.function or 0)
+            for phi in self.phis[b]:
+                c = component[phi.result]
+                at_write[phi.result] = (live.get(c, set()) | results[c]) \
+                    - {phi.result}
+        entry_live = {}
+        for a in universe:
+            if a not in writes:
+                entry = entry_of.get(a, 0)
+                if entry not in entry_live:
+                    entry_live[entry] = live_names(live_in[entry])
+                at_write[a] = entry_live[entry].get(component[a], set()) \
+                    - {a}
+
+        # greedy merging of groups whose live ranges do not overlap; a
+        # group keeps at most one name never written, and is named by it
+        members = {a: {a} for a in universe}
+        overlaps = {a: at_write.get(a, set()) for a in universe}
+        fixed = {a: a for a in universe if a not in writes}
+        group = {a: a for a in universe}
+
+        def leader(a):
+            root = a
+            while group[root] != root:
+                root = group[root]
+            while group[a] != root:
+                group[a], a = root, group[a]
+            return root
+
+        for a, b in merges:
+            x, y = leader(a), leader(b)
+            if x == y or (x in fixed and y in fixed):
+                continue
+            if overlaps[x] & members[y] or overlaps[y] & members[x]:
+                continue
+            if len(members[x]) > len(members[y]):
+                x, y = y, x
+            group[x] = y
+            members[y] |= members.pop(x)
+            overlaps[y] |= overlaps.pop(x)
+            if x in fixed:
+                fixed[y] = fixed.pop(x)
+
+        rename = {}
+        for a in universe:
+            g = leader(a)
+            name = fixed.get(g, g)
+            if name != a:
+                rename[a] = name
+        return rename
+
+    def _emit(self, rename):
+        cfg, tac, code = self.cfg, self.tac, self.cfg.code
+        blocks = cfg.blocks
+
+        def name(a):
+            return rename.get(a, a)
+
+        before_jump = {}   # block -> copies ahead of its closing jump
+        after = {}         # block -> copies after its last instruction
+        splits = {}        # region entry -> [(label, target label, copies)]
+        for b in self.order:
+            block = blocks[b]
+            if not self.phis[b]:
+                continue
+            for j, p in enumerate(block.preds):
+                if self.idom[p] is None:
+                    continue
+                copies = [(name(phi.result), name(phi.args[j]))
+                          for phi in self.phis[b]]
+                copies = [(d, s) for d, s in copies if d != s]
+                if not copies:
+                    continue
+                last = code[blocks[p].end - 1]
+                op = last[0] if last is not None else None
+                if op in BRANCHES:
+                    if cfg.label_block.get(last[3]) == b:
+                        label = tac.new_label()
+                        splits.setdefault(blocks[p].function, []).append(
+                            (label, last[3], copies))
+                        last[3] = label
+                    if p + 1 == b:
+                        after[p] = copies
+                elif op == GOTO or op == FUNC:
+                    before_jump[p] = copies
+                else:
+                    after[p] = copies
+
+        out = []
+
+        def emit_copies(copies):
+            for d, s in _sequence(copies, tac.new_temp):
+                out.append([ASSIGN, s, NONE, d])
+
+        def emit_splits(region):
+            if region not in splits:
+                return
+            skip = tac.new_label()
+            out.append([GOTO, NONE, NONE, skip])
+            for label, target, copies in splits.pop(region):
+                out.append([LABEL, NONE, NONE, label])
+                emit_copies(copies)
+                out.append([GOTO, NONE, NONE, target])
+            out.append([LABEL, NONE, NONE, skip])
+
+        entry_jumps = set(map(id, self._entry_jumps))
+        for block in cfg:
+            b = block.index
+            reachable = self.idom[b] is not None
+            instructions = self.block_code(b)
+            for n, ins in enumerate(instructions):
+                op = ins[0]
+                if n == len(instructions) - 1 and b in before_jump:
+                    emit_copies(before_jump[b])
+                if id(ins) in entry_jumps:
+                    continue
+                if op == ENDFUNC:
+                    emit_splits(block.function)
+                elif not reachable and op != FUNC:
+                    continue
+                tac.map_reads(ins, name)
+                if op in WRITES_RESULT:
+                    ins[3] = name(ins[3])
+                if op == ASSIGN and ins[1] == ins[3]:
+                    continue
+                out.append(ins)
+            if b in after:
+                emit_copies(after[b])
+        emit_splits(None)
+        return out
+
+
+def _private_names(cfg, tac):
+    """Temps and variables only one region refers to, whose values no
+    other region can see."""
+    regions = {}
+    for block in cfg:
+        region = block.function
+        for op, a1, a2, res in cfg.instructions(block):
+            operands = tac.reads(op, a1, a2)
+            if op in WRITES_RESULT:
+                operands = (*operands, res)
+            for a in operands:
+                if a & TAG_MASK in (TEMP, VAR) \
+                        and regions.setdefault(a, region) != region:
+                    regions[a] = _SHARED
+    frames = {}
+    for entry in cfg.entries:
+        if entry != 0:
+            params, local_vars = tac.functions.get(
+                cfg.code[cfg.blocks[entry].start - 1][1], ((), ()))
+            frames[entry] = set(params) | set(local_vars)
+    return {a for a, region in regions.items()
+            if region is not _SHARED and a not in tac.arrays
+            and (a & TAG_MASK == TEMP or region is None
+                 or a in frames.get(region, ()))}
+
+
+def _sequence(copies, new_temp):
+    """Order parallel copies [(destination, source)] so that no source is
+    overwritten before it is read; a cycle is broken with a new temp."""
+    pending = dict(copies)
+    readers = Counter(pending.values())
+    ready = [d for d in pending if not readers[d]]
+    out = []
+    while pending:
+        while ready:
+            d = ready.pop()
+            s = pending.pop(d)
+            out.append((d, s))
+            readers[s] -= 1
+            if s in pending and not readers[s]:
+                ready.append(s)
+        if pending:
+            # only cycles are left: save one destination's value first
+            d = next(iter(pending))
+            t = new_temp()
+            out.append((t, d))
+            for x, s in pending.items():
+                if s == d:
+                    pending[x] = t
+            readers[d] = 0
+            ready.append(d)
+    return out
+
+
+def propagate(form):
+    """Copy and constant propagation over SSA form `form`, in one sweep:
+    a copy of a constant or of another private name, and an operator on
+    constants, is replaced by its value wherever it is read.  Returns the
+    number of instructions removed."""
+    cfg, tac, code = form.cfg, form.tac, form.cfg.code
+    names = form.names
+    value = {}
+
+    def resolve(a):
+        while a in value:
+            a = value[a]
+        return a
+
+    removed = 0
+    for b in form.order:
+        block = cfg.blocks[b]
+        kept = []
+        for phi in form.phis[b]:
+            args = {resolve(a) for a, p in zip(phi.args, block.preds)
+                    if form.idom[p] is not None}
+            args.discard(phi.result)
+            if len(args) == 1:
+                value[phi.result] = args.pop()
+            else:
+                kept.append(phi)
+        form.phis[b] = kept
+        for i in range(block.start, block.end):
+            ins = code[i]
+            tac.map_reads(ins, resolve)
+            op, a1, a2, res = ins
+            if res not in names:
+                continue
+            if op == ASSIGN:
+                if a1 & TAG_MASK != CONST and a1 not in names:
+                    continue
+                value[res] = a1
+            elif op in BINARY or op in UNARY:
+                known = evaluate(tac, {}, op, a1, a2)
+                if known is None:
+                    continue
+                value[res] = tac.const(known[1])
+            else:
+                continue
+            code[i] = None
+            removed += 1
+    # arguments along back edges were read before their values were known
+    for b in form.order:
+        for phi in form.phis[b]:
+            phi.args = [resolve(a) for a in phi.args]
+    return removed
+
+
+def propagate_copies(tac):
+    """Copy and constant propagation through SSA form, in place; returns
+    the number of instructions removed."""
+    before = len(tac)
+    form = SSA(tac)
+    propagate(form)
+    form.to_tac()
+    return before - len(tac)
@@ -0,0 +1,337 @@
+"""Strength reduction of induction variables.
+
+`reduce_strength(tac)` works on the natural loops (`CFG.natural_loops`)
+of SSA form (ssa.py), after Cooper, Simpson and Vick's operator strength
+reduction.
+
+A basic induction variable is a phi at a loop header that enters the
+loop as an integer and is stepped by an integer constant along every
+back edge, as `i = i + 1` steps the variable of a `for`.  A name the
+loop computes from one with `+`, `-`, `*` and `uminus` and integer
+constants is a derived induction variable, a*i + b.  For each factor a a
+new induction variable w = a*i + b0 starts ahead of the loop and is
+stepped by a*step next to i's own step; each derived name becomes a copy
+of w, or w plus a constant, so the multiplies leave the loop.
+
+When i is then read only by its own step and by a comparison with a
+constant or a value computed ahead of the loop, in a block dominating
+the one entering it, the comparison is rewritten on w (linear function
+test replacement, `i < n` becomes `w < a*n + b0`), and i is removed
+along with every other name nothing reads any more.
+
+Only integers are rewritten, since a float's rounding would change: an
+induction variable starts as an integer constant or as a name already
+shown to be an integer induction variable of an enclosing loop.
+"""
+from cfg import dominates
+from ssa import SSA, Phi
+from tac import (TEMP, VAR, CONST, TAG_BITS, TAG_MASK, NONE, WRITES_RESULT,
+                 ASSIGN, ADD, SUB, MUL, UMINUS, EQ, NE, LT, GT, LE, GE)
+
+# a comparison with its operands swapped, or with both sides negated
+_SWAPPED = {EQ: EQ, NE: NE, LT: GT, GT: LT, LE: GE, GE: LE}
+
+
+def reduce_strength(tac):
+    """Strength-reduce the induction variables of `tac`'s loops, in place;
+    returns the number of instructions removed."""
+    before = len(tac)
+    form = SSA(tac)
+    loops = form.cfg.natural_loops(form.idom)
+    if not loops:
+        return 0
+    defs = _definitions(form)
+    ints = set()
+    reduced = []
+    # enclosing loops first, so an inner loop may start from their values
+    for h, body in sorted(loops.items(), key=lambda loop: -len(loop[1])):
+        reduced.extend(_reduce_loop(form, h, body, defs, ints))
+    if reduced:
+        _sweep(form)
+        if any([_replace_test(form, defs, ints, *r) for r in reduced]):
+            _sweep(form)
+    form.to_tac()
+    return before - len(tac)
+
+
+def _integer(tac, a):
+    """The value of integer constant operand `a`, else None."""
+    if a & TAG_MASK == CONST:
+        value = tac.consts[a >> TAG_BITS]
+        if value.__class__ is int:
+            return value
+    return None
+
+
+def _start(tac, defs, a):
+    """The integer constant operand `a` is or is a copy of, else None."""
+    while True:
+        k = _integer(tac, a)
+        if k is not None:
+            return tac.const(k)
+        ins = defs.get(a, (None, None))[1]
+        if not isinstance(ins, list) or ins[0] != ASSIGN:
+            return None
+        a = ins[1]
+
+
+def _definitions(form):
+    """{SSA name: (block, instruction or Phi writing it)}."""
+    defs = {}
+    for b in form.order:
+        for phi in form.phis[b]:
+            defs[phi.result] = (b, phi)
+        for ins in form.block_code(b):
+            if ins[0] in WRITES_RESULT and ins[3] in form.names:
+                defs[ins[3]] = (b, ins)
+    return defs
+
+
+def _basic(form, h, body, defs, ints, latches, entering):
+    """{phi: (step, stepped name)} of the basic induction variables of the
+    loop with header `h`."""
+    tac = form.tac
+    found = {}
+    for phi in form.phis[h]:
+        stepped = {phi.args[j] for j in latches}
+        if len(stepped) != 1:
+            continue
+        v = stepped.pop()
+        b, ins = defs.get(v, (None, None))
+        if b not in body or isinstance(ins, Phi):
+            continue
+        op, a1, a2, res = ins
+        step = None
+        if op == ADD and a1 == phi.result:
+            step = _integer(tac, a2)
+        elif op == ADD and a2 == phi.result:
+            step = _integer(tac, a1)
+        elif op == SUB and a1 == phi.result:
+            step = _integer(tac, a2)
+            step = None if step is None else -step
+        if step and all(_start(tac, defs, phi.args[j]) is not None
+                        or phi.args[j] in ints for j in entering):
+            found[phi] = (step, v)
+    return found
+
+
+def _affine(form, body, ivs):
+    """[(name, instruction, (phi, a, b))] for the names the loop computes
+    as a*phi + b, in reverse postorder."""
+    tac = form.tac
+    known = {phi.result: (phi, 1, 0) for phi in ivs}
+
+    def affine(a):
+        if a in known:
+            return known[a]
+        k = _integer(tac, a)
+        return None if k is None else (None, 0, k)
+
+    found = []
+    for b in form.order:
+        if b not in body:
+            continue
+        for ins in form.block_code(b):
+            op, a1, a2, res = ins
+            if res not in form.names or op not in (ASSIGN, ADD, SUB, MUL,
+                                                   UMINUS):
+                continue
+            x = affine(a1)
+            y = affine(a2) if op in (ADD, SUB, MUL) else (None, 0, 0)
+            if x is None or y is None:
+                continue
+            if x[0] is not None and y[0] is not None and x[0] is not y[0]:
+                continue
+            phi = x[0] or y[0]
+            if op == ASSIGN:
+                value = x
+            elif op == ADD:
+                value = (phi, x[1] + y[1], x[2] + y[2])
+            elif op == SUB:
+                value = (phi, x[1] - y[1], x[2] - y[2])
+            elif op == UMINUS:
+                value = (phi, -x[1], -x[2])
+            elif x[0] is None or y[0] is None:
+                k, z = (x[2], y) if x[0] is None else (y[2], x)
+                value = (phi, z[1] * k, z[2] * k)
+            else:
+                continue
+            if phi is None or value[1] == 0:
+                continue
+            known[res] = value
+            found.append((res, ins, value))
+    return found
+
+
+def _reduce_loop(form, h, body, defs, ints):
+    """Rewrite the derived induction variables of the loop with header
+    `h`; returns [(phi, stepped name, header, body, factor, w, b0)] for
+    each new induction variable w."""
+    cfg, tac, names = form.cfg, form.tac, form.names
+    if form.idom[h] == h:
+        return []
+    preds = cfg.blocks[h].preds
+    latches = [j for j, p in enumerate(preds) if p in body]
+    entering = [j for j, p in enumerate(preds)
+                if p not in body and form.idom[p] is not None]
+    ivs = _basic(form, h, body, defs, ints, latches, entering)
+    if not ivs:
+        return []
+
+    def new_name():
+        t = tac.new_temp()
+        names.add(t)
+        ints.add(t)
+        return t
+
+    derived = _affine(form, body, ivs)
+    # w takes the offset of the last name with its factor, usually the one
+    # the others only lead up to
+    offset = {(phi, a): b for res, ins, (phi, a, b) in derived}
+    started = {}  # (phi, a) -> (w, b0)
+    out = []
+    for res, ins, (phi, a, b) in derived:
+        ints.add(res)
+        step, v = ivs[phi]
+        ints.update((phi.result, v))
+        if a == 1:
+            if phi.result in tac.reads(ins[0], ins[1], ins[2]):
+                continue  # already at most one `+`
+            base, b0 = phi.result, 0
+        elif (phi, a) in started:
+            base, b0 = started[phi, a]
+        else:
+            base, b0 = new_name(), offset[phi, a]
+            started[phi, a] = base, b0
+            new = Phi(base, len(preds))
+            new.result = base
+            for j in entering:
+                init = phi.args[j]
+                k = _integer(tac, _start(tac, defs, init) or init)
+                if k is not None:
+                    new.args[j] = tac.const(a * k + b0)
+                    continue
+                extra = form.appended.setdefault(preds[j], [])
+                t = new_name()
+                extra.append([MUL, init, tac.const(a), t])
+                if b0:
+                    t0, t = t, new_name()
+                    extra.append([ADD, t0, tac.const(b0), t])
+                new.args[j] = t
+            stepped = new_name()
+            block = defs[v][0]
+            form.appended.setdefault(block, []).append(
+                [ADD, base, tac.const(a * step), stepped])
+            for j in latches:
+                new.args[j] = stepped
+            form.phis[h].append(new)
+            defs[base] = (h, new)
+            defs[stepped] = (block, form.appended[block][-1])
+            out.append((phi, v, h, body, a, base, b0))
+        if b == b0:
+            ins[:] = [ASSIGN, base, NONE, res]
+        else:
+            ins[:] = [ADD, base, tac.const(b - b0), res]
+    return out
+
+
+def _readers(form):
+    """{name: [instructions and phis reading it]} over reachable code."""
+    readers = {}
+    tac = form.tac
+    for b in form.order:
+        for phi in form.phis[b]:
+            for a in set(phi.args):
+                readers.setdefault(a, []).append(phi)
+        for ins in form.block_code(b):
+            for a in set(tac.reads(ins[0], ins[1], ins[2])):
+                readers.setdefault(a, []).append(ins)
+    return readers
+
+
+def _replace_test(form, defs, ints, phi, v, h, body, a, w, b0):
+    """Rewrite the loop test on `phi` to one on `w` = a*phi + b0 if that
+    leaves `phi` read only by its own step; True if it did."""
+    tac = form.tac
+    readers = _readers(form)
+    if w not in readers or any(r is not phi for r in readers.get(v, ())):
+        return False
+    step = defs[v][1]
+    tests = [r for r in readers.get(phi.result, ()) if r is not step]
+    if len(tests) != 1 or isinstance(tests[0], Phi):
+        return False
+    ins = tests[0]
+    op, a1, a2, res = ins
+    if op not in _SWAPPED or a1 == a2:
+        return False
+    n = a2 if a1 == phi.result else a1
+    k = _integer(tac, n)
+    if k is not None:
+        bound = tac.const(a * k + b0)
+    else:
+        if n not in ints or defs.get(n, (h,))[0] in body:
+            return False
+        preds = form.cfg.blocks[h].preds
+        entering = [p for p in preds if p not in body]
+        # the bound is computed where the loop is entered, so n must be
+        # written ahead of it, not just outside the loop
+        if len(entering) != 1 \
+                or not dominates(form.idom, defs[n][0], entering[0]):
+            return False
+        extra = form.appended.setdefault(entering[0], [])
+        bound = tac.new_temp()
+        extra.append([MUL, n, tac.const(a), bound])
+        if b0:
+            scaled, bound = bound, tac.new_temp()
+            extra.append([ADD, scaled, tac.const(b0), bound])
+        form.names.add(bound)
+    if a < 0:
+        op = _SWAPPED[op]
+    if a1 == phi.result:
+        ins[:] = [op, w, bound, res]
+    else:
+        ins[:] = [op, bound, w, res]
+    return True
+
+
+def _sweep(form):
+    """Remove the instructions and phis writing private names that nothing
+    reads, directly or through other such names."""
+    cfg, tac, code = form.cfg, form.tac, form.cfg.code
+    names = form.names
+    defs = _definitions(form)
+    live = set()
+    work = []
+    for b in form.order:
+        for ins in form.block_code(b):
+            op, a1, a2, res = ins
+            if op not in WRITES_RESULT or res not in names \
+                    or not tac.discardable(op, a2):
+                work.extend(tac.reads(op, a1, a2))
+    while work:
+        a = work.pop()
+        if a in live or a & TAG_MASK not in (TEMP, VAR):
+            continue
+        live.add(a)
+        d = defs.get(a)
+        if d is None:
+            continue
+        if isinstance(d[1], Phi):
+            work.extend(d[1].args)
+        else:
+            work.extend(tac.reads(d[1][0], d[1][1], d[1][2]))
+
+    def dead(ins):
+        op, a1, a2, res = ins
+        return op in WRITES_RESULT and res in names and res not in live \
+            and tac.discardable(op, a2)
+
+    for b in form.order:
+        form.phis[b] = [phi for phi in form.phis[b] if phi.result in live]
+        block = cfg.blocks[b]
+        for i in range(block.start, block.end):
+            if code[i] is not None and dead(code[i]):
+                code[i] = None
+        if b in form.appended:
+            form.appended[b] = [ins for ins in form.appended[b]
+                                if not dead(ins)]
@@ -0,0 +1,244 @@
+"""Three-address code stored in parallel array columns.
+
+An instruction is an integer opcode (an index into `OP_NAMES`) and three
+operands.  An operand is a single int with a tag in its low `TAG_BITS` bits
+and an index above them:
+
+    NOTHING    the unused operand, printed "_" (always 0, see NONE)
+    TEMP       temporary number, printed t1, t2, ...
+    VAR        symbol id (semantic.SymbolTable), printed as its name
+    CONST      index into the constant pool `consts`
+    LABEL_REF  label number, printed L1, L2, ...
+    ARGS       index into `arg_lists`, the operand tuples of `call`
+
+so passes read kinds and indices with a mask and a shift instead of parsing
+strings.  Iterating a `ThreeAddressCode` yields the instructions as text
+tuples, `(op, arg1, arg2, result)`, in the format the compiler has always
+printed.
+"""
+import math
+import operator
+from array import array
+
+(ASSIGN, ADD, SUB, MUL, DIV, MOD, AND, OR, EQ, NE, LT, GT, LE, GE, UMINUS,
+ NOT, INDEX, IF_FALSE, GOTO, LABEL, PRINT, INPUT, CALL, FUNC, ENDFUNC,
+ RETURN, IF_TRUE, ITOF, STORE) = range(29)
+
+OP_NAMES = (
+    "=", "+", "-", "*", "/", "%", "and", "or", "==", "!=", "<", ">", "<=",
+    ">=", "uminus", "not", "[]", "ifFalse", "goto", "label", "print",
+    "input", "call", "func", "endfunc", "return", "ifTrue", "float",
+    "[]=",
+)
+OP_INDEX = {name: op for op, name in enumerate(OP_NAMES)}
+
+(NOTHING, TEMP, VAR, CONST, LABEL_REF, ARGS) = range(6)
+TAG_BITS = 3
+TAG_MASK = (1 << TAG_BITS) - 1
+
+NONE = NOTHING
+
+
+# ----- opcode semantics, shared by the VM and the optimizer -----
+
+def _div(a, b):
+    if a.__class__ is int and b.__class__ is int:
+        # integer division truncates toward zero, as in C
+        q = abs(a) // abs(b)
+        return q if (a < 0) == (b < 0) else -q
+    return a / b
+
+
+def _mod(a, b):
+    if a.__class__ is int and b.__class__ is int:
+        return a - b * _div(a, b)
+    return math.fmod(a, b)
+
+
+BINARY = {
+    ADD: operator.add, SUB: operator.sub, MUL: operator.mul, DIV: _div,
+    MOD: _mod, AND: operator.and_, OR: operator.or_, EQ: operator.eq,
+    NE: operator.ne, LT: operator.lt, GT: operator.gt, LE: operator.le,
+    GE: operator.ge,
+}
+# `float` converts an int stored into a float variable
+UNARY = {UMINUS: operator.neg, NOT: operator.not_, ITOF: float}
+
+# opcodes that write their result operand; `[]=` (index, value, array)
+# stores into an element of its array, which stays the same list, so it
+# is not among them
+WRITES_RESULT = frozenset(BINARY) | frozenset(UNARY) | frozenset(
+    (ASSIGN, INDEX, INPUT, CALL))
+# opcodes that only compute their result; an unused one can be dropped
+PURE = frozenset(BINARY) - {DIV, MOD} | frozenset(UNARY) | {ASSIGN}
+# conditional jumps: `ifFalse` jumps when its operand is false, `ifTrue`
+# when it is true
+BRANCHES = frozenset((IF_FALSE, IF_TRUE))
+
+
+def operand(tag, index):
+    return index << TAG_BITS | tag
+
+
+def tag_of(a):
+    return a & TAG_MASK
+
+
+def index_of(a):
+    return a >> TAG_BITS
+
+
+def var(sid):
+    """Operand for the variable or function with symbol id `sid`."""
+    return sid << TAG_BITS | VAR
+
+
+def const_key(value):
+    """Key under which constant `value` is pooled: 1, 1.0 and true differ,
+    and so do 0.0 and -0.0, which compare equal but print differently."""
+    if value.__class__ is float:
+        return (float, value, math.copysign(1.0, value))
+    return (type(value), value)
+
+
+def const_text(value):
+    """A constant as the TAC listing shows it."""
+    if value is True or value is False:
+        return '"true"' if value else '"false"'
+    if isinstance(value, str):
+        # single characters print as char literals
+        return f'"{value}"' if len(value) > 1 else f"'{value}'"
+    return str(value)
+
+
+class ThreeAddressCode:
+    def __init__(self, names=None):
+        self.ops = array("B")
+        self.arg1 = array("i")
+        self.arg2 = array("i")
+        self.result = array("i")
+        self.consts = []  # constant pool
+        self._const_index = {}
+        self.arg_lists = []
+        # function operand -> (parameter operands, local variable operands)
+        self.functions = {}
+        # array variable operand -> (element type, size)
+        self.arrays = {}
+        self.temp_counter = 0
+        self.label_counter = 0
+        # symbol id -> name (SymbolTable.names), used only for printing
+        self.names = [] if names is None else names
+
+    def new_temp(self):
+        """ایجاد یک متغیر موقت جدید."""
+        self.temp_counter += 1
+        return self.temp_counter << TAG_BITS | TEMP
+
+    def new_label(self):
+        """ایجاد یک برچسب جدید."""
+        self.label_counter += 1
+        return self.label_counter << TAG_BITS | LABEL_REF
+
+    def const(self, value):
+        """Operand for a constant, pooled so each value is stored once."""
+        key = const_key(value)
+        index = self._const_index.get(key)
+        if index is None:
+            index = self._const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return index << TAG_BITS | CONST
+
+    def args(self, operands):
+        """Operand for the argument list of a call."""
+        self.arg_lists.append(tuple(operands))
+        return (len(self.arg_lists) - 1) << TAG_BITS | ARGS
+
+    def add(self, op, arg1, arg2, result):
+        """افزودن یک دستور به کد سه آدرسی."""
+        self.ops.append(op)
+        self.arg1.append(arg1)
+        self.arg2.append(arg2)
+        self.result.append(result)
+
+    def instructions(self):
+        """(opcode, arg1, arg2, result) int tuples, in order."""
+        return zip(self.ops, self.arg1, self.arg2, self.result)
+
+    def instruction_list(self):
+        """The instructions as mutable [op, arg1, arg2, result] lists, for
+        passes that rewrite the code (see `replace`)."""
+        return [list(ins) for ins in self.instructions()]
+
+    def replace(self, instructions):
+        """Make `instructions` (lists or tuples; None entries are dropped)
+        the code."""
+        for column in (self.ops, self.arg1, self.arg2, self.result):
+            del column[:]
+        for ins in instructions:
+            if ins is not None:
+                self.add(*ins)
+
+    def reads(self, op, arg1, arg2):
+        """Operands whose values instruction `op` reads."""
+        if op in BINARY or op == INDEX or op == STORE:
+            return (arg1, arg2)
+        if op == CALL:
+            return self.arg_lists[arg2 >> TAG_BITS] if arg2 else ()
+        if op in (ASSIGN, IF_FALSE, IF_TRUE, PRINT, RETURN) or op in UNARY:
+            return (arg1,) if arg1 else ()
+        return ()
+
+    def map_reads(self, ins, f):
+        """Replace each operand instruction list `ins` reads by f(operand)."""
+        op = ins[0]
+        if op == CALL:
+            if ins[2]:
+                args = self.arg_lists[ins[2] >> TAG_BITS]
+                new = tuple(map(f, args))
+                if new != args:
+                    ins[2] = self.args(new)
+        elif op in BINARY or op == INDEX or op == STORE:
+            ins[1] = f(ins[1])
+            ins[2] = f(ins[2])
+        elif ins[1] and (op in (ASSIGN, IF_FALSE, IF_TRUE, PRINT, RETURN)
+                         or op in UNARY):
+            ins[1] = f(ins[1])
+
+    def discardable(self, op, arg2):
+        """True if instruction `op` can be dropped when its result is
+        unused: it has no effect but its result and cannot fail."""
+        if op in PURE:
+            return True
+        if op == DIV or op == MOD:
+            # dropping the division must not hide a division by zero
+            return arg2 & TAG_MASK == CONST and bool(
+                self.consts[arg2 >> TAG_BITS])
+        return False
+
+    def operand_text(self, a):
+        tag = a & TAG_MASK
+        index = a >> TAG_BITS
+        if tag == TEMP:
+            return f"t{index}"
+        if tag == VAR:
+            return self.names[index]
+        if tag == CONST:
+            return const_text(self.consts[index])
+        if tag == LABEL_REF:
+            return f"L{index}"
+        if tag == ARGS:
+            return ",".join(map(self.operand_text, self.arg_lists[index]))
+        return "_"
+
+    def __iter__(self):
+        text = self.operand_text
+        for op, a1, a2, res in self.instructions():
+            yield OP_NAMES[op], text(a1), text(a2), text(res)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def print_code(self):
+        """چاپ کد سه آدرسی."""
+        for i, (op, a1, a2, res) in enumerate(self):
+            print(f"{i}: ({op}, {a1}, {a2}, {res})")
@@ -0,0 +1,20 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def run():
+    """run(source, optimize=False) -> the printed lines of the program."""
+    from vm import run_source
+
+    def run(source, optimize=False):
+        out = io.StringIO()
+        _, errors = run_source(source, stdout=out, optimize=optimize)
+        assert errors == []
+        return out.getvalue().splitlines()
+    return run
@@ -0,0 +1,25 @@
+import pytest
+
+from batch import collect_sources, run_batch
+
+
+def _write(path, text="int x = 1;"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+def test_same_output_name_is_rejected(tmp_path):
+    first = _write(tmp_path / "a" / "p.txt")
+    second = _write(tmp_path / "b" / "p.txt")
+    with pytest.raises(ValueError, match="p.tac"):
+        collect_sources([first, second])
+    with pytest.raises(ValueError):
+        run_batch([first, second], str(tmp_path / "out"), jobs=1)
+
+
+def test_file_given_twice_is_compiled_once(tmp_path):
+    path = _write(tmp_path / "a" / "p.txt")
+    assert collect_sources([path, path, str(tmp_path / "a")]) == [
+        (path, "p.txt")]
+    assert run_batch([path, path], str(tmp_path / "out"), jobs=1) == (1, 0)
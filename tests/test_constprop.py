@@ -0,0 +1,32 @@
+FLOAT_STORES = """
+float f = 3; print(f / 2);
+float g = 7; g = g / 2; print(g);
+int i = 5; float h = i; h = h / 2; print(h);
+"""
+
+
+def test_folded_float_stores_match_unoptimized(run):
+    expected = run(FLOAT_STORES)
+    assert expected == ["1.5", "3.5", "2.5"]
+    assert run(FLOAT_STORES, optimize=["constprop"]) == expected
+    assert run(FLOAT_STORES, optimize=True) == expected
+
+
+def test_folding_keeps_the_sign_of_zero(run):
+    source = "float z = 0.0; float x = -13.0; print(x * z);"
+    assert run(source) == ["-0.0"]
+    assert run(source, optimize=["constprop"]) == ["-0.0"]
+
+
+def test_merged_zeros_of_different_sign_are_not_constant(run):
+    source = """
+    float z = 0.0; float x = 0.0; int k = 0;
+    while (k < 2) {
+        if (k == 0) { x = z; } else { x = -13.0 * z; }
+        k = k + 1;
+    }
+    print(x);
+    """
+    assert run(source) == ["-0.0"]
+    assert run(source, optimize=["constprop"]) == ["-0.0"]
+    assert run(source, optimize=True) == ["-0.0"]
@@ -0,0 +1,17 @@
+def test_element_store_then_load(run):
+    source = "int a[4]; int i = 1; a[i] = 5; print(a[i]);"
+    assert run(source) == ["5"]
+    assert run(source, optimize=True) == ["5"]
+
+
+def test_store_invalidates_loads_of_its_array(run):
+    source = """
+    int a[4]; int b = 2; int c = 3; int i = 1;
+    a[i] = 1;
+    a[i] = a[i] + b * c;
+    print(a[i]);
+    print(a[i] + b * c);
+    """
+    assert run(source) == ["7", "13"]
+    assert run(source, optimize=["gvn"]) == ["7", "13"]
+    assert run(source, optimize=True) == ["7", "13"]
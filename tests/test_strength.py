@@ -0,0 +1,13 @@
+LATER_BOUND = """
+int k = 0; int i = 0; int y = 0; int j = 0; int z = 0;
+while (k < 3) { k = k + 1; y = i * 3; print(y); i = i + 1; }
+for (j = 0; j < 5; j = j + 1) { z = j * 2; print(z); print(i < j); }
+"""
+
+
+def test_test_replacement_needs_bound_ahead_of_loop(run):
+    # i < j reads the first loop's i, but j is only written by the second
+    # loop: its bound cannot be computed ahead of the first
+    expected = run(LATER_BOUND)
+    assert run(LATER_BOUND, optimize=["strength"]) == expected
+    assert run(LATER_BOUND, optimize=True) == expected
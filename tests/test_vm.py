@@ -0,0 +1,17 @@
+import pytest
+
+from vm import VMError, run_source
+
+
+def test_int_initializer_of_float_variable(run):
+    assert run("float f = 3; print(f / 2);") == ["1.5"]
+
+
+def test_int_assigned_to_float_variable(run):
+    assert run("float g = 7; g = g / 2; print(g);") == ["3.5"]
+    assert run("int i = 5; float h = 0.5; h = i * 3; print(h);") == ["15.0"]
+
+
+def test_negative_array_index_fails():
+    with pytest.raises(VMError, match="array index -1 out of range"):
+        run_source("int a[3]; print(a[-1]);")
@@ -0,0 +1,125 @@
+"""Table-driven AST visitor shared by the compiler passes.
+
+A pass subclasses `Visitor` and defines `visit_<kind>` methods named after
+`ast_nodes.KIND_NAMES` (`visit_binop`, `visit_if`, ...).  When the subclass
+is created its handlers are collected into a tuple indexed by node kind, so
+dispatch is one index instead of a chain of comparisons.  Handlers receive
+the node followed by its fields, in `Node.fields` order:
+
+    def visit_binop(self, node, op, left, right): ...
+
+Kinds without a handler go to `generic_visit`.
+
+A handler that needs the results of its children is written as a generator:
+it yields a child (a node, a list of nodes or None) and gets the child's
+result back from the yield, and its return value is the node's result:
+
+    def visit_binop(self, node, op, left, right):
+        lt = yield left
+        rt = yield right
+        return lt + rt
+
+`visit` runs suspended handlers from an explicit stack, so a million-deep
+`+` chain or block nesting never reaches Python's recursion limit.  Plain
+(non-generator) handlers are fine for leaves and may still call
+`self.visit` themselves.
+"""
+from types import GeneratorType
+
+from ast_nodes import KIND_NAMES, NODE_TREE, from_tuple, tree_of
+
+
+class Visitor:
+    _handlers = ()
+    # exceptions that fail only the node that raised them; `recover`
+    # turns them into that node's result and the parent carries on
+    recoverable = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._handlers = tuple(getattr(cls, "visit_" + name, None)
+                              or cls.generic_visit for name in KIND_NAMES)
+
+    def __init__(self):
+        self.use_tree(NODE_TREE)
+
+    def use_tree(self, tree):
+        """Read nodes through `tree` (NodeTree or a FlatAST)."""
+        self.tree = tree
+        self._kind = tree.kind
+        self._getters = tree.field_getters
+
+    def bind(self, ast):
+        """Read `ast` (node tree, FlatAST or tuple AST); returns its root."""
+        if isinstance(ast, tuple):
+            ast = from_tuple(ast)
+        tree, root = tree_of(ast)
+        self.use_tree(tree)
+        return root
+
+    def visit(self, node):
+        handlers = self._handlers
+        kind_of = self._kind
+        getters = self._getters
+        recoverable = self.recoverable
+        recover = self.recover
+        # the identity hook is skipped rather than called for every node
+        leave = None if type(self).leave is Visitor.leave else self.leave
+        stack = []  # suspended (handler, node) pairs below `gen`
+        gen = owner = None
+
+        while True:
+            # enter `node`: finish it or suspend its handler
+            if node is None:
+                value = None
+            else:
+                try:
+                    if node.__class__ is list:
+                        result = self.visit_list(node)
+                    else:
+                        kind = kind_of(node)
+                        result = handlers[kind](self, node,
+                                                *getters[kind](node))
+                except recoverable as e:
+                    value = recover(node, e)
+                else:
+                    if result.__class__ is GeneratorType:
+                        if gen is not None:
+                            stack.append((gen, owner))
+                        gen, owner = result, node
+                        value = None
+                    elif leave is None:
+                        value = result
+                    else:
+                        value = leave(node, result)
+
+            # resume suspended handlers until one yields another child
+            while gen is not None:
+                try:
+                    node = gen.send(value)
+                    break
+                except StopIteration as stop:
+                    value = stop.value
+                    if leave is not None:
+                        value = leave(owner, value)
+                except recoverable as e:
+                    value = recover(owner, e)
+                gen, owner = stack.pop() if stack else (None, None)
+            else:
+                return value
+
+    def leave(self, node, result):
+        """Hook run as each node (or list) finishes; returns its result."""
+        return result
+
+    def recover(self, node, error):
+        """Result of a node whose handler raised a `recoverable` error."""
+        return None
+
+    def visit_list(self, nodes):
+        for n in nodes:
+            yield n
+        return None
+
+    def generic_visit(self, node, *fields):
+        return None
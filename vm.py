@@ -0,0 +1,394 @@
+"""Virtual machine for the three-address code in tac.py.
+
+    python vm.py program.txt
+    python vm.py -O program.txt     # optimize the TAC first
+
+`VM(tac)` loads a program once and `run()` executes it:
+
+- Every operand becomes a slot in one register array: slot 0 is the unused
+  operand, then temps, variables and constants (preloaded).  An
+  instruction reads and writes `regs[i]` directly and never decodes
+  an operand at run time.
+- Labels are resolved to instruction indices at load time.
+- Each instruction is compiled to a closure that does its work and
+  returns the next pc, so dispatch is one call per instruction.  A
+  comparison followed by a branch on its result runs as one closure
+  that also jumps.
+- A call saves the callee's frame (its parameters, locals and temps, a
+  slot list fixed at load time) and restores it on return.  The frame
+  is one list per active call, so recursion works and globals are
+  shared.
+"""
+import sys
+
+from tac import (TEMP, VAR, CONST, ARGS, TAG_BITS, TAG_MASK, ASSIGN, ADD,
+                 SUB, MUL, EQ, NE, LT, GT, LE, GE, UMINUS, NOT, INDEX,
+                 IF_FALSE, IF_TRUE, GOTO, LABEL, PRINT, INPUT, CALL, FUNC,
+                 ENDFUNC, RETURN, ITOF, STORE, OP_NAMES, BINARY, BRANCHES)
+
+
+class VMError(Exception):
+    pass
+
+
+# zero value of array elements by declared type
+ZERO = {"int": 0, "float": 0.0, "bool": False, "char": "\0", "string": ""}
+
+MAX_CALL_DEPTH = 10_000
+
+COMPARISONS = frozenset((EQ, NE, LT, GT, LE, GE))
+
+
+def format_value(value):
+    if value is True or value is False:
+        return "true" if value else "false"
+    return str(value)
+
+
+def parse_input(text):
+    """A line read by `input` as int, float, bool or string."""
+    text = text.strip()
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    if text in ("true", "false"):
+        return text == "true"
+    return text
+
+
+class VM:
+    def __init__(self, tac, stdin=None, stdout=None,
+                 max_call_depth=MAX_CALL_DEPTH):
+        self.tac = tac
+        self.stdin = stdin if stdin is not None else sys.stdin
+        self.stdout = stdout if stdout is not None else sys.stdout
+        self.max_call_depth = max_call_depth
+        self.calls = []  # (return pc, result slot, frame slots, saved)
+        self._load()
+
+    # ----- loading -----
+
+    def _slot(self, a):
+        tag = a & TAG_MASK
+        if tag == TEMP:
+            return a >> TAG_BITS
+        if tag == VAR:
+            return self._var_base + (a >> TAG_BITS)
+        if tag == CONST:
+            return self._const_base + (a >> TAG_BITS)
+        return 0
+
+    def _load(self):
+        tac = self.tac
+        self._var_base = tac.temp_counter + 1
+        self._const_base = self._var_base + len(tac.names)
+        self.regs = regs = [None] * (self._const_base + len(tac.consts))
+        regs[self._const_base:] = tac.consts
+        for array_var, (elem_type, size) in tac.arrays.items():
+            regs[self._slot(array_var)] = [ZERO[elem_type]] * size
+
+        instructions = list(tac.instructions())
+        self.labels = {}
+        for i, (op, a1, a2, res) in enumerate(instructions):
+            if op == LABEL:
+                self.labels[res] = i + 1
+
+        # function operand -> (entry pc, parameter slots, frame slots)
+        self.functions = {}
+        self.func_end = {}
+        open_funcs = []
+        for i, (op, a1, a2, res) in enumerate(instructions):
+            if op == FUNC:
+                open_funcs.append((i, a1))
+            elif op == ENDFUNC and open_funcs:
+                start, fn = open_funcs.pop()
+                self.func_end[start] = i + 1
+                self.functions[fn] = self._frame(instructions, start, i, fn)
+
+        # one closure per instruction, for `profile`
+        self.plain = [self._compile(i, *ins)
+                      for i, ins in enumerate(instructions)]
+        self.code = list(self.plain)
+        for i in range(len(instructions) - 1):
+            fused = self._fuse(i, instructions[i], instructions[i + 1])
+            if fused is not None:
+                self.code[i] = fused
+
+    def _frame(self, instructions, start, end, fn):
+        params, local_vars = self.tac.functions.get(fn, ((), ()))
+        slots = {self._slot(p) for p in params}
+        slots.update(self._slot(v) for v in local_vars)
+        for op, a1, a2, res in instructions[start + 1:end]:
+            for a in (a1, a2, res):
+                if a & TAG_MASK == TEMP:
+                    slots.add(a >> TAG_BITS)
+        return (start + 1, tuple(self._slot(p) for p in params),
+                tuple(sorted(slots)))
+
+    def _jump(self, label):
+        try:
+            return self.labels[label]
+        except KeyError:
+            raise VMError(f"undefined label {self.tac.operand_text(label)}")
+
+    def _compile(self, i, op, a1, a2, res):
+        """Closure executing instruction `i`; returns the next pc."""
+        regs = self.regs
+        nxt = i + 1
+        a = self._slot(a1)
+        b = self._slot(a2)
+        c = self._slot(res)
+
+        # the hottest operators inline the operation instead of calling
+        # into BINARY
+        if op == ADD:
+            def run():
+                regs[c] = regs[a] + regs[b]
+                return nxt
+        elif op == SUB:
+            def run():
+                regs[c] = regs[a] - regs[b]
+                return nxt
+        elif op == MUL:
+            def run():
+                regs[c] = regs[a] * regs[b]
+                return nxt
+        elif op == LT:
+            def run():
+                regs[c] = regs[a] < regs[b]
+                return nxt
+        elif op in BINARY:
+            f = BINARY[op]
+
+            def run():
+                regs[c] = f(regs[a], regs[b])
+                return nxt
+        elif op == ASSIGN:
+            def run():
+                regs[c] = regs[a]
+                return nxt
+        elif op == IF_FALSE:
+            target = self._jump(res)
+
+            def run():
+                return nxt if regs[a] else target
+        elif op == IF_TRUE:
+            target = self._jump(res)
+
+            def run():
+                return target if regs[a] else nxt
+        elif op == GOTO:
+            target = self._jump(res)
+
+            def run():
+                return target
+        elif op == LABEL:
+            def run():
+                return nxt
+        elif op == UMINUS:
+            def run():
+                regs[c] = -regs[a]
+                return nxt
+        elif op == NOT:
+            def run():
+                regs[c] = not regs[a]
+                return nxt
+        elif op == ITOF:
+            def run():
+                regs[c] = float(regs[a])
+                return nxt
+        elif op == INDEX:
+            def run():
+                array, k = regs[a], regs[b]
+                if not 0 <= k < len(array):
+                    # Python would read a negative index from the end
+                    raise IndexError(f"array index {k} out of range")
+                regs[c] = array[k]
+                return nxt
+        elif op == STORE:
+            def run():
+                array, k = regs[c], regs[a]
+                if not 0 <= k < len(array):
+                    raise IndexError(f"array index {k} out of range")
+                array[k] = regs[b]
+                return nxt
+        elif op == PRINT:
+            write = self.stdout.write
+
+            def run():
+                write(format_value(regs[a]) + "\n")
+                return nxt
+        elif op == INPUT:
+            readline = self.stdin.readline
+
+            def run():
+                regs[c] = parse_input(readline())
+                return nxt
+        elif op == CALL:
+            return self._compile_call(nxt, a1, a2, c)
+        elif op == FUNC:
+            # definitions are skipped by the enclosing flow of control
+            end = self.func_end.get(i)
+            if end is None:
+                raise VMError(f"func at {i} has no endfunc")
+
+            def run():
+                return end
+        elif op == RETURN or op == ENDFUNC:
+            return self._compile_return(a)
+        else:
+            raise VMError(f"unknown opcode {op} at {i}")
+        return run
+
+    def _fuse(self, i, first, second):
+        """Closure running comparison `first` and the branch `second` on
+        its result in one dispatch, or None.  The result is still stored,
+        and the branch keeps its own closure for jumps to its label."""
+        op, a1, a2, res = first
+        if op not in COMPARISONS or second[0] not in BRANCHES \
+                or second[1] != res:
+            return None
+        regs = self.regs
+        a = self._slot(a1)
+        b = self._slot(a2)
+        c = self._slot(res)
+        nxt = i + 2
+        target = self._jump(second[3])
+        if second[0] == IF_TRUE:
+            nxt, target = target, nxt
+        # `i < n` is the test of every counted loop
+        if op == LT:
+            def run():
+                if regs[a] < regs[b]:
+                    regs[c] = True
+                    return nxt
+                regs[c] = False
+                return target
+        else:
+            f = BINARY[op]
+
+            def run():
+                if f(regs[a], regs[b]):
+                    regs[c] = True
+                    return nxt
+                regs[c] = False
+                return target
+        return run
+
+    def _compile_call(self, nxt, fn, args, result_slot):
+        regs = self.regs
+        calls = self.calls
+        max_depth = self.max_call_depth
+        name = self.tac.operand_text(fn)
+        arg_slots = tuple(self._slot(x) for x in self.tac.arg_lists[
+            args >> TAG_BITS]) if args & TAG_MASK == ARGS else ()
+        if fn not in self.functions:
+            def run():
+                raise VMError(f"call to undefined function '{name}'")
+            return run
+        entry, param_slots, frame_slots = self.functions[fn]
+        if len(arg_slots) != len(param_slots):
+            def run():
+                raise VMError(f"'{name}' expects {len(param_slots)} "
+                              f"arguments, got {len(arg_slots)}")
+            return run
+        fresh = [None] * len(frame_slots)
+
+        def run():
+            if len(calls) >= max_depth:
+                raise VMError("call stack overflow")
+            values = [regs[s] for s in arg_slots]
+            calls.append((nxt, result_slot, frame_slots,
+                          [regs[s] for s in frame_slots]))
+            for s, v in zip(frame_slots, fresh):
+                regs[s] = v
+            for s, v in zip(param_slots, values):
+                regs[s] = v
+            return entry
+        return run
+
+    def _compile_return(self, a):
+        regs = self.regs
+        calls = self.calls
+        halt = len(self.tac)
+
+        def run():
+            value = regs[a]
+            if not calls:
+                return halt
+            nxt, result_slot, frame_slots, saved = calls.pop()
+            for s, v in zip(frame_slots, saved):
+                regs[s] = v
+            regs[result_slot] = value
+            return nxt
+        return run
+
+    # ----- execution -----
+
+    def run(self):
+        """Execute from the first instruction; returns instructions run."""
+        code = self.code
+        end = len(code)
+        pc = 0
+        steps = 0
+        self.calls.clear()
+        try:
+            while pc < end:
+                pc = code[pc]()
+                steps += 1
+        except (TypeError, ZeroDivisionError, IndexError) as e:
+            op = OP_NAMES[self.tac.ops[pc]]
+            raise VMError(f"instruction {pc} ({op}): {e}") from e
+        return steps
+
+    def profile(self):
+        """Execute like `run`, one instruction per dispatch; returns how
+        many times each instruction ran, by index."""
+        code = self.plain
+        end = len(code)
+        counts = [0] * end
+        pc = 0
+        self.calls.clear()
+        try:
+            while pc < end:
+                counts[pc] += 1
+                pc = code[pc]()
+        except (TypeError, ZeroDivisionError, IndexError) as e:
+            op = OP_NAMES[self.tac.ops[pc]]
+            raise VMError(f"instruction {pc} ({op}): {e}") from e
+        return counts
+
+
+def run_source(source, stdin=None, stdout=None, optimize=False):
+    """Compile and run `source`; returns (steps, errors)."""
+    from compiler import compile_source
+
+    result = compile_source(source, optimize)
+    if not result.ok:
+        return 0, result.errors
+    return VM(result.tac, stdin, stdout).run(), []
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    optimize = "-O" in argv
+    paths = [a for a in argv if a != "-O"]
+    if len(paths) != 1:
+        print("usage: python vm.py [-O] program.txt")
+        return 2
+    with open(paths[0], "r", encoding="utf-8") as f:
+        source = f.read()
+    try:
+        _, errors = run_source(source, optimize=optimize)
+    except VMError as e:
+        print(f"Runtime Error: {e}")
+        return 1
+    for err in errors:
+        print(err)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())